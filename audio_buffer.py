@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Decoded audio shared by the processing stages.
+
+An AudioBuffer holds float32 samples of shape (frames, channels) together
+with their sample rate. Inputs are decoded once into a buffer (through an
+FFmpeg pipe, or by reading a PCM WAV file) and separation, pitch shifting
+and mixing all work on buffers; audio is only converted back to files at the
+edges (stem WAVs, encoded outputs). Large inputs can be decoded into a raw
+float32 file that is memory-mapped instead of being held in memory.
+"""
+
+import os
+import subprocess
+
+import numpy as np
+
+from cancellation import check_cancelled
+from mix_wavs import STEM_NAMES, load_stems, write_wav
+from progress import report_audio
+
+# Frames decoded per read from the FFmpeg pipe
+DECODE_BLOCK_FRAMES = 65536
+
+
+def decode_stream(input_file, sample_rate, block_frames, channels=2, ffmpeg_path=None):
+    """
+    Decode an audio file through an FFmpeg pipe in blocks of fixed size.
+    
+    Args:
+        input_file (str): Path to input audio file
+        sample_rate (int): Output sample rate in Hz
+        block_frames (int): Number of frames per block (the last block may be shorter)
+        channels (int): Number of output channels
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        
+    Yields:
+        numpy.ndarray: float32 blocks of shape (frames, channels)
+    """
+    cmd = [
+        ffmpeg_path or 'ffmpeg', '-v', 'error', '-i', input_file,
+        '-f', 'f32le', '-ac', str(channels), '-ar', str(sample_rate), '-'
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    frame_bytes = 4 * channels
+    try:
+        while True:
+            check_cancelled()
+            data = process.stdout.read(block_frames * frame_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % frame_bytes
+            yield np.frombuffer(data[:usable], dtype='<f4').reshape(-1, channels)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors='replace')
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"FFmpeg decoding failed: {stderr.strip()}")
+
+
+class AudioBuffer:
+    """float32 samples of shape (frames, channels) and their sample rate, in memory or memory-mapped."""
+    
+    def __init__(self, data, sample_rate, path=None):
+        """
+        Args:
+            data (numpy.ndarray): Samples of shape (frames, channels), converted to float32 if needed
+            sample_rate (int): Sample rate in Hz
+            path (str, optional): Raw float32 file the samples are mapped from, removed by release()
+        """
+        if data.ndim == 1:
+            data = data[:, None]
+        if data.dtype != np.float32:
+            data = data.astype(np.float32)
+        self.data = data
+        self.sample_rate = int(sample_rate)
+        self.path = path
+    
+    @property
+    def channels(self):
+        """Number of channels."""
+        return self.data.shape[1]
+    
+    @property
+    def frames(self):
+        """Number of samples per channel."""
+        return self.data.shape[0]
+    
+    @property
+    def duration(self):
+        """Length in seconds."""
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+    
+    @property
+    def is_mapped(self):
+        """True if the samples are memory-mapped from a file."""
+        return self.path is not None
+    
+    def __len__(self):
+        return self.frames
+    
+    def __array__(self, dtype=None, copy=None):
+        return self.data if dtype is None else self.data.astype(dtype)
+    
+    def __repr__(self):
+        storage = f"mapped from {self.path}" if self.is_mapped else "in memory"
+        return f"AudioBuffer({self.frames} frames, {self.channels} ch, {self.sample_rate} Hz, {storage})"
+    
+    def with_data(self, data):
+        """A new in-memory buffer with the same sample rate, e.g. for a processed version of this one."""
+        return AudioBuffer(data, self.sample_rate)
+    
+    @classmethod
+    def from_file(cls, input_file, sample_rate, channels=2, ffmpeg_path=None, memmap_path=None):
+        """
+        Decode an audio file once, resampled to the given rate.
+        
+        Args:
+            input_file (str): Path to input audio file (any format FFmpeg reads)
+            sample_rate (int): Sample rate of the buffer
+            channels (int): Number of channels of the buffer
+            ffmpeg_path (str, optional): Path to FFmpeg executable
+            memmap_path (str, optional): Decode into this raw float32 file and memory-map it
+                instead of holding the samples in memory
+            
+        Returns:
+            AudioBuffer: The decoded audio
+        """
+        blocks = cls._report_decoded(decode_stream(input_file, sample_rate, DECODE_BLOCK_FRAMES, channels,
+                                                   ffmpeg_path), sample_rate)
+        if memmap_path is None:
+            chunks = list(blocks)
+            data = np.concatenate(chunks) if chunks else np.zeros((0, channels), dtype=np.float32)
+            return cls(data, sample_rate)
+        
+        try:
+            with open(memmap_path, 'wb') as f:
+                for block in blocks:
+                    f.write(block.tobytes())
+        except BaseException:
+            if os.path.exists(memmap_path):
+                os.remove(memmap_path)
+            raise
+        return cls.open_raw(memmap_path, sample_rate, channels)
+    
+    @staticmethod
+    def _report_decoded(blocks, sample_rate):
+        """Pass decoded blocks through, reporting the decoded seconds as progress."""
+        frames = 0
+        for block in blocks:
+            frames += len(block)
+            report_audio(frames / sample_rate)
+            yield block
+    
+    @classmethod
+    def from_wav(cls, path):
+        """
+        Read a WAV file (e.g., a separated stem) into a buffer.
+        
+        Returns:
+            AudioBuffer: The samples of the file at its own sample rate
+        """
+        stems, lengths, sample_rate = load_stems([path])
+        return cls(stems[0, :lengths[0]], sample_rate)
+    
+    @classmethod
+    def open_raw(cls, path, sample_rate, channels=2):
+        """
+        Memory-map a raw float32 file written by from_file().
+        
+        Returns:
+            AudioBuffer: Read-only buffer backed by the file
+        """
+        if os.path.getsize(path) == 0:
+            # Empty files can't be mapped
+            return cls(np.zeros((0, channels), dtype=np.float32), sample_rate, path)
+        data = np.memmap(path, dtype='<f4', mode='r').reshape(-1, channels)
+        return cls(data, sample_rate, path)
+    
+    def write_wav(self, path):
+        """Write the buffer as a 16-bit PCM WAV file."""
+        write_wav(path, self.data, self.sample_rate)
+    
+    def release(self):
+        """Drop the samples, and remove the backing file of a mapped buffer."""
+        self.data = np.zeros((0, self.channels), dtype=np.float32)
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+def stem_buffers(stems, sample_rate):
+    """
+    Wrap separated stems in buffers.
+    
+    Args:
+        stems (dict): Stem name -> numpy.ndarray (or AudioBuffer) of shape (samples, channels)
+        sample_rate (int): Sample rate of the stems
+        
+    Returns:
+        dict: Stem name -> AudioBuffer
+    """
+    return {name: stem if isinstance(stem, AudioBuffer) else AudioBuffer(stem, sample_rate)
+            for name, stem in stems.items()}
+
+
+def load_stem_buffers(paths, names=STEM_NAMES):
+    """
+    Decode stem WAV files once into buffers.
+    
+    Args:
+        paths (list): Paths to the stem files
+        names (sequence): Stem name of each path
+    
+    Returns:
+        dict: Stem name -> AudioBuffer
+    """
+    stems, lengths, sample_rate = load_stems(paths)
+    return {name: AudioBuffer(stems[i, :lengths[i]], sample_rate) for i, name in enumerate(names)}
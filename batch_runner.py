@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Batch processing of many files, optionally spread over several worker processes.
+Each worker process owns a warm separator engine and processes the files sent by the parent.
+Short files can be packed in groups into a single separator call (see separate_packed).
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audio_buffer import stem_buffers
+from cancellation import check_cancelled
+from extract_bass import extract_bass_from_file
+from metrics import measure_stage
+from mix_wavs import plan_separation, requested_mixes
+from progress import activate_tracker, format_seconds, probe_duration, report_stage
+from separator_engine import DEFAULT_MODEL, SeparatorEngine, get_engine
+
+logger = logging.getLogger(__name__)
+
+# Only files up to this long are packed into a shared separator call, longer ones are separated alone
+PACK_MAX_SECONDS = 60.0
+
+# Separator engine owned by the current worker process
+_worker_engine = None
+
+
+def _init_worker(ffmpeg_path=None, model=DEFAULT_MODEL, ignore_interrupt=False, metrics=None):
+    """
+    Initialize a worker process: configure FFmpeg and load a warm separator.
+    
+    Args:
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        model (str): Spleeter model descriptor
+        ignore_interrupt (bool): Ignore Ctrl+C, which reaches the whole process group,
+            so that the worker finishes its file while the parent shuts down gracefully
+        metrics (MetricsRecorder, optional): Recorder for the model loading time ('model_init')
+    """
+    global _worker_engine
+    
+    if ignore_interrupt:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    if ffmpeg_path:
+        from pydub import AudioSegment
+        AudioSegment.converter = ffmpeg_path
+    
+    # Worker processes can't start Spleeter's own writer pool
+    _worker_engine = SeparatorEngine(model, multiprocess=False)
+    try:
+        with measure_stage(metrics, None, 'model_init'):
+            _worker_engine.warm_up()
+    except Exception as e:
+        # Each file will report the error when it tries to use the engine
+        logger.error(f"Worker {os.getpid()} failed to warm up Spleeter separator: {str(e)}")
+
+
+def _process_file(file_path, output_folder, options):
+    """Process one file in a worker process with the worker's engine."""
+    return extract_bass_from_file(file_path, output_folder, engine=_worker_engine, **options)
+
+
+def _process_packed(files, output_folder, options):
+    """Process a group of files in a worker process with the worker's engine, see process_packed."""
+    return process_packed(files, output_folder, options, _worker_engine)
+
+
+def separate_packed(files, engine, options):
+    """
+    Separate the short files of a group together, in a single separator call.
+    
+    For short clips the fixed cost of a separator call (STFT setup, a forward
+    pass of the network) is most of their separation time; packed, it is paid
+    once per group. Files with cached stems are not separated again, and the
+    stems of the packed files are stored in the cache. Files longer than
+    PACK_MAX_SECONDS, or whose length can't be read, are left to be processed
+    alone.
+    
+    Args:
+        files (list): Paths to input audio files
+        engine (SeparatorEngine): Separator engine, replaced by the engine of the
+            model the requested outputs need if it differs
+        options (dict): Keyword arguments for extract_bass_from_file
+    
+    Returns:
+        dict: File path -> stems (dict stem name -> AudioBuffer) of the files that were
+            separated; the other files are missing
+    """
+    mixes = requested_mixes(options.get('novocals', False), options.get('nodrums', False),
+                            options.get('noother', False), options.get('bassonly', False))
+    model, stem_names = plan_separation(mixes)
+    if engine is None or engine.model != model:
+        engine = get_engine(model)
+    stem_cache = options.get('stem_cache')
+    ffmpeg_path = options.get('ffmpeg_path')
+    
+    separated = {}
+    buffers = {}
+    # Hashing a file for the cache reads it, so the key of the lookup is reused to store the stems
+    cache_keys = {}
+    for file_path in files:
+        check_cancelled()
+        if stem_cache is not None:
+            try:
+                cache_keys[file_path] = stem_cache.key(file_path, engine.model)
+                cached = stem_cache.get(file_path, engine.model, cache_keys[file_path])
+                if cached and cached[1] == engine.sample_rate:
+                    separated[file_path] = stem_buffers({name: cached[0][name] for name in stem_names},
+                                                        engine.sample_rate)
+                    continue
+            except Exception as e:
+                logger.warning(f"Stem cache lookup failed for {file_path}: {str(e)}")
+        
+        # Read from the header, so long files are never decoded here
+        duration = probe_duration(file_path, ffmpeg_path)
+        if duration is None or duration > PACK_MAX_SECONDS:
+            continue
+        try:
+            buffers[file_path] = engine.load_buffer(file_path, ffmpeg_path)
+        except Exception as e:
+            # Processed alone, which reports the error
+            logger.warning(f"Failed to decode {file_path} for packed separation: {str(e)}")
+    
+    if not buffers:
+        return separated
+    
+    try:
+        engine.load()
+        logger.info(f"Running Spleeter separation of {len(buffers)} packed files...")
+        with measure_stage(options.get('metrics'), None, 'separate_packed'):
+            packed_stems = engine.separate_buffers(list(buffers.values()))
+    except Exception as e:
+        logger.error(f"Packed separation failed, separating the files one by one: {str(e)}")
+        return separated
+    
+    for file_path, stems in zip(buffers, packed_stems):
+        # Only the stems the outputs use are kept until the file is processed
+        separated[file_path] = {name: stems[name] for name in stem_names}
+        if stem_cache is not None:
+            try:
+                stem_cache.put(file_path, engine.model, {name: stem.data for name, stem in stems.items()},
+                               engine.sample_rate, cache_keys.get(file_path))
+            except Exception as e:
+                logger.warning(f"Failed to cache stems for {file_path}: {str(e)}")
+    return separated
+
+
+def process_packed(files, output_folder, options, engine=None, progress=None):
+    """
+    Process a group of files, the short ones separated together (see separate_packed).
+    
+    Args:
+        files (list): Paths to input audio files
+        output_folder (str): Path to output folder
+        options (dict): Keyword arguments for extract_bass_from_file
+        engine (SeparatorEngine, optional): Separator engine to reuse
+        progress (ProgressTracker, optional): Receives the stages and progress of each file;
+            the packed separation counts as a stage of the first file of the group
+    
+    Returns:
+        list: (file path, ok) for each file, in order
+    """
+    if progress is not None:
+        progress.start_file(files[0])
+    with activate_tracker(progress):
+        report_stage('separate_packed')
+        separated = separate_packed(files, engine, options)
+    
+    results = []
+    for index, file_path in enumerate(files):
+        if progress is not None and index > 0:
+            progress.start_file(file_path)
+        try:
+            with activate_tracker(progress):
+                ok = extract_bass_from_file(file_path, output_folder, engine=engine,
+                                            separated=separated.pop(file_path, None), **options)
+        except Exception as e:
+            logger.error(f"Failed to process {file_path}: {str(e)}")
+            ok = False
+        if progress is not None:
+            progress.finish_file(ok)
+        results.append((file_path, ok))
+    return results
+
+
+def create_worker_pool(workers, ffmpeg_path=None, ignore_interrupt=False, metrics=None):
+    """
+    Start a pool of worker processes, each with its own warm separator engine.
+    
+    Submit files with pool.submit(_process_file, file_path, output_folder, options).
+    
+    Args:
+        workers (int): Number of worker processes
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        ignore_interrupt (bool): Whether workers ignore Ctrl+C (for long-running services)
+        metrics (MetricsRecorder, optional): Recorder for the model loading time of each worker
+        
+    Returns:
+        ProcessPoolExecutor: The worker pool
+    """
+    # Spawn fresh interpreters so that no TensorFlow state is inherited by fork
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                               initargs=(ffmpeg_path, DEFAULT_MODEL, ignore_interrupt, metrics))
+
+
+def run_batch(files, output_folder, options=None, workers=1, ffmpeg_path=None, progress=None, pack_size=1):
+    """
+    Extract bass from a list of files.
+    
+    With one worker the files are processed in this process with the shared
+    engine. With more workers, each worker process loads its own warm engine
+    and files are dispatched as workers become free. With a pack size above one,
+    files are processed in groups of that many, the short ones of each group
+    separated together in one separator call (see separate_packed).
+    
+    Args:
+        files (list): Paths to input audio files
+        output_folder (str): Path to output folder
+        options (dict, optional): Keyword arguments for extract_bass_from_file
+            (nocleanup, novocals, nodrums, noother, bassonly, input_pitch, ...)
+        workers (int): Number of worker processes
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        progress (ProgressTracker, optional): Receives the stages and progress of each file
+            with one worker; with more workers the ETA of the batch is printed per finished file
+        pack_size (int): Number of files per group for packed separation, 1 to separate every
+            file on its own
+    
+    Returns:
+        tuple: (successful_files, failed_files) lists of file paths
+    """
+    options = dict(options or {})
+    successful_files = []
+    failed_files = []
+    groups = [files[i:i + pack_size] for i in range(0, len(files), pack_size)] if pack_size > 1 else None
+    
+    if workers <= 1:
+        engine = get_engine()
+        try:
+            with measure_stage(options.get('metrics'), None, 'model_init'):
+                engine.warm_up()
+        except Exception as e:
+            logger.error(f"Failed to warm up Spleeter separator: {str(e)}")
+        
+        if groups is not None:
+            for group in groups:
+                for file_path, ok in process_packed(group, output_folder, options, engine, progress):
+                    (successful_files if ok else failed_files).append(file_path)
+            return successful_files, failed_files
+        
+        for file_path in files:
+            if progress is not None:
+                progress.start_file(file_path)
+            try:
+                with activate_tracker(progress):
+                    ok = extract_bass_from_file(file_path, output_folder, engine=engine, **options)
+            except Exception as e:
+                logger.error(f"Failed to process {file_path}: {str(e)}")
+                ok = False
+            if progress is not None:
+                progress.finish_file(ok)
+            (successful_files if ok else failed_files).append(file_path)
+        return successful_files, failed_files
+    
+    workers = min(workers, len(groups) if groups is not None else len(files))
+    logger.info(f"Starting {workers} worker processes...")
+    
+    with create_worker_pool(workers, ffmpeg_path, metrics=options.get('metrics')) as pool:
+        if groups is not None:
+            futures = {pool.submit(_process_packed, group, output_folder, options): group for group in groups}
+        else:
+            futures = {
+                pool.submit(_process_file, file_path, output_folder, options): [file_path]
+                for file_path in files
+            }
+        start = time.perf_counter()
+        
+        done = 0
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+                if groups is None:
+                    results = [(futures[future][0], results)]
+            except Exception as e:
+                logger.error(f"Failed to process {', '.join(futures[future])}: {str(e)}")
+                results = [(file_path, False) for file_path in futures[future]]
+            
+            for file_path, ok in results:
+                done += 1
+                (successful_files if ok else failed_files).append(file_path)
+                status = "OK" if ok else "FAILED"
+                eta = ""
+                if progress is not None and done < len(files):
+                    # The workers report no stages to this process, the batch rate is measured per file
+                    elapsed = time.perf_counter() - start
+                    eta = f" (batch ETA {format_seconds(elapsed / done * (len(files) - done))})"
+                print(f"[{done}/{len(files)}] {status}: {file_path}{eta}")
+    
+    return successful_files, failed_files
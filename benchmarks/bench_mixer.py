@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: stem mixing with the previous pydub overlay chains vs. the vectorized NumPy mixer.
+
+Both variants read the same four stem WAV files and build all five mixes
+(NOBASS, BASSONLY, NOVOCALS, NODRUMS, NOOTHER). MP3 export is identical for
+both and is left out so that only the mixing step is measured.
+
+Usage: python benchmarks/bench_mixer.py [--seconds S] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mix_wavs import MIXES, STEM_NAMES, array_to_segment, load_stems, mix_stem_array, segment_to_array
+from synthetic_audio import generate_song, write_wav
+
+
+def write_stems(folder, seconds):
+    """Write four synthetic stem WAV files and return their paths in STEM_NAMES order."""
+    paths = []
+    for i, name in enumerate(STEM_NAMES):
+        path = os.path.join(folder, f"{name}.wav")
+        write_wav(path, generate_song(seconds, seed=i) * 0.5)
+        paths.append(path)
+    return paths
+
+
+def mix_overlay(paths):
+    """Previous implementation: pad every stem and chain .overlay() for each mix (exports removed)."""
+    bass = AudioSegment.from_wav(paths[0])
+    drums = AudioSegment.from_wav(paths[1])
+    vocals = AudioSegment.from_wav(paths[2])
+    other = AudioSegment.from_wav(paths[3])
+    
+    max_len_nobass = max(len(drums), len(vocals), len(other))
+    drums_nobass = drums + AudioSegment.silent(max_len_nobass - len(drums))
+    vocals_nobass = vocals + AudioSegment.silent(max_len_nobass - len(vocals))
+    other_nobass = other + AudioSegment.silent(max_len_nobass - len(other))
+    mixed_nobass = drums_nobass.overlay(vocals_nobass).overlay(other_nobass)
+    
+    max_len_novocals = max(len(drums), len(bass), len(other))
+    drums_novocals = drums + AudioSegment.silent(max_len_novocals - len(drums))
+    bass_novocals = bass + AudioSegment.silent(max_len_novocals - len(bass))
+    other_novocals = other + AudioSegment.silent(max_len_novocals - len(other))
+    mixed_novocals = drums_novocals.overlay(bass_novocals).overlay(other_novocals)
+    
+    max_len_nodrums = max(len(bass), len(vocals), len(other))
+    bass_nodrums = bass + AudioSegment.silent(max_len_nodrums - len(bass))
+    vocals_nodrums = vocals + AudioSegment.silent(max_len_nodrums - len(vocals))
+    other_nodrums = other + AudioSegment.silent(max_len_nodrums - len(other))
+    mixed_nodrums = bass_nodrums.overlay(vocals_nodrums).overlay(other_nodrums)
+    
+    max_len_noother = max(len(bass), len(vocals), len(drums))
+    bass_noother = bass + AudioSegment.silent(max_len_noother - len(bass))
+    vocals_noother = vocals + AudioSegment.silent(max_len_noother - len(vocals))
+    drums_noother = drums + AudioSegment.silent(max_len_noother - len(drums))
+    mixed_noother = bass_noother.overlay(vocals_noother).overlay(drums_noother)
+    
+    return {
+        'NOBASS': mixed_nobass,
+        'BASSONLY': bass,
+        'NOVOCALS': mixed_novocals,
+        'NODRUMS': mixed_nodrums,
+        'NOOTHER': mixed_noother,
+    }
+
+
+def mix_vectorized(paths):
+    """New implementation: load stems once and build all mixes in one pass."""
+    stems, lengths, _ = load_stems(paths)
+    return mix_stem_array(stems, lengths, list(MIXES))
+
+
+def measure(function, paths, repeat):
+    """Return (best wall time, peak traced memory in bytes, last result)."""
+    best = float('inf')
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        result = None
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = function(paths)
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pydub overlay mixing with the vectorized mixer")
+    parser.add_argument('--seconds', type=float, default=180.0, help='Length of the synthetic stems')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the best time is reported')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_stems(folder, args.seconds)
+        
+        overlay_time, overlay_peak, overlay_result = measure(mix_overlay, paths, args.repeat)
+        vector_time, vector_peak, vector_result = measure(mix_vectorized, paths, args.repeat)
+    
+    # The vectorized mixer must produce the same samples as the overlay chains
+    max_diff = max(
+        np.abs(segment_to_array(overlay_result[mix]) - segment_to_array(array_to_segment(vector_result[mix], 44100))).max()
+        for mix in MIXES
+    )
+    
+    print(f"Stems: 4 x {args.seconds:.0f}s, mixes: {', '.join(MIXES)}")
+    print(f"pydub overlay: {overlay_time:.3f}s, peak memory {overlay_peak / 1e6:.1f} MB")
+    print(f"NumPy mixer:   {vector_time:.3f}s, peak memory {vector_peak / 1e6:.1f} MB")
+    print(f"Speedup: {overlay_time / vector_time:.2f}x, max sample difference: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
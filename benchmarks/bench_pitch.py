@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pitch shifting of stem files with the in-process NumPy backend vs. FFmpeg.
+
+Each backend shifts the same four synthetic stem WAVs one by one, as
+extract_bass_from_file does, so the FFmpeg timing includes process startup
+and the WAV round trip.
+
+Usage: python benchmarks/bench_pitch.py [--seconds S] [--from-note C] [--to-note D]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pitch_shifter import SCIPY_AVAILABLE, process_audio_with_pitch_shift
+from synthetic_audio import generate_song, write_wav
+
+STEMS = ('bass', 'drums', 'vocals', 'other')
+
+
+def run_backend(backend, stem_paths, output_folder, from_note, to_note):
+    """Shift every stem with one backend, returns the total time or None on failure."""
+    start = time.perf_counter()
+    for path in stem_paths:
+        output_file = os.path.join(output_folder, f"{backend}_{os.path.basename(path)}")
+        if not process_audio_with_pitch_shift(path, output_file, from_note, to_note, backend=backend):
+            return None
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pitch shifting backends")
+    parser.add_argument('--seconds', type=float, default=30.0, help='Length of each synthetic stem')
+    parser.add_argument('--from-note', default='C', help='Source note')
+    parser.add_argument('--to-note', default='D', help='Target note')
+    args = parser.parse_args()
+    
+    temp_dir = tempfile.mkdtemp(prefix="bench_pitch_")
+    try:
+        stem_paths = []
+        for i, name in enumerate(STEMS):
+            path = os.path.join(temp_dir, f"{name}.wav")
+            write_wav(path, generate_song(args.seconds, seed=i))
+            stem_paths.append(path)
+        
+        print(f"Stems: {len(STEMS)} x {args.seconds:.0f}s, {args.from_note} -> {args.to_note} "
+              f"(SciPy resampling: {'yes' if SCIPY_AVAILABLE else 'no'})")
+        for backend in ('numpy', 'ffmpeg'):
+            elapsed = run_backend(backend, stem_paths, temp_dir, args.from_note, args.to_note)
+            if elapsed is None:
+                print(f"{backend:<7} FAILED")
+            else:
+                print(f"{backend:<7} {elapsed:.2f}s total, {elapsed / len(STEMS):.2f}s per stem")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
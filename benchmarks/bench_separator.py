@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-file separation time with a cold separator vs. a warm, reused one.
+
+Cold: a new Spleeter separator is created for every file (previous behaviour).
+Warm: one separator engine is created and warmed up once for the whole batch.
+
+Usage: python benchmarks/bench_separator.py [--files N] [--seconds S]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from separator_engine import SeparatorEngine
+from synthetic_audio import generate_song
+
+
+def run_cold(songs):
+    """Separate each song with a freshly created separator."""
+    timings = []
+    for song in songs:
+        start = time.perf_counter()
+        engine = SeparatorEngine()
+        engine.separate(song)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_warm(songs):
+    """Separate each song with one engine created and warmed up beforehand."""
+    start = time.perf_counter()
+    engine = SeparatorEngine().warm_up()
+    setup_time = time.perf_counter() - start
+    
+    timings = []
+    for song in songs:
+        start = time.perf_counter()
+        engine.separate(song)
+        timings.append(time.perf_counter() - start)
+    return setup_time, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold and warm separator per-file time")
+    parser.add_argument('--files', type=int, default=5, help='Number of files in the batch')
+    parser.add_argument('--seconds', type=float, default=30.0, help='Length of each synthetic song')
+    args = parser.parse_args()
+    
+    songs = [generate_song(args.seconds, seed=i) for i in range(args.files)]
+    
+    cold = run_cold(songs)
+    setup_time, warm = run_warm(songs)
+    
+    cold_avg = sum(cold) / len(cold)
+    warm_avg = sum(warm) / len(warm)
+    warm_total = setup_time + sum(warm)
+    
+    print(f"Files: {args.files} x {args.seconds:.0f}s")
+    print(f"Cold separator: {cold_avg:.2f}s per file, {sum(cold):.2f}s total")
+    print(f"Warm separator: {warm_avg:.2f}s per file, {warm_total:.2f}s total (including {setup_time:.2f}s one-time setup)")
+    if warm_avg > 0:
+        print(f"Per-file speedup: {cold_avg / warm_avg:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
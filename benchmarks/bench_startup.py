@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: startup time of the command line tool and of the GUI.
+
+Each case runs in a fresh Python process and is timed from process start:
+'--help', an argument error, a folder without MP3 files, and GUI launch
+until the window is built and shown (skipped without a display). None of
+them needs the separator, so none of them should pay for the Spleeter and
+TensorFlow import any more; that import is timed on its own as the cost
+every startup paid before it was deferred.
+
+Usage: python benchmarks/bench_startup.py [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTRACT_BASS = os.path.join(ROOT, "extract_bass.py")
+
+# Builds and shows the GUI window and reports whether Spleeter got imported while building it
+# (the background preload starts once the window is shown). Exits right away instead of
+# waiting for the preload to finish.
+GUI_SNIPPET = """
+import os, sys
+sys.path.insert(0, {gui_dir!r})
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print('nodisplay')
+    sys.stdout.flush()
+    os._exit(0)
+import extract_bass_gui
+app = extract_bass_gui.BassExtractorGUI(root)
+imported = 'spleeter' in sys.modules
+root.update()
+print(imported)
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+def time_command(cmd, repeat, cwd):
+    """
+    Run a command several times.
+    
+    Returns:
+        tuple: (median wall time in seconds, CompletedProcess of the last run)
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI and GUI startup time")
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case, the median is reported')
+    args = parser.parse_args()
+    repeat = max(1, args.repeat)
+    
+    # Runs in a scratch folder, so the error.log of the runs doesn't end up in the repository
+    work_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    empty_folder = os.path.join(work_dir, "empty")
+    os.makedirs(empty_folder)
+    try:
+        cases = [
+            ("python (interpreter only)", [sys.executable, '-c', 'pass']),
+            ("extract_bass --help", [sys.executable, EXTRACT_BASS, '--help']),
+            ("extract_bass (argument error)", [sys.executable, EXTRACT_BASS, '--output_folder', empty_folder]),
+            ("extract_bass (no MP3 files)", [sys.executable, EXTRACT_BASS, '--folder', empty_folder,
+                                             '--output_folder', empty_folder]),
+        ]
+        for name, cmd in cases:
+            seconds, _ = time_command(cmd, repeat, work_dir)
+            print(f"{name:<32} {seconds:7.2f}s")
+        
+        gui_cmd = [sys.executable, '-c', GUI_SNIPPET.format(gui_dir=os.path.join(ROOT, 'gui'))]
+        seconds, result = time_command(gui_cmd, repeat, work_dir)
+        if result.stdout.strip() == 'nodisplay':
+            print(f"{'GUI launch':<32}       - (no display)")
+        else:
+            imported = " (Spleeter imported!)" if result.stdout.strip() == 'True' else ""
+            print(f"{'GUI launch':<32} {seconds:7.2f}s{imported}")
+        
+        seconds, result = time_command([sys.executable, '-c', 'import spleeter.separator'], repeat, work_dir)
+        if result.returncode != 0:
+            print(f"{'Spleeter import (now deferred)':<32}       - (not installed)")
+        else:
+            print(f"{'Spleeter import (now deferred)':<32} {seconds:7.2f}s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak memory of whole-file vs. streaming separation of a long input.
+
+Full: the whole track is decoded, separated and mixed in memory (--inmemory).
+Streaming: the track is separated in overlapping windows and encoded as it goes (--stream).
+
+Each mode runs in its own child process so that peak RSS is measured independently.
+
+Usage: python benchmarks/bench_streaming.py [--minutes M] [--window S]
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from synthetic_audio import write_long_wav
+
+
+def run_child(mode, input_file, output_folder, window):
+    """Process the input with one mode, called inside the child process."""
+    from extract_bass import extract_bass_from_file
+    
+    if mode == 'stream':
+        ok = extract_bass_from_file(input_file, output_folder, stream_window=window)
+    else:
+        ok = extract_bass_from_file(input_file, output_folder, in_memory=True)
+    sys.exit(0 if ok else 1)
+
+
+def measure(mode, input_file, window):
+    """
+    Run one mode in a child process.
+    
+    Returns:
+        tuple: (wall time in seconds, peak RSS in MB, success)
+    """
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+    try:
+        # The input is moved to DONE after processing, so work on a copy
+        work_input = os.path.join(work_dir, os.path.basename(input_file))
+        shutil.copy(input_file, work_input)
+        
+        before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode,
+                                 '--input', work_input, '--output', os.path.join(work_dir, 'out'),
+                                 '--window', str(window)], cwd=ROOT)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        # ru_maxrss is the maximum over all waited-for children, in KB on Linux
+        if peak <= before:
+            print(f"Warning: peak RSS of '{mode}' is not above the previous child's")
+        return elapsed, peak / 1024, result.returncode == 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare peak memory of full and streaming separation")
+    parser.add_argument('--minutes', type=float, default=120.0, help='Length of the synthetic input')
+    parser.add_argument('--window', type=float, default=30.0, help='Streaming window length in seconds')
+    parser.add_argument('--modes', default='stream,full', help='Comma separated modes to run, in order')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--input', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args.child, args.input, args.output, args.window)
+        return
+    
+    temp_dir = tempfile.mkdtemp(prefix="bench_streaming_")
+    try:
+        input_file = os.path.join(temp_dir, "long_input.wav")
+        print(f"Generating {args.minutes:.0f} minute synthetic input...")
+        write_long_wav(input_file, args.minutes * 60)
+        
+        # Run the mode expected to use less memory first: ru_maxrss only grows
+        for mode in args.modes.split(','):
+            elapsed, peak_mb, ok = measure(mode, input_file, args.window)
+            status = "OK" if ok else "FAILED"
+            print(f"{mode:<7} {status:<7} wall={elapsed:.1f}s peak RSS={peak_mb:.0f} MB")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
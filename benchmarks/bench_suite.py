@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: every stage of the extraction, on synthetic songs of several lengths.
+
+Stages: separator init (model load and warm-up), separation, pitch shifting of
+one stem with each backend, mixing of the four stems into all five mixes, MP3
+export of the mixes, and mixing plus export in one block-wise pass over the
+memory-mapped stem files (as mix_wavs does). Each stage reports its median time
+over --repeat runs, its throughput in seconds of audio per second and its
+peak memory (RSS of this process above the level at the start of the stage;
+FFmpeg child processes are not included).
+
+Results can be saved as a baseline and later runs compared against it; the
+script exits with status 1 if a stage got slower than the threshold allows.
+Timings depend on the machine, so no baseline is shipped: record one with
+--save-baseline on the machine that runs the comparisons.
+
+Usage:
+    python benchmarks/bench_suite.py --save-baseline
+    python benchmarks/bench_suite.py [--lengths 10,60,180] [--repeat 3] [--threshold 0.15]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mix_wavs import MIXES, STEM_NAMES, export_mixes, export_stem_mixes, load_stems, map_stems, mix_stem_array
+from pitch_shifter import process_audio_with_pitch_shift
+from synthetic_audio import SAMPLE_RATE, generate_song, write_wav
+
+# Spleeter is optional here: without it, the separation stages are skipped and synthetic stems are used
+from separator_engine import SPLEETER_AVAILABLE, SeparatorEngine, import_backend
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# A stage regresses when it is this much slower than the baseline (0.15 = 15%)
+DEFAULT_THRESHOLD = 0.15
+
+# Differences below this many seconds are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.02
+
+PITCH_BACKENDS = ('numpy', 'ffmpeg', 'pydub')
+
+
+class PeakMemory:
+    """Context manager that samples the RSS in a background thread and keeps the peak."""
+    
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @staticmethod
+    def rss():
+        """Current RSS in bytes, 0 where /proc is not available."""
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            return 0
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.rss())
+    
+    def __enter__(self):
+        self.start_rss = self.peak_rss = self.rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.rss())
+    
+    @property
+    def peak_mb(self):
+        """Peak RSS above the level at the start, in MB."""
+        return (self.peak_rss - self.start_rss) / 1024 / 1024
+
+
+def run_stage(function, repeat):
+    """
+    Run a stage several times.
+    
+    Returns:
+        dict: median seconds, all runs and the highest peak memory in MB
+    """
+    times = []
+    peak_mb = 0.0
+    for _ in range(repeat):
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        peak_mb = max(peak_mb, memory.peak_mb)
+    return {'seconds': statistics.median(times), 'runs': times, 'peak_mb': peak_mb}
+
+
+def synthetic_stems(seconds):
+    """Four synthetic stems in STEM_NAMES order, used when Spleeter is not installed."""
+    return {name: generate_song(seconds, seed=i) * 0.5 for i, name in enumerate(STEM_NAMES)}
+
+
+def benchmark_length(seconds, repeat, engine, backends, work_dir):
+    """
+    Benchmark all per-song stages on one synthetic song.
+    
+    Returns:
+        dict: Stage name -> result, see run_stage, with throughput added
+    """
+    results = {}
+    song = generate_song(seconds)
+    
+    if engine is not None:
+        results['separate'] = run_stage(lambda: engine.separate(song), repeat)
+        stems = engine.separate(song)
+    else:
+        stems = synthetic_stems(seconds)
+    
+    stem_paths = []
+    for name in STEM_NAMES:
+        path = os.path.join(work_dir, f"{name}.wav")
+        write_wav(path, stems[name])
+        stem_paths.append(path)
+    
+    for backend in backends:
+        output_file = os.path.join(work_dir, f"bass_{backend}.wav")
+        shift = lambda: process_audio_with_pitch_shift(stem_paths[0], output_file, 'C', 'D', backend=backend)
+        if not shift():
+            print(f"  pitch_{backend}: backend not available, skipped")
+            continue
+        results[f'pitch_{backend}'] = run_stage(shift, repeat)
+    
+    # Decode the four stem WAVs and build every mix in memory
+    all_mixes = list(MIXES)
+    
+    def mix():
+        stem_array, lengths, _ = load_stems(stem_paths)
+        return mix_stem_array(stem_array, lengths, all_mixes)
+    
+    results['mix'] = run_stage(mix, repeat)
+    
+    mixes = mix()
+    results['export'] = run_stage(lambda: export_mixes(mixes, SAMPLE_RATE, "bench", work_dir), repeat)
+    
+    # Mixing and export in one pass over the memory-mapped stems, as in mix_wavs
+    mix_export = lambda: export_stem_mixes(map_stems(stem_paths)[0], all_mixes, SAMPLE_RATE, "bench", work_dir)
+    results['mix_export'] = run_stage(mix_export, repeat)
+    
+    for result in results.values():
+        result['throughput'] = seconds / result['seconds'] if result['seconds'] else 0.0
+    return results
+
+
+def run_suite(lengths, repeat, backends):
+    """
+    Run every stage for every song length.
+    
+    Returns:
+        dict: 'meta' (environment) and 'results' (key 'stage@<length>s' -> result)
+    """
+    results = {}
+    engine = None
+    if SPLEETER_AVAILABLE:
+        print("Separator init...")
+        # The import itself is not part of the stage, as when Spleeter was imported at startup
+        import_backend()
+        memory = PeakMemory()
+        with memory:
+            start = time.perf_counter()
+            engine = SeparatorEngine()
+            engine.warm_up()
+            elapsed = time.perf_counter() - start
+        results['separator_init'] = {'seconds': elapsed, 'runs': [elapsed], 'peak_mb': memory.peak_mb,
+                                     'throughput': None}
+    else:
+        print("Spleeter is not installed, skipping separator init and separation")
+    
+    work_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        for seconds in lengths:
+            print(f"Song length {seconds:.0f}s...")
+            for stage, result in benchmark_length(seconds, repeat, engine, backends, work_dir).items():
+                results[f"{stage}@{seconds:g}s"] = result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    meta = {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'spleeter': SPLEETER_AVAILABLE,
+        'lengths': lengths,
+        'repeat': repeat,
+    }
+    return {'meta': meta, 'results': results}
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+    
+    Returns:
+        list: Keys of the stages that regressed
+    """
+    regressions = []
+    for key, result in results['results'].items():
+        reference = baseline['results'].get(key)
+        if reference is None:
+            continue
+        ratio = result['seconds'] / reference['seconds'] if reference['seconds'] else 1.0
+        regressed = (ratio > 1.0 + threshold
+                     and result['seconds'] - reference['seconds'] > MIN_REGRESSION_SECONDS)
+        if regressed:
+            regressions.append(key)
+        print(f"  {key:<22} {reference['seconds']:8.3f}s -> {result['seconds']:8.3f}s "
+              f"({(ratio - 1.0) * 100:+6.1f}%){'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'stage':<22} {'median':>9} {'audio s/s':>10} {'peak MB':>8}")
+    for key, result in results['results'].items():
+        throughput = f"{result['throughput']:.1f}" if result['throughput'] else '-'
+        print(f"{key:<22} {result['seconds']:8.3f}s {throughput:>10} {result['peak_mb']:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every extraction stage and compare with a baseline")
+    parser.add_argument('--lengths', default='10,60,180', help='Comma separated song lengths in seconds')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the median is reported')
+    parser.add_argument('--backends', default=','.join(PITCH_BACKENDS), help='Pitch shifting backends to time')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline results file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown before a stage counts as a regression (0.15 = 15%%)')
+    parser.add_argument('--output', help='Also write the results of this run to a JSON file')
+    args = parser.parse_args()
+    
+    # Check before the suite runs, a comparison without a baseline would only waste the time
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"Error: No baseline at {args.baseline}. Baselines are machine specific and none is "
+              f"shipped, record one on this machine first with:")
+        print(f"  python benchmarks/bench_suite.py --lengths {args.lengths} --save-baseline")
+        sys.exit(1)
+    
+    lengths = [float(length) for length in args.lengths.split(',')]
+    backends = [backend for backend in args.backends.split(',') if backend]
+    results = run_suite(lengths, max(1, args.repeat), backends)
+    print_results(results)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"Compared with baseline from {baseline['meta']['date']} (threshold {args.threshold * 100:.0f}%):")
+    if baseline['meta'].get('platform') != results['meta']['platform']:
+        print("  Warning: the baseline was recorded on a different platform")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Synthetic multi-instrument test audio for the benchmarks.
+Everything is generated locally, no network or audio files required.
+"""
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+
+
+def generate_song(seconds, sample_rate=SAMPLE_RATE, seed=0):
+    """
+    Generate a stereo test song with a bass line, drums, a vocal-like lead and chords.
+    
+    Args:
+        seconds (float): Length of the song in seconds
+        sample_rate (int): Sample rate in Hz
+        seed (int): Random seed for the drum noise
+    
+    Returns:
+        numpy.ndarray: float32 array of shape (samples, 2) in the range [-1, 1]
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(seconds * sample_rate)
+    t = np.arange(n_samples, dtype=np.float32) / sample_rate
+    
+    # Bass line: root notes changing every beat (120 bpm)
+    beat = (t * 2).astype(np.int64)
+    bass_notes = np.array([55.0, 55.0, 73.42, 82.41], dtype=np.float32)
+    bass_freq = bass_notes[beat % len(bass_notes)]
+    bass = 0.35 * np.sin(2 * np.pi * bass_freq * t)
+    
+    # Drums: decaying noise bursts on every beat
+    beat_phase = (t * 2) % 1.0
+    drums = 0.25 * rng.standard_normal(n_samples).astype(np.float32) * np.exp(-beat_phase * 30)
+    
+    # Vocal-like lead: sine with vibrato
+    vocals = 0.2 * np.sin(2 * np.pi * 440.0 * t + 3.0 * np.sin(2 * np.pi * 5.0 * t))
+    
+    # Other: sustained major chord
+    other = sum(0.08 * np.sin(2 * np.pi * f * t) for f in (261.63, 329.63, 392.00))
+    
+    left = bass + drums + 0.7 * vocals + 1.0 * other
+    right = bass + drums + 1.0 * vocals + 0.7 * other
+    song = np.stack([left, right], axis=1).astype(np.float32)
+    
+    # Normalize to leave some headroom
+    peak = np.abs(song).max()
+    if peak > 0:
+        song *= 0.9 / peak
+    return song
+
+
+def write_wav(path, waveform, sample_rate=SAMPLE_RATE):
+    """
+    Write a float waveform as a 16-bit PCM WAV file.
+    
+    Args:
+        path (str): Output WAV path
+        waveform (numpy.ndarray): float array of shape (samples, channels)
+        sample_rate (int): Sample rate in Hz
+    """
+    import wave
+    
+    pcm = (np.clip(waveform, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(pcm.shape[1])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+
+
+def write_long_wav(path, seconds, sample_rate=SAMPLE_RATE, chunk_seconds=60):
+    """
+    Write a long test song chunk by chunk, without holding it in memory.
+    
+    Args:
+        path (str): Output WAV path
+        seconds (float): Length of the song in seconds
+        sample_rate (int): Sample rate in Hz
+        chunk_seconds (float): Length of each generated chunk
+    """
+    import wave
+    
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        remaining = seconds
+        seed = 0
+        while remaining > 0:
+            chunk = generate_song(min(chunk_seconds, remaining), sample_rate, seed)
+            wav_file.writeframes((np.clip(chunk, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+            remaining -= chunk_seconds
+            seed += 1
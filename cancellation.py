@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Cooperative cancellation of the processing of a file.
+
+A CancelToken is made the active token of the thread that processes files
+(see activate). The long-running loops (decoding, separation windows, mixing
+and export blocks) call check_cancelled() between blocks, and FFmpeg child
+processes started with run_process() are killed as soon as cancel() is
+called. The processing then stops with Cancelled, which derives from
+BaseException like KeyboardInterrupt, so the error handling of the stages
+doesn't mistake it for a failure. The separator engine is not touched and
+stays loaded for the next run.
+"""
+
+import contextlib
+import subprocess
+import threading
+
+
+class Cancelled(BaseException):
+    """Raised in the processing thread once its active CancelToken is cancelled."""
+
+
+class CancelToken:
+    """Cancellation request shared between the thread that asks for it and the processing thread."""
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+    
+    @property
+    def cancelled(self):
+        """True once cancel() was called."""
+        return self._event.is_set()
+    
+    def cancel(self):
+        """Ask the processing to stop and kill the child processes it is waiting for."""
+        with self._lock:
+            self._event.set()
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+    
+    def check(self):
+        """Raise Cancelled if cancel() was called."""
+        if self._event.is_set():
+            raise Cancelled()
+    
+    @contextlib.contextmanager
+    def track(self, process):
+        """
+        Kill a child process when the token is cancelled while the block runs.
+        
+        Args:
+            process (subprocess.Popen): Process started by the processing thread
+        """
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self._event.is_set()
+        if cancelled:
+            process.kill()
+        try:
+            yield process
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+
+_local = threading.local()
+
+
+def active_token():
+    """The active CancelToken of the calling thread, or None."""
+    return getattr(_local, 'token', None)
+
+
+@contextlib.contextmanager
+def activate(token):
+    """
+    Make a token the active token of the calling thread for the duration of the block.
+    
+    Args:
+        token (CancelToken): Token to check, None to run without cancellation
+    """
+    previous = active_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def check_cancelled():
+    """Raise Cancelled if the active token of the calling thread was cancelled."""
+    token = active_token()
+    if token is not None:
+        token.check()
+
+
+def run_process(cmd, input=None, timeout=None, text=False):
+    """
+    subprocess.run(cmd, capture_output=True) that the active token can kill.
+    
+    Args:
+        cmd (list): Command line
+        input (bytes or str, optional): Data sent to the standard input
+        timeout (float, optional): Seconds after which the process is killed
+        text (bool): Exchange str instead of bytes
+    
+    Returns:
+        subprocess.CompletedProcess: The finished process with its captured output
+    """
+    token = active_token()
+    stdin = subprocess.PIPE if input is not None else None
+    with subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=text) as process:
+        tracked = token.track(process) if token is not None else contextlib.nullcontext()
+        with tracked:
+            try:
+                stdout, stderr = process.communicate(input, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise
+    check_cancelled()
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of downloaded YouTube audio, indexed by video ID.
+
+Downloaded files are kept in a cache folder next to an SQLite index that
+records, for each video ID and ingest format, the cached file, the video
+title, its duration and the SHA-256 of its content. Resubmitted videos are
+copied from the cache without touching the network. The cache size is
+bounded and the least recently used entries are evicted.
+"""
+
+import contextlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from stem_cache import hash_file
+
+# Default cache location and size limit
+DEFAULT_CACHE_DIR = "bass_extractor_downloads"
+DEFAULT_MAX_SIZE_MB = 2000
+
+INDEX_NAME = "index.sqlite3"
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCache:
+    """
+    On-disk download cache with an SQLite index, LRU eviction and hit/miss counters.
+
+    Every operation opens and closes its own SQLite connection, so one cache can
+    be used by several download threads (and processes) at the same time.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        """
+        Args:
+            cache_dir (str): Folder holding the cached files and the index
+            max_size_mb (float): Maximum total size of the cached files in megabytes
+        """
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, INDEX_NAME)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    video_id TEXT NOT NULL,
+                    audio_format TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    duration REAL,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (video_id, audio_format)
+                )
+            """)
+
+    def __getstate__(self):
+        # Locks can't be pickled, e.g. when the cache is sent to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # The connection's own context manager only commits or rolls back, it doesn't close
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, video_id, audio_format):
+        """
+        Look up a cached download.
+
+        Args:
+            video_id (str): YouTube video ID
+            audio_format (str): Ingest format ('native', 'wav' or 'mp3')
+
+        Returns:
+            dict: path, title, duration and sha256 of the cached file, or None on a miss
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT file_name, title, duration, sha256 FROM downloads WHERE video_id = ? AND audio_format = ?",
+                (video_id, audio_format)
+            ).fetchone()
+
+            path = os.path.join(self.cache_dir, row[0]) if row else None
+            if row and not os.path.exists(path):
+                # The file was removed behind our back, forget the entry
+                logger.warning(f"Cached download of {video_id} is missing: {path}")
+                connection.execute("DELETE FROM downloads WHERE video_id = ? AND audio_format = ?",
+                                   (video_id, audio_format))
+                row = None
+
+            if row is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            connection.execute("UPDATE downloads SET last_used = ? WHERE video_id = ? AND audio_format = ?",
+                               (time.time(), video_id, audio_format))
+
+        with self._lock:
+            self.hits += 1
+        logger.info(f"Download cache hit for {video_id}")
+        return {'path': path, 'title': row[1], 'duration': row[2], 'sha256': row[3]}
+
+    def put(self, video_id, audio_format, source_file, title, duration=None):
+        """
+        Copy a downloaded file into the cache, then evict old entries if needed.
+
+        Args:
+            video_id (str): YouTube video ID
+            audio_format (str): Ingest format ('native', 'wav' or 'mp3')
+            source_file (str): Path to the downloaded file, which is left in place
+            title (str): Sanitized video title
+            duration (float, optional): Duration of the video in seconds
+        """
+        extension = os.path.splitext(source_file)[1]
+        file_name = f"{video_id}.{audio_format}{extension}"
+        path = os.path.join(self.cache_dir, file_name)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(source_file, temp_path)
+            # Atomic, so readers never see a partially copied file
+            os.replace(temp_path, path)
+            now = time.time()
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (video_id, audio_format, file_name, title, duration, hash_file(path),
+                     os.path.getsize(path), now, now)
+                )
+            logger.info(f"Stored download of {video_id} in download cache")
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Failed to store download of {video_id} in download cache: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its size limit."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT video_id, audio_format, file_name, size FROM downloads ORDER BY last_used"
+            ).fetchall()
+            total_size = sum(row[3] for row in rows)
+            for video_id, audio_format, file_name, size in rows:
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                connection.execute("DELETE FROM downloads WHERE video_id = ? AND audio_format = ?",
+                                   (video_id, audio_format))
+                total_size -= size
+                with self._lock:
+                    self.evictions += 1
+                logger.info(f"Evicted download cache entry {video_id} ({audio_format})")
+
+    def stats(self):
+        """
+        Cache counters and current size.
+
+        Returns:
+            dict: hits, misses, evictions, entries and size in bytes
+        """
+        with self._connect() as connection:
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM downloads").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'size': size,
+        }
+
+    def format_stats(self):
+        """Human readable cache counters."""
+        stats = self.stats()
+        return (f"Download cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+                f"{stats['entries']} entries ({stats['size'] / 1024 / 1024:.1f} MB of {self.max_size / 1024 / 1024:.0f} MB)")
@@ -11,18 +11,24 @@ import logging
 from datetime import datetime
 from pathlib import Path
 from pydub import AudioSegment
-from mix_wavs import mix_wavs
-from spleeter.separator import Separator
+from audio_buffer import load_stem_buffers, stem_buffers
+from cancellation import Cancelled, check_cancelled
+from metrics import FileMetrics, measure_stage
+from mix_wavs import (DEFAULT_BITRATE, DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS, export_stem_mixes, map_stems, mix_stem_list,
+                      output_path, plan_separation, remove_partials, requested_mixes)
+from progress import ProgressPrinter, ProgressTracker, report_progress
+from separator_engine import get_engine
+from streaming import extract_bass_streaming
 
 # Import pitch shifting functionality
 try:
-    from pitch_shifter import process_audio_with_pitch_shift, validate_note
+    from pitch_shifter import calculate_pitch_shift, export_mixes_with_pitch_shift, shift_pitch_buffer, validate_note
     PITCH_SHIFT_AVAILABLE = True
 except ImportError:
     PITCH_SHIFT_AVAILABLE = False
 
 
-def extract_bass_from_file(input_file, output_folder, nocleanup=False, novocals=False, nodrums=False, noother=False, bassonly=False, input_pitch=None, output_pitch=None, ffmpeg_path=None):
+def extract_bass_from_file(input_file, output_folder, nocleanup=False, novocals=False, nodrums=False, noother=False, bassonly=False, input_pitch=None, output_pitch=None, ffmpeg_path=None, engine=None, in_memory=False, stem_cache=None, stream_window=None, pitch_mixes=False, pitch_backend='auto', journal=None, metrics=None, output_format=DEFAULT_OUTPUT_FORMAT, bitrate=DEFAULT_BITRATE, separated=None):
     """
     Extract bass from a single audio file using Spleeter.
     
@@ -33,6 +39,30 @@ def extract_bass_from_file(input_file, output_folder, nocleanup=False, novocals=
         input_pitch (str, optional): Input pitch note (e.g., 'C', 'D', etc.)
         output_pitch (str, optional): Output pitch note (e.g., 'C', 'D', etc.)
         ffmpeg_path (str, optional): Path to FFmpeg executable for pitch shifting
+        engine (SeparatorEngine, optional): Separator engine to reuse. Defaults to the
+            process-wide engine, so the model is only loaded once per process.
+        in_memory (bool): Separate and mix in memory without writing intermediate stem WAV files
+        stem_cache (StemCache, optional): Cache of separated stems, a hit skips the separation
+        stream_window (float, optional): Separate, mix and encode in overlapping windows of this
+            many seconds, so memory use doesn't grow with the length of the input
+        pitch_mixes (bool): Pitch shift only the exported mixes, in a single FFmpeg run,
+            instead of all four stems before mixing
+        pitch_backend (str): Pitch shifting backend, 'auto', 'numpy' (in process), 'ffmpeg' or 'pydub'
+        journal (JobJournal, optional): Journal that records each stage the file reaches. Stems
+            (and pitch-shifted stems) left over by an interrupted run it recorded are reused.
+        metrics (MetricsRecorder, optional): Recorder for the wall time, CPU time, memory and I/O
+            of each stage (separate, pitch, mix, export, cleanup) and of the whole file
+        output_format (str): Output file format, one of mix_wavs.OUTPUT_FORMATS
+        bitrate (str): Bitrate of lossy output formats (e.g., '192k')
+        separated (dict, optional): Stem name -> AudioBuffer of this file, already separated by
+            the caller (e.g., packed with other short files into one separator call, see
+            batch_runner.separate_packed); the separation and the stem cache are skipped
+    
+    Processing stops early with False when the active CancelToken of the calling thread
+    (see cancellation.activate) is cancelled; the partial outputs of the file are removed.
+    
+    Returns:
+        bool: True if the output files were created, False otherwise
     """
     # Setup logging
     logging.basicConfig(
@@ -44,139 +74,252 @@ def extract_bass_from_file(input_file, output_folder, nocleanup=False, novocals=
         ]
     )
     logger = logging.getLogger(__name__)
+    file_metrics = FileMetrics(metrics, input_file)
+    
+    # Get the filename without extension
+    filename = Path(input_file).stem
+    # Temp folder for Spleeter output
+    temp_folder = "bass_extractor_temp"
+    separated_folder = os.path.join(temp_folder, filename)
+    mix_names = requested_mixes(novocals, nodrums, noother, bassonly)
     
     try:
-        # Get the filename without extension
-        input_path = Path(input_file)
-        filename = input_path.stem
-        
         logger.info(f"Processing: {input_file}")
         
-        # Create temp folder for Spleeter output
-        temp_folder = "bass_extractor_temp"
-        os.makedirs(temp_folder, exist_ok=True)
-        
-        # Initialize Spleeter separator with error handling
-        logger.info(f"Initializing Spleeter separator...")
-        try:
-            separator = Separator('spleeter:4stems')
-            logger.info("Spleeter separator initialized successfully")
-        except Exception as e:
-            error_msg = f"Failed to initialize Spleeter separator: {str(e)}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
-            return
+        # Very long inputs: separate window by window with bounded memory
+        if stream_window:
+            file_metrics.start('stream')
+            if input_pitch and output_pitch:
+                error_msg = "Pitch shifting is not supported in streaming mode"
+                logger.error(error_msg)
+                print(f"Error: {error_msg}")
+                return False
+            
+            if not extract_bass_streaming(input_file, output_folder, novocals, nodrums, noother, bassonly,
+                                          engine, stream_window, ffmpeg_path=ffmpeg_path,
+                                          output_format=output_format, bitrate=bitrate):
+                return False
+            record_stage(journal, input_file, 'exported')
+            print(f"Completed: {input_file}")
+            file_metrics.start('cleanup')
+            if move_to_done(input_file, output_folder):
+                record_stage(journal, input_file, 'moved')
+            file_metrics.finish()
+            return True
         
-        # Perform separation using Spleeter API
-        logger.info(f"Running Spleeter separation...")
-        try:
-            separator.separate_to_file(input_file, temp_folder)
-            logger.info("Spleeter separation completed successfully")
-        except Exception as e:
-            error_msg = f"Failed to perform Spleeter separation for {input_file}: {str(e)}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
-            return
+        pitch_shift = bool(input_pitch and output_pitch and PITCH_SHIFT_AVAILABLE)
+        shift_mixes = pitch_shift and pitch_mixes
         
-        # Path to the separated files
-        separated_folder = os.path.join(temp_folder, filename)
-        bass_path = os.path.join(separated_folder, "bass.wav")
-        drums_path = os.path.join(separated_folder, "drums.wav")
-        vocals_path = os.path.join(separated_folder, "vocals.wav")
-        other_path = os.path.join(separated_folder, "other.wav")
+        # Create temp folder for Spleeter output
+        if not in_memory:
+            os.makedirs(temp_folder, exist_ok=True)
         
-        # Check if all files exist
-        missing_files = []
-        for path, name in [(bass_path, "bass.wav"), (drums_path, "drums.wav"), 
-                          (vocals_path, "vocals.wav"), (other_path, "other.wav")]:
-            if not os.path.exists(path):
-                missing_files.append(name)
+        # Plan the work from the requested outputs: the cheapest model that produces them, and
+        # only the stems they use are read, pitch shifted and mixed
+        model, stem_names = plan_separation(mix_names)
+        if engine is None or engine.model != model:
+            engine = get_engine(model)
         
-        if missing_files:
-            error_msg = f"Missing separated files for {input_file}: {', '.join(missing_files)}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
-            return
+        # Path to the separated files (file-based separation)
+        stem_paths = [os.path.join(separated_folder, f"{name}.wav") for name in stem_names]
         
-        logger.info(f"Separation completed.")
+        # Look up previously separated stems first
+        stems = separated
+        cache_key = None
+        if stems is None and stem_cache is not None:
+            file_metrics.start('cache_lookup')
+            try:
+                cache_key = stem_cache.key(input_file, engine.model)
+                cached = stem_cache.get(input_file, engine.model, cache_key)
+                if cached and cached[1] == engine.sample_rate:
+                    stems = stem_buffers(cached[0], engine.sample_rate)
+            except Exception as e:
+                logger.warning(f"Stem cache lookup failed for {input_file}: {str(e)}")
         
-        # Apply pitch shifting if requested
-        if input_pitch and output_pitch and PITCH_SHIFT_AVAILABLE:
-            logger.info(f"Applying pitch shift from {input_pitch} to {output_pitch}...")
-            
-            # Validate pitch notes
-            if not validate_note(input_pitch) or not validate_note(output_pitch):
-                error_msg = f"Invalid pitch notes: {input_pitch} or {output_pitch}"
+        if separated is not None:
+            logger.info("Using stems separated together with other files")
+        elif stems is not None:
+            logger.info("Using cached stems, skipping Spleeter separation")
+        elif (not in_memory and journal is not None and journal.reached(input_file, 'separated')
+              and all(os.path.exists(path) for path in stem_paths)):
+            # Resumed run: the stems of the interrupted run are still in the temp folder
+            logger.info("Using stems of the interrupted run, skipping Spleeter separation")
+        else:
+            # Initialize Spleeter separator with error handling (only once per process)
+            try:
+                # The separator is shared by every later file, so creating it is not part of this file's stages
+                if not engine.is_loaded:
+                    file_metrics.stop()
+                    with measure_stage(metrics, None, 'model_init'):
+                        engine.load()
+            except Exception as e:
+                error_msg = f"Failed to initialize Spleeter separator: {str(e)}"
                 logger.error(error_msg)
                 print(f"Error: {error_msg}")
-                return
-            
-            # Create temporary files for pitch-shifted tracks
-            temp_bass_path = os.path.join(separated_folder, "bass_pitched.wav")
-            temp_drums_path = os.path.join(separated_folder, "drums_pitched.wav")
-            temp_vocals_path = os.path.join(separated_folder, "vocals_pitched.wav")
-            temp_other_path = os.path.join(separated_folder, "other_pitched.wav")
+                return False
             
-            # Apply pitch shifting to each track
-            tracks_to_shift = [
-                (bass_path, temp_bass_path, "bass"),
-                (drums_path, temp_drums_path, "drums"),
-                (vocals_path, temp_vocals_path, "vocals"),
-                (other_path, temp_other_path, "other")
-            ]
-            
-            for input_track, output_track, track_name in tracks_to_shift:
+            if in_memory:
+                # Separate the decoded waveform directly, no stem files are written
+                logger.info(f"Running Spleeter separation in memory...")
                 try:
-                    if process_audio_with_pitch_shift(input_track, output_track, input_pitch, output_pitch, ffmpeg_path):
-                        logger.info(f"Successfully pitch-shifted {track_name} track")
-                    else:
-                        error_msg = f"Failed to pitch-shift {track_name} track"
-                        logger.error(error_msg)
-                        print(f"Error: {error_msg}")
-                        return
+                    # The input is decoded once, every later stage works on the buffers
+                    file_metrics.start('decode')
+                    buffer = engine.load_buffer(input_file, ffmpeg_path, memmap_folder=temp_folder)
+                    try:
+                        file_metrics.start('separate')
+                        stems = engine.separate_buffer(buffer)
+                    finally:
+                        # Also removes the memory-mapped file of a large input
+                        buffer.release()
+                    logger.info("Spleeter separation completed successfully")
                 except Exception as e:
-                    error_msg = f"Error pitch-shifting {track_name} track: {str(e)}"
+                    error_msg = f"Failed to perform Spleeter separation for {input_file}: {str(e)}"
                     logger.error(error_msg)
                     print(f"Error: {error_msg}")
-                    return
+                    return False
+            else:
+                # Perform separation using Spleeter API
+                logger.info(f"Running Spleeter separation...")
+                try:
+                    file_metrics.start('separate')
+                    engine.separate_to_file(input_file, temp_folder)
+                    logger.info("Spleeter separation completed successfully")
+                except Exception as e:
+                    error_msg = f"Failed to perform Spleeter separation for {input_file}: {str(e)}"
+                    logger.error(error_msg)
+                    print(f"Error: {error_msg}")
+                    return False
+                
+                # Check if the stems the outputs use exist
+                missing_files = []
+                for path in stem_paths:
+                    if not os.path.exists(path):
+                        missing_files.append(os.path.basename(path))
+                
+                if missing_files:
+                    error_msg = f"Missing separated files for {input_file}: {', '.join(missing_files)}"
+                    logger.error(error_msg)
+                    print(f"Error: {error_msg}")
+                    return False
             
-            # Use pitch-shifted tracks for mixing
-            bass_path = temp_bass_path
-            drums_path = temp_drums_path
-            vocals_path = temp_vocals_path
-            other_path = temp_other_path
+            # Keep the stems for later runs with different mix or pitch options
+            if stem_cache is not None:
+                file_metrics.start('cache_store')
+                try:
+                    # Every stem of the model is cached, later runs may request other outputs
+                    all_stems = stems
+                    if all_stems is None:
+                        all_stems = load_stem_buffers([os.path.join(separated_folder, f"{name}.wav")
+                                                       for name in engine.stem_names], engine.stem_names)
+                    stem_cache.put(input_file, engine.model, {name: stem.data for name, stem in all_stems.items()},
+                                   engine.sample_rate, cache_key)
+                    all_stems = None
+                except Exception as e:
+                    logger.warning(f"Failed to cache stems for {input_file}: {str(e)}")
+        
+        if stems is not None:
+            # Stems that no output uses are dropped right away
+            stems = {name: stems[name] for name in stem_names}
+        
+        logger.info(f"Separation completed.")
+        record_stage(journal, input_file, 'separated')
+        
+        # Validate pitch notes
+        if pitch_shift and (not validate_note(input_pitch) or not validate_note(output_pitch)):
+            error_msg = f"Invalid pitch notes: {input_pitch} or {output_pitch}"
+            logger.error(error_msg)
+            print(f"Error: {error_msg}")
+            return False
+        
+        # Apply pitch shifting to the stems if requested
+        if pitch_shift and not shift_mixes:
+            file_metrics.start('pitch')
+            pitched_paths = [os.path.join(separated_folder, f"{name}_pitched.wav") for name in stem_names]
+            
+            if (not in_memory and journal is not None and journal.reached(input_file, 'pitched')
+                    and all(os.path.exists(path) for path in pitched_paths)):
+                # Resumed run: keep the pitch-shifted stems of the interrupted run
+                logger.info("Using pitch-shifted stems of the interrupted run")
+                stems = load_stem_buffers(pitched_paths, stem_names)
+            else:
+                logger.info(f"Applying pitch shift from {input_pitch} to {output_pitch}...")
+                pitch_ratio = calculate_pitch_shift(input_pitch, output_pitch)
+                if stems is None:
+                    # Each stem file is decoded once, shifting and mixing work on the buffers
+                    stems = load_stem_buffers(stem_paths, stem_names)
+                
+                for done, name in enumerate(stem_names, 1):
+                    check_cancelled()
+                    try:
+                        stems[name] = shift_pitch_buffer(stems[name], pitch_ratio, pitch_backend, ffmpeg_path)
+                        logger.info(f"Successfully pitch-shifted {name} track")
+                        report_progress(done / len(stem_names))
+                    except Exception as e:
+                        error_msg = f"Error pitch-shifting {name} track: {str(e)}"
+                        logger.error(error_msg)
+                        print(f"Error: {error_msg}")
+                        return False
+                
+                if not in_memory:
+                    # Kept next to the stems, so an interrupted run can resume from them
+                    os.makedirs(separated_folder, exist_ok=True)
+                    for name, path in zip(stem_names, pitched_paths):
+                        stems[name].write_wav(path)
             
             logger.info("Pitch shifting completed successfully")
+            record_stage(journal, input_file, 'pitched')
         
         logger.info("Mixing tracks...")
+        file_metrics.start('mix')
         
-        # Use mix_wavs function to create the final outputs
+        # Stem files are memory-mapped and only the requested outputs are mixed and encoded
         try:
-            mix_wavs(bass_path, drums_path, vocals_path, other_path, filename, output_folder, novocals, nodrums, noother, bassonly)
+            if stems is None:
+                stem_list, sample_rate = map_stems(stem_paths)
+            else:
+                stem_list = [stems[name].data for name in stem_names]
+                sample_rate = stems[stem_names[0]].sample_rate
+                stems = None
+            
+            if shift_mixes:
+                # The mixes are pitch shifted as a whole
+                mixes = mix_stem_list(stem_list, mix_names, stem_names=stem_names)
+                stem_list = None
+                record_stage(journal, input_file, 'mixed')
+                
+                file_metrics.start('export')
+                logger.info(f"Applying pitch shift from {input_pitch} to {output_pitch} to {len(mixes)} mixes...")
+                if not export_mixes_with_pitch_shift(mixes, sample_rate, filename, output_folder, separated_folder,
+                                                     input_pitch, output_pitch, ffmpeg_path, pitch_backend,
+                                                     output_format, bitrate):
+                    raise RuntimeError("Failed to pitch-shift the mixes")
+                logger.info("Pitch shifting completed successfully")
+            else:
+                # Mixed block by block straight into the encoder, so memory use doesn't grow with
+                # the length of the song; mixing is measured as part of the export stage
+                file_metrics.start('export')
+                export_stem_mixes(stem_list, mix_names, sample_rate, filename, output_folder, output_format, bitrate,
+                                  ffmpeg_path, stem_names=stem_names)
+                stem_list = None
+                record_stage(journal, input_file, 'mixed')
             logger.info(f"Successfully created output files for {input_file}")
+            record_stage(journal, input_file, 'exported')
         except Exception as e:
             error_msg = f"Failed to create output files for {input_file}: {str(e)}"
             logger.error(error_msg)
             print(f"Error: {error_msg}")
-            return
+            return False
         
         print(f"Completed: {input_file}")
-        excluded_tracks = []
-        if novocals:
-            excluded_tracks.append("vocals")
-        if nodrums:
-            excluded_tracks.append("drums")
-        if noother:
-            excluded_tracks.append("other")
-        
-        if excluded_tracks:
-            print(f"  - {filename}.mp3 created in {output_folder}/NOBASS/ (excluded: {', '.join(excluded_tracks)})")
-        else:
-            print(f"  - {filename}.mp3 created in {output_folder}/NOBASS/")
-        print(f"  - {filename}.mp3 created in {output_folder}/BASSONLY/")
+        output_name = f"{filename}{OUTPUT_FORMATS[output_format][0]}"
+        for mix in mix_names:
+            print(f"  - {output_name} created in {output_folder}/{mix}/")
         
         # Clean up temp files
-        if not nocleanup:
+        file_metrics.start('cleanup')
+        if in_memory and not shift_mixes:
+            logger.info("No temporary files to clean up (in-memory separation)")
+        elif not nocleanup:
             logger.info("Cleaning up temporary files...")
             try:
                 if os.path.exists(separated_folder):
@@ -190,32 +333,81 @@ def extract_bass_from_file(input_file, output_folder, nocleanup=False, novocals=
             logger.info("Skipping cleanup - temporary files preserved")
         
         # Move input file to DONE folder
-        try:
-            done_folder = os.path.join(output_folder, "DONE")
-            os.makedirs(done_folder, exist_ok=True)
-            
-            input_filename = os.path.basename(input_file)
-            done_file_path = os.path.join(done_folder, input_filename)
-            
-            # If file already exists in DONE folder, add timestamp
-            if os.path.exists(done_file_path):
-                name, ext = os.path.splitext(input_filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                done_file_path = os.path.join(done_folder, f"{name}_{timestamp}{ext}")
-            
-            shutil.move(input_file, done_file_path)
-            logger.info(f"Input file moved to DONE folder: {done_file_path}")
-            print(f"  - Input file moved to: {done_file_path}")
-            
-        except Exception as e:
-            error_msg = f"Failed to move input file to DONE folder: {str(e)}"
-            logger.error(error_msg)
-            print(f"Warning: {error_msg}")
+        if move_to_done(input_file, output_folder):
+            record_stage(journal, input_file, 'moved')
         
+        file_metrics.finish()
+        return True
+    
+    except Cancelled:
+        logger.info(f"Cancelled: {input_file}")
+        print(f"Cancelled: {input_file}")
+        # Nothing of a cancelled file is kept: no partial outputs, and (unless asked to keep
+        # temp files) no stems for a later run to pick up
+        remove_partials([output_path(output_folder, mix, filename, output_format) for mix in mix_names])
+        if not nocleanup and os.path.exists(separated_folder):
+            shutil.rmtree(separated_folder, ignore_errors=True)
+        return False
     except Exception as e:
         error_msg = f"Unexpected error processing {input_file}: {str(e)}"
         logger.error(error_msg)
         print(f"Error: {error_msg}")
+        return False
+    finally:
+        # Failed files are recorded too, finish() does nothing after a success
+        file_metrics.finish(ok=False)
+
+
+def record_stage(journal, input_file, stage):
+    """
+    Record a processing stage in the job journal, if there is one.
+    
+    Args:
+        journal (JobJournal): Job journal, or None
+        input_file (str): Path to input audio file
+        stage (str): One of JOURNAL_STAGES
+    """
+    if journal is not None:
+        journal.record(input_file, stage)
+
+
+def move_to_done(input_file, output_folder):
+    """
+    Move a processed input file to the DONE folder.
+    If a file with the same name already exists there, a timestamp is added.
+    
+    Args:
+        input_file (str): Path to processed input file
+        output_folder (str): Path to output folder
+        
+    Returns:
+        str: New path of the input file, or None if it could not be moved
+    """
+    logger = logging.getLogger(__name__)
+    
+    try:
+        done_folder = os.path.join(output_folder, "DONE")
+        os.makedirs(done_folder, exist_ok=True)
+        
+        input_filename = os.path.basename(input_file)
+        done_file_path = os.path.join(done_folder, input_filename)
+        
+        # If file already exists in DONE folder, add timestamp
+        if os.path.exists(done_file_path):
+            name, ext = os.path.splitext(input_filename)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            done_file_path = os.path.join(done_folder, f"{name}_{timestamp}{ext}")
+        
+        shutil.move(input_file, done_file_path)
+        logger.info(f"Input file moved to DONE folder: {done_file_path}")
+        print(f"  - Input file moved to: {done_file_path}")
+        return done_file_path
+        
+    except Exception as e:
+        error_msg = f"Failed to move input file to DONE folder: {str(e)}"
+        logger.error(error_msg)
+        print(f"Warning: {error_msg}")
+        return None
 
 
 def main():
@@ -226,6 +418,7 @@ def main():
 Examples:
   extract_bass --folder /path/to/music --output_folder /path/to/output
   extract_bass --file song1.mp3 --file song2.mp3 --output_folder /path/to/output
+  extract_bass --folder /path/to/dropbox --output_folder /path/to/output --watch
         """
     )
     
@@ -280,14 +473,151 @@ Examples:
         help='Exclude other instruments from NOBASS mix'
     )
     
+    parser.add_argument(
+        '--inmemory',
+        action='store_true',
+        help='Separate and mix in memory without intermediate stem WAV files'
+    )
+    
     parser.add_argument(
         '--bassonly',
         action='store_true',
         help='Create only BASSONLY output (skip NOBASS)'
     )
     
-    args = parser.parse_args()
+    parser.add_argument(
+        '--format',
+        choices=list(OUTPUT_FORMATS),
+        default=DEFAULT_OUTPUT_FORMAT,
+        help=f'Output file format (default: {DEFAULT_OUTPUT_FORMAT})'
+    )
+    
+    parser.add_argument(
+        '--bitrate',
+        type=str,
+        default=DEFAULT_BITRATE,
+        help=f'Bitrate of lossy output formats, ignored for flac and wav (default: {DEFAULT_BITRATE})'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of files processed in parallel, each worker loads its own separator (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--pack-size',
+        type=int,
+        default=1,
+        help='Separate up to N short files (up to 60 seconds) together in one separator call, '
+             'for batches of short clips (default: 1, every file on its own)'
+    )
+    
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Overlap decode, separation, pitch shift, mixing and export of consecutive files'
+    )
+    
+    parser.add_argument(
+        '--queue-depth',
+        type=int,
+        default=2,
+        help='Maximum number of files waiting between two pipeline stages (default: 2)'
+    )
+    
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        help='Folder for the stem cache, re-runs of the same audio skip the separation'
+    )
+    
+    parser.add_argument(
+        '--cache-size',
+        type=float,
+        default=5000,
+        help='Maximum size of the stem cache in MB, least recently used entries are evicted (default: 5000)'
+    )
+    
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Separate long files in overlapping windows, memory use does not grow with the track length'
+    )
+    
+    parser.add_argument(
+        '--window',
+        type=float,
+        default=30.0,
+        help='Window length in seconds for --stream (default: 30)'
+    )
+    
+    parser.add_argument(
+        '--input-pitch',
+        type=str,
+        help='Original key of the input files (e.g., C, D#), used with --output-pitch'
+    )
+    
+    parser.add_argument(
+        '--output-pitch',
+        type=str,
+        help='Target key, all outputs are pitch-shifted from --input-pitch to this key'
+    )
+    
+    parser.add_argument(
+        '--pitch-mixes',
+        action='store_true',
+        help='Pitch shift only the exported mixes in a single FFmpeg run instead of all four stems'
+    )
+    
+    parser.add_argument(
+        '--pitch-backend',
+        choices=['auto', 'numpy', 'ffmpeg', 'pydub'],
+        default='auto',
+        help='Pitch shifting backend: numpy runs in process, ffmpeg uses rubberband; auto tries numpy, ffmpeg, then pydub (default: auto)'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and process MP3 files as they are dropped into --folder'
+    )
+    
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=2.0,
+        help='Seconds between two scans of the watched folder when inotify is not available (default: 2)'
+    )
+    
+    parser.add_argument(
+        '--settle',
+        type=float,
+        default=3.0,
+        help='Seconds a new file must stay unchanged before it is processed in --watch mode (default: 3)'
+    )
+    
+    parser.add_argument(
+        '--metrics',
+        type=str,
+        help='Write wall time, CPU time, peak RSS and I/O of each stage of each file to this JSON lines file'
+    )
+    
+    parser.add_argument(
+        '--metrics-prometheus',
+        type=str,
+        help='Also write the per-stage summary in Prometheus text format to this file (requires --metrics)'
+    )
     
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume an interrupted run into the same output folder, finished files are skipped'
+    )
+    
+    args = parser.parse_args()
+
     # Validate arguments
     if args.folder and args.file:
         print("Error: Cannot use both --folder and --file arguments together.")
@@ -298,6 +628,72 @@ Examples:
         print("Error: Must specify either --folder or --file argument.")
         sys.exit(1)
     
+    if args.workers < 1:
+        print("Error: --workers must be at least 1.")
+        sys.exit(1)
+    
+    if args.pack_size < 1:
+        print("Error: --pack-size must be at least 1.")
+        sys.exit(1)
+    
+    if args.pack_size > 1 and (args.stream or args.pipeline or args.watch):
+        print("Error: Cannot use --pack-size together with --stream, --pipeline or --watch.")
+        sys.exit(1)
+    
+    if args.pipeline and args.workers > 1:
+        print("Error: Cannot use --pipeline together with --workers.")
+        sys.exit(1)
+    
+    if args.queue_depth < 1:
+        print("Error: --queue-depth must be at least 1.")
+        sys.exit(1)
+    
+    if args.stream and (args.pipeline or args.inmemory):
+        print("Error: Cannot use --stream together with --pipeline or --inmemory.")
+        sys.exit(1)
+    
+    if args.stream and args.window < 2:
+        print("Error: --window must be at least 2 seconds.")
+        sys.exit(1)
+    
+    if bool(args.input_pitch) != bool(args.output_pitch):
+        print("Error: --input-pitch and --output-pitch must be used together.")
+        sys.exit(1)
+    
+    if args.input_pitch:
+        if not PITCH_SHIFT_AVAILABLE:
+            print("Error: Pitch shifting is not available.")
+            sys.exit(1)
+        
+        for note in (args.input_pitch, args.output_pitch):
+            if not validate_note(note):
+                print(f"Error: Invalid pitch note '{note}'.")
+                sys.exit(1)
+        
+        if args.stream:
+            print("Error: Cannot use pitch shifting together with --stream.")
+            sys.exit(1)
+    
+    if args.pitch_mixes and not args.input_pitch:
+        print("Error: --pitch-mixes requires --input-pitch and --output-pitch.")
+        sys.exit(1)
+    
+    if args.watch and not args.folder:
+        print("Error: --watch requires --folder.")
+        sys.exit(1)
+    
+    if args.watch and args.pipeline:
+        print("Error: Cannot use --watch together with --pipeline.")
+        sys.exit(1)
+    
+    if args.metrics_prometheus and not args.metrics:
+        print("Error: --metrics-prometheus requires --metrics.")
+        sys.exit(1)
+    
+    if args.poll_interval <= 0 or args.settle < 0:
+        print("Error: --poll-interval must be positive and --settle must not be negative.")
+        sys.exit(1)
+    
     # Process files
     files_to_process = []
     
@@ -312,7 +708,7 @@ Examples:
         for file_path in folder_path.glob("*.mp3"):
             files_to_process.append(str(file_path))
         
-        if not files_to_process:
+        if not files_to_process and not args.watch:
             print(f"No MP3 files found in folder '{args.folder}'.")
             sys.exit(1)
         
@@ -322,9 +718,9 @@ Examples:
         # Process individual files
         files_to_process = args.file
         
-        # Check if all files exist
+        # Check if all files exist (files finished by the resumed run were moved to DONE)
         for file_path in files_to_process:
-            if not os.path.exists(file_path):
+            if not os.path.exists(file_path) and not args.resume:
                 print(f"Error: File '{file_path}' does not exist.")
                 sys.exit(1)
         
@@ -350,23 +746,103 @@ Examples:
     )
     logger = logging.getLogger(__name__)
     
-    successful_files = 0
-    failed_files = 0
+    options = {
+        'nocleanup': args.nocleanup,
+        'novocals': args.novocals,
+        'nodrums': args.nodrums,
+        'noother': args.noother,
+        'bassonly': args.bassonly,
+        'output_format': args.format,
+        'bitrate': args.bitrate,
+    }
     
-    for file_path in files_to_process:
-        try:
-            extract_bass_from_file(file_path, args.output_folder, args.nocleanup, args.novocals, args.nodrums, args.noother, args.bassonly)
-            successful_files += 1
-        except Exception as e:
-            error_msg = f"Failed to process {file_path}: {str(e)}"
-            logger.error(error_msg)
-            failed_files += 1
+    if args.input_pitch:
+        options['input_pitch'] = args.input_pitch
+        options['output_pitch'] = args.output_pitch
+        options['pitch_mixes'] = args.pitch_mixes
+        options['pitch_backend'] = args.pitch_backend
+        options['ffmpeg_path'] = args.ffmpeg
+    
+    # Every stage reached is journaled, so an interrupted run can be resumed
+    from job_journal import JobJournal
+    journal = JobJournal(args.output_folder, resume=args.resume)
+    options['journal'] = journal
+    
+    # Files of the resumed run that are neither finished nor still there count as failed
+    missing = []
+    if args.resume:
+        remaining = []
+        for file_path in files_to_process:
+            if journal.reached(file_path, 'moved'):
+                print(f"Skipping finished file: {file_path}")
+            elif not os.path.exists(file_path):
+                print(f"Error: File '{file_path}' does not exist.")
+                logger.error(f"File {file_path} of the resumed run does not exist")
+                missing.append(file_path)
+            elif journal.reached(file_path, 'exported'):
+                # Interrupted after the outputs were written, only the move is left
+                print(f"Skipping finished file: {file_path}")
+                if move_to_done(file_path, args.output_folder):
+                    journal.record(file_path, 'moved')
+            else:
+                remaining.append(file_path)
+        files_to_process = remaining
+    
+    metrics = None
+    if args.metrics:
+        from metrics import MetricsRecorder
+        metrics = MetricsRecorder(args.metrics, append=args.resume)
+        options['metrics'] = metrics
+    
+    stem_cache = None
+    if args.cache_dir:
+        from stem_cache import StemCache
+        stem_cache = StemCache(args.cache_dir, args.cache_size)
+        options['stem_cache'] = stem_cache
+    
+    if args.watch:
+        # Long-running: the separator stays warm and new files are processed as they arrive
+        from watcher import watch_folder
+        options['in_memory'] = args.inmemory
+        if args.stream:
+            options['stream_window'] = args.window
+        successful, failed = watch_folder(args.folder, args.output_folder, options, args.workers, args.ffmpeg,
+                                          args.poll_interval, args.settle)
+    elif args.pipeline:
+        # Stages run concurrently on consecutive files, always in memory
+        from pipeline import run_pipeline
+        successful, failed = run_pipeline(files_to_process, args.output_folder, options, args.queue_depth)
+    else:
+        # Process files, each worker (or this process) loads the separator once
+        from batch_runner import run_batch
+        options['in_memory'] = args.inmemory
+        if args.stream:
+            options['stream_window'] = args.window
+        # Stage, progress and ETAs of each file while the batch runs
+        progress = ProgressTracker(ProgressPrinter(), files_to_process, ffmpeg_path=args.ffmpeg)
+        successful, failed = run_batch(files_to_process, args.output_folder, options, args.workers, args.ffmpeg,
+                                       progress, args.pack_size)
+    failed = missing + list(failed)
+    successful_files = len(successful)
+    failed_files = len(failed)
     
     # Summary
+    if stem_cache is not None:
+        if args.workers <= 1:
+            logger.info(stem_cache.format_stats())
+        else:
+            # Each worker process counts hits and misses in its own copy of the cache
+            logger.info("Stem cache: stats unavailable with --workers")
+    if metrics is not None:
+        logger.info(metrics.format_summary())
+        if args.metrics_prometheus:
+            metrics.write_prometheus(args.metrics_prometheus)
     logger.info(f"Processing completed. Successful: {successful_files}, Failed: {failed_files}")
     print(f"Bass extraction completed! Successful: {successful_files}, Failed: {failed_files}")
     
     if failed_files > 0:
+        for file_path in failed:
+            print(f"  - Failed: {file_path}")
         print(f"Check error.log for detailed error information.")
 
 
@@ -18,15 +18,21 @@ import time
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cancellation import CancelToken, Cancelled, activate
 from extract_bass import extract_bass_from_file
+from progress import ProgressTracker, activate_tracker, format_event, format_seconds
+from separator_engine import SPLEETER_AVAILABLE, get_engine, preload_backend
+from streaming import DEFAULT_WINDOW_SECONDS
 
 # Import YouTube downloader
 try:
     from youtube_downloader import (
         is_valid_youtube_url, 
         download_multiple_youtube_urls, 
+        iter_youtube_downloads,
         validate_youtube_urls
     )
+    from download_cache import DownloadCache
     YOUTUBE_AVAILABLE = True
 except ImportError:
     YOUTUBE_AVAILABLE = False
@@ -41,6 +47,39 @@ except ImportError:
     NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
 
+class MessageQueue(queue.Queue):
+    """
+    Queue of messages for the Tk thread that wakes the Tk event loop up when a message is put,
+    so the messages are handled as they arrive instead of the queue being polled.
+    """
+    
+    def __init__(self, root, event='<<MessagePosted>>'):
+        super().__init__()
+        self.root = root
+        self.event = event
+        self._wakeup_lock = threading.Lock()
+        self._wakeup_pending = False
+    
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        # One wakeup for a burst of messages, the Tk thread drains the whole queue
+        with self._wakeup_lock:
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        try:
+            # Tkinter hands calls from other threads over to the thread running the event loop
+            self.root.event_generate(self.event, when='tail')
+        except (tk.TclError, RuntimeError):
+            # The window is being closed
+            self.drained()
+    
+    def drained(self):
+        """Called by the Tk thread before it drains the queue, the next put wakes it up again."""
+        with self._wakeup_lock:
+            self._wakeup_pending = False
+
+
 class BassExtractorGUI:
     def __init__(self, root):
         self.root = root
@@ -68,17 +107,30 @@ class BassExtractorGUI:
         self.output_folder = tk.StringVar()
         self.ffmpeg_path = tk.StringVar()
         self.no_cleanup = tk.BooleanVar()
+        self.in_memory = tk.BooleanVar()
+        self.stream_windows = tk.BooleanVar()
+        
+        # Downloaded YouTube audio, reused when the same video is submitted again
+        self.download_cache = None
         
         # Pitch shift variables
         self.input_pitch = tk.StringVar(value="C")
         self.output_pitch = tk.StringVar(value="C")
         self.enable_pitch_shift = tk.BooleanVar()
+        self.pitch_mixes = tk.BooleanVar()
         
         # Message queue for thread communication
-        self.message_queue = queue.Queue()
+        self.message_queue = MessageQueue(self.root)
+        
+        # Cancel token of the current run, set by the Stop button
+        self.cancel_token = None
         
         self.create_widgets()
         self.setup_message_handling()
+        
+        # Spleeter is imported in the background once the window is shown, so the
+        # window comes up right away and the first run doesn't wait for the import
+        self.root.after_idle(self.preload_separator)
     
     def create_widgets(self):
         # Create a canvas with scrollbar
@@ -205,6 +257,11 @@ class BassExtractorGUI:
         
         ttk.Checkbutton(options_frame, text="Skip cleanup (preserve temporary files)", 
                        variable=self.no_cleanup).pack(anchor=tk.W)
+        ttk.Checkbutton(options_frame, text="Separate in memory (no temporary stem files)", 
+                       variable=self.in_memory).pack(anchor=tk.W)
+        ttk.Checkbutton(options_frame,
+                       text=f"Separate in {DEFAULT_WINDOW_SECONDS:.0f}s windows (long files, Stop takes effect sooner)",
+                       variable=self.stream_windows).pack(anchor=tk.W)
         
         # Additional options frame
         additional_options_frame = ttk.LabelFrame(main_frame, text="Output Options", padding="10")
@@ -219,7 +276,7 @@ class BassExtractorGUI:
         row1_frame.pack(fill=tk.X, pady=(0, 5))
         
         self.bassonly_var = tk.BooleanVar()
-        ttk.Checkbutton(row1_frame, text="Bass Only (save to BASSONLY folder)", 
+        ttk.Checkbutton(row1_frame, text="Bass Only (BASSONLY instead of NOBASS)", 
                        variable=self.bassonly_var).pack(side=tk.LEFT, padx=(0, 20))
         
         self.novocals_var = tk.BooleanVar()
@@ -259,13 +316,17 @@ class BassExtractorGUI:
         output_pitch_combo = ttk.Combobox(pitch_shift_frame, textvariable=self.output_pitch, values=NOTE_NAMES, state="readonly", width=10)
         output_pitch_combo.grid(row=2, column=1, sticky=tk.W, padx=(20, 0), pady=(0, 10))
         
+        # Shift the finished mixes instead of the four stems
+        ttk.Checkbutton(pitch_shift_frame, text="Shift mixes only (faster, one FFmpeg run per file)", 
+                       variable=self.pitch_mixes).grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=(0, 10))
+        
         # Pitch shift info
         if PITCH_SHIFT_AVAILABLE:
             ttk.Label(pitch_shift_frame, text="Shifts all tracks from input pitch to output pitch", 
-                     foreground="gray").grid(row=3, column=0, columnspan=3, sticky=tk.W)
+                     foreground="gray").grid(row=4, column=0, columnspan=3, sticky=tk.W)
         else:
             ttk.Label(pitch_shift_frame, text="Pitch shifting not available", 
-                     foreground="red").grid(row=3, column=0, columnspan=3, sticky=tk.W)
+                     foreground="red").grid(row=4, column=0, columnspan=3, sticky=tk.W)
         
         # Progress section
         progress_frame = ttk.LabelFrame(main_frame, text="Progress", padding="10")
@@ -305,18 +366,37 @@ class BassExtractorGUI:
     
     def setup_message_handling(self):
         """Setup message handling for thread communication"""
+        # The queue wakes the event loop up when a message is posted
+        self.root.bind(self.message_queue.event, self.check_message_queue)
         self.check_message_queue()
     
-    def check_message_queue(self):
-        """Check for messages from the processing thread"""
+    def check_message_queue(self, event=None):
+        """Handle the messages from the processing thread"""
+        self.message_queue.drained()
         try:
             while True:
                 message = self.message_queue.get_nowait()
                 self.handle_message(message)
         except queue.Empty:
             pass
-        finally:
-            self.root.after(100, self.check_message_queue)
+    
+    def preload_separator(self):
+        """Import the separator backend in a background thread"""
+        if not SPLEETER_AVAILABLE:
+            self.message_queue.put({
+                'type': 'log',
+                'text': "⚠️ Spleeter is not installed, files can't be processed"
+            })
+            return
+        preload_backend(self.on_separator_preloaded)
+    
+    def on_separator_preloaded(self, error):
+        """Called in the preload thread once Spleeter is imported"""
+        if error is not None:
+            self.message_queue.put({
+                'type': 'log',
+                'text': f"✗ Error loading Spleeter: {str(error)}"
+            })
     
     def handle_message(self, message):
         """Handle messages from the processing thread"""
@@ -325,6 +405,8 @@ class BassExtractorGUI:
             self.log_text.see(tk.END)
         elif message['type'] == 'progress':
             self.progress_var.set(message['text'])
+        elif message['type'] == 'stage_progress':
+            self.show_stage_progress(message)
         elif message['type'] == 'status':
             self.status_var.set(message['text'])
         elif message['type'] == 'complete':
@@ -333,6 +415,11 @@ class BassExtractorGUI:
             self.stop_button.config(state=tk.DISABLED)
             self.progress_var.set("Processing completed!")
             messagebox.showinfo("Complete", "Bass extraction completed successfully!")
+        elif message['type'] == 'stopped':
+            self.progress_bar.stop()
+            self.start_button.config(state=tk.NORMAL)
+            self.stop_button.config(state=tk.DISABLED)
+            self.progress_var.set(message['text'])
         elif message['type'] == 'error':
             self.progress_bar.stop()
             self.start_button.config(state=tk.NORMAL)
@@ -340,6 +427,19 @@ class BassExtractorGUI:
             self.progress_var.set("Error occurred!")
             messagebox.showerror("Error", message['text'])
     
+    def show_stage_progress(self, event):
+        """Show a progress event of the extraction: stage, ETAs and the progress of the batch"""
+        self.progress_var.set(format_event(event))
+        if event['batch_fraction'] is not None:
+            # Determinate once there are measurements to base the progress on
+            if str(self.progress_bar['mode']) != 'determinate':
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate', maximum=100)
+            self.progress_bar['value'] = event['batch_fraction'] * 100
+        if event['batch_eta'] is not None:
+            self.status_var.set(f"Processing file {event['index']} of {event['count']}, "
+                                f"batch ETA {format_seconds(event['batch_eta'])}")
+    
     def add_files(self):
         """Add individual files"""
         files = filedialog.askopenfilenames(
@@ -486,88 +586,129 @@ class BassExtractorGUI:
         self.log_text.delete(1.0, tk.END)
         
         # Start processing thread
-        self.processing_thread = threading.Thread(target=self.process_files)
+        self.cancel_token = CancelToken()
+        self.processing_thread = threading.Thread(target=self.run_processing, args=(self.cancel_token,))
         self.processing_thread.daemon = True
         self.processing_thread.start()
         
         # Update UI
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
+        self.progress_bar.config(mode='indeterminate', value=0)
         self.progress_bar.start()
         self.progress_var.set("Processing...")
     
     def stop_processing(self):
-        """Stop the processing (placeholder for future implementation)"""
+        """Stop the processing: the current file is cancelled and no further files are started"""
+        if self.cancel_token is None or self.cancel_token.cancelled:
+            return
         self.progress_var.set("Stopping...")
-        # TODO: Implement proper thread stopping mechanism
+        self.stop_button.config(state=tk.DISABLED)
+        # Reaches into the running file: decoding, separation windows, pitch shifting
+        # (FFmpeg is terminated) and export stop at their next block. The separator
+        # engine stays loaded for the next run.
+        self.cancel_token.cancel()
     
-    def process_files(self):
-        """Process files in a separate thread"""
-        try:
-            all_files = self.input_files.copy()
-            youtube_download_success = False
-            
-            # Download YouTube videos if any
-            if self.youtube_urls and YOUTUBE_AVAILABLE:
+    def run_processing(self, cancel_token):
+        """Processing thread: process_files with the cancel token of the run active"""
+        with activate(cancel_token):
+            try:
+                self.process_files()
+            except Cancelled:
                 self.message_queue.put({
-                    'type': 'log',
-                    'text': f"Starting YouTube download for {len(self.youtube_urls)} URLs..."
+                    'type': 'stopped',
+                    'text': "Processing stopped"
                 })
-                
-                self.message_queue.put({
-                    'type': 'progress',
-                    'text': f"Downloading {len(self.youtube_urls)} YouTube video(s)..."
-                })
-                
+    
+    def download_youtube_files(self, urls, files_queue):
+        """Download YouTube URLs in the background and queue each file for processing as soon as it is ready"""
+        cancel_token = self.cancel_token
+        downloaded = 0
+        try:
+            if self.download_cache is None:
                 try:
-                    # Download YouTube videos
-                    downloaded_files = download_multiple_youtube_urls(
-                        self.youtube_urls, 
-                        self.output_folder.get(), 
-                        self.ffmpeg_path.get() if self.ffmpeg_path.get() else None
-                    )
-                    
+                    self.download_cache = DownloadCache()
+                except Exception as e:
                     self.message_queue.put({
                         'type': 'log',
-                        'text': f"Download completed. Got {len(downloaded_files)} files: {downloaded_files}"
+                        'text': f"⚠️ Download cache not available: {str(e)}"
                     })
-                    
-                    # Add downloaded files to the processing list
-                    all_files.extend(downloaded_files)
-                    youtube_download_success = True
-                    
+            
+            for url, mp3_file, error in iter_youtube_downloads(
+                urls,
+                self.output_folder.get(),
+                self.ffmpeg_path.get() if self.ffmpeg_path.get() else None,
+                cache=self.download_cache,
+                cancel_token=cancel_token
+            ):
+                if cancel_token.cancelled:
+                    # No further URLs are submitted, the downloads still running are discarded
                     self.message_queue.put({
                         'type': 'log',
-                        'text': f"✓ Downloaded {len(downloaded_files)} YouTube video(s)"
+                        'text': "Download stopped"
                     })
-                    
-                except Exception as e:
-                    error_msg = str(e)
+                    break
+                if mp3_file:
+                    downloaded += 1
                     self.message_queue.put({
                         'type': 'log',
-                        'text': f"✗ Error downloading YouTube videos: {error_msg}"
+                        'text': f"✓ Downloaded: {os.path.basename(mp3_file)}"
                     })
-                    
-                    # Check if it's a pytubefix issue
-                    if "HTTP Error 400" in error_msg or "Bad Request" in error_msg:
-                        self.message_queue.put({
-                            'type': 'log',
-                            'text': "💡 Tip: Try updating pytubefix: pip install --upgrade pytubefix"
-                        })
-                    
+                    files_queue.put(mp3_file)
+                    continue
+                
+                self.message_queue.put({
+                    'type': 'log',
+                    'text': f"✗ Error downloading {url}: {error}"
+                })
+                
+                # Check if it's a pytubefix issue
+                if "HTTP Error 400" in error or "Bad Request" in error:
                     self.message_queue.put({
                         'type': 'log',
-                        'text': "⚠️ Continuing with local files only (if any)"
+                        'text': "💡 Tip: Try updating pytubefix: pip install --upgrade pytubefix"
                     })
-                    # Continue with local files only
-            elif self.youtube_urls and not YOUTUBE_AVAILABLE:
+                
+        except Exception as e:
+            self.message_queue.put({
+                'type': 'log',
+                'text': f"✗ Error downloading YouTube videos: {str(e)}"
+            })
+        finally:
+            self.message_queue.put({
+                'type': 'log',
+                'text': f"Download completed. Got {downloaded} of {len(urls)} YouTube video(s)"
+            })
+            # No more files to process
+            files_queue.put(None)
+    
+    def process_files(self):
+        """Process files in a separate thread"""
+        try:
+            # Local files first, downloaded files are added as soon as each download finishes
+            files_queue = queue.Queue()
+            for file_path in self.input_files:
+                files_queue.put(file_path)
+            total_files = len(self.input_files)
+            
+            # Download YouTube videos if any, concurrently with the processing
+            if self.youtube_urls and YOUTUBE_AVAILABLE:
                 self.message_queue.put({
                     'type': 'log',
-                    'text': f"⚠️ YouTube URLs provided ({len(self.youtube_urls)}) but pytube not available. Skipping YouTube downloads."
+                    'text': f"Starting YouTube download for {len(self.youtube_urls)} URLs..."
                 })
-            
-            # Process all files (local + downloaded)
-            total_files = len(all_files)
+                total_files += len(self.youtube_urls)
+                download_thread = threading.Thread(target=self.download_youtube_files,
+                                                   args=(list(self.youtube_urls), files_queue))
+                download_thread.daemon = True
+                download_thread.start()
+            else:
+                if self.youtube_urls:
+                    self.message_queue.put({
+                        'type': 'log',
+                        'text': f"⚠️ YouTube URLs provided ({len(self.youtube_urls)}) but pytube not available. Skipping YouTube downloads."
+                    })
+                files_queue.put(None)
             
             # Debug logging
             self.message_queue.put({
@@ -577,28 +718,53 @@ class BassExtractorGUI:
             
             # Check if we have anything to process
             if total_files == 0:
-                if self.youtube_urls and not youtube_download_success:
-                    self.message_queue.put({
-                        'type': 'error',
-                        'text': "YouTube download failed and no local files provided. No files to process."
-                    })
-                elif self.youtube_urls and youtube_download_success:
+                self.message_queue.put({
+                    'type': 'error',
+                    'text': "No files to process"
+                })
+                return
+            
+            # The separator engine lives for the whole GUI session, so the model
+            # is only loaded for the first run (while the first downloads are running)
+            engine = get_engine()
+            if not engine.is_warm:
+                self.message_queue.put({
+                    'type': 'progress',
+                    'text': "Loading Spleeter model..."
+                })
+                try:
+                    engine.warm_up()
+                except Exception as e:
                     self.message_queue.put({
-                        'type': 'error',
-                        'text': "YouTube download completed but no files were downloaded. No files to process."
+                        'type': 'log',
+                        'text': f"✗ Error loading Spleeter model: {str(e)}"
                     })
-                else:
+            
+            # Stage, progress and ETA events of each file; the files of the downloads are only
+            # counted, their lengths are estimated from the files processed before them
+            ffmpeg_path = self.ffmpeg_path.get() if self.ffmpeg_path.get() else None
+            tracker = ProgressTracker(self.message_queue.put, list(self.input_files), total_files, ffmpeg_path)
+            
+            i = 0
+            while not self.cancel_token.cancelled:
+                if files_queue.empty():
                     self.message_queue.put({
-                        'type': 'error',
-                        'text': "No files to process"
+                        'type': 'progress',
+                        'text': "Waiting for YouTube downloads..."
                     })
-                return
-            
-            for i, file_path in enumerate(all_files, 1):
-                # Check if processing was stopped
-                if hasattr(self, 'stop_processing_flag') and self.stop_processing_flag:
+                # Wait for the next file, but notice a stop request while downloads are running
+                file_path = None
+                while not self.cancel_token.cancelled:
+                    try:
+                        file_path = files_queue.get(timeout=0.2)
+                        break
+                    except queue.Empty:
+                        continue
+                if file_path is None:
                     break
                 
+                i += 1
+                
                 # Update progress
                 self.message_queue.put({
                     'type': 'progress',
@@ -620,15 +786,32 @@ class BassExtractorGUI:
                         output_pitch = self.output_pitch.get()
                     
                     # Extract bass
-                    extract_bass_from_file(file_path, self.output_folder.get(), self.no_cleanup.get(), 
-                                        self.novocals_var.get(), self.nodrums_var.get(), self.noother_var.get(), 
-                                        self.bassonly_var.get(), input_pitch, output_pitch, 
-                                        self.ffmpeg_path.get() if self.ffmpeg_path.get() else None)
+                    tracker.start_file(file_path)
+                    with activate_tracker(tracker):
+                        ok = extract_bass_from_file(file_path, self.output_folder.get(), self.no_cleanup.get(), 
+                                            self.novocals_var.get(), self.nodrums_var.get(), self.noother_var.get(), 
+                                            self.bassonly_var.get(), input_pitch, output_pitch, 
+                                            ffmpeg_path,
+                                            engine=engine, in_memory=self.in_memory.get(),
+                                            stream_window=DEFAULT_WINDOW_SECONDS if self.stream_windows.get() else None,
+                                            pitch_mixes=self.pitch_mixes.get())
+                    tracker.finish_file(ok)
                     
-                    self.message_queue.put({
-                        'type': 'log',
-                        'text': f"✓ Completed: {os.path.basename(file_path)}"
-                    })
+                    if ok:
+                        self.message_queue.put({
+                            'type': 'log',
+                            'text': f"✓ Completed: {os.path.basename(file_path)}"
+                        })
+                    elif self.cancel_token.cancelled:
+                        self.message_queue.put({
+                            'type': 'log',
+                            'text': f"⏹ Cancelled: {os.path.basename(file_path)}"
+                        })
+                    else:
+                        self.message_queue.put({
+                            'type': 'log',
+                            'text': f"✗ Failed: {os.path.basename(file_path)} (see error.log)"
+                        })
                     
                 except Exception as e:
                     self.message_queue.put({
@@ -636,6 +819,20 @@ class BassExtractorGUI:
                         'text': f"✗ Error processing {os.path.basename(file_path)}: {str(e)}"
                     })
             
+            if self.cancel_token.cancelled:
+                self.message_queue.put({
+                    'type': 'stopped',
+                    'text': f"Processing stopped ({i} of {total_files} files started)"
+                })
+                return
+            
+            if i == 0:
+                self.message_queue.put({
+                    'type': 'error',
+                    'text': "YouTube download failed and no local files provided. No files to process."
+                })
+                return
+            
             # Complete
             self.message_queue.put({'type': 'complete'})
             
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+On-disk journal of batch jobs, used to resume interrupted runs.
+
+Every stage a file reaches (separated, pitched, mixed, exported, moved) is
+appended to a JSON lines file with a single write followed by fsync, so a
+record is either fully on disk or not at all, and several worker processes
+can share one journal. When the journal is loaded, the last record of each
+file wins and a truncated last line from a crash is dropped.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+# Processing stages, in order
+JOURNAL_STAGES = ('separated', 'pitched', 'mixed', 'exported', 'moved')
+
+# Journal file name, inside the output folder
+JOURNAL_NAME = "bass_extractor_journal.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+class JobJournal:
+    """Append-only record of how far each input file got."""
+    
+    def __init__(self, output_folder, resume=False):
+        """
+        Args:
+            output_folder (str): Output folder of the batch, the journal is stored there
+            resume (bool): Load the existing journal; otherwise a new journal is started
+        """
+        self.path = os.path.join(output_folder, JOURNAL_NAME)
+        self.stages = {}
+        self._lock = threading.Lock()
+        os.makedirs(output_folder, exist_ok=True)
+        
+        if resume:
+            self._load()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+    
+    def __getstate__(self):
+        # Locks can't be pickled, e.g. when the journal is sent to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(input_file):
+        """Journal key of an input file."""
+        return os.path.abspath(input_file)
+    
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+                self.stages[record['file']] = record['stage']
+            except (ValueError, KeyError):
+                continue
+        
+        # Cut a partially written last line of an interrupted run, new records must start on their own line
+        if data and not data.endswith(b'\n'):
+            with open(self.path, 'r+b') as f:
+                f.truncate(data.rfind(b'\n') + 1)
+        logger.info(f"Loaded job journal with {len(self.stages)} files: {self.path}")
+    
+    def record(self, input_file, stage):
+        """
+        Record that an input file reached a stage.
+        
+        Args:
+            input_file (str): Path to input audio file
+            stage (str): One of JOURNAL_STAGES
+        """
+        if stage not in JOURNAL_STAGES:
+            raise ValueError(f"Unknown journal stage '{stage}'")
+        
+        key = self.key(input_file)
+        line = json.dumps({'file': key, 'stage': stage, 'time': time.time()}) + '\n'
+        with self._lock:
+            self.stages[key] = stage
+            try:
+                # One O_APPEND write per record, so concurrent writers never interleave
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line.encode('utf-8'))
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logger.warning(f"Failed to write job journal {self.path}: {str(e)}")
+    
+    def stage(self, input_file):
+        """
+        Last stage recorded for an input file.
+        
+        Returns:
+            str: One of JOURNAL_STAGES, or None if the file was never recorded
+        """
+        return self.stages.get(self.key(input_file))
+    
+    def reached(self, input_file, stage):
+        """Whether an input file reached (or passed) a stage."""
+        current = self.stage(input_file)
+        return current is not None and JOURNAL_STAGES.index(current) >= JOURNAL_STAGES.index(stage)
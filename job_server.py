@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Local HTTP job service for bass extraction.
+
+Separator workers are loaded once when the service starts and stay warm
+between requests, so clients don't pay the TensorFlow startup per file.
+Only the standard library is used; by default the service listens on
+localhost only.
+
+Endpoints:
+    POST /jobs                  Submit a job, JSON body with "file" (path on this machine, a
+                                copy is processed) and options, or the raw audio as body with the file name
+                                and options in the query string (?name=song.mp3&novocals=1)
+    GET  /jobs                  List all jobs
+    GET  /jobs/<id>             Job status and output files
+    GET  /jobs/<id>/<MIX>       Download an output file (e.g., /jobs/<id>/NOBASS)
+    GET  /health                Workers, queue depth and job counters
+
+Usage: python job_server.py --output_folder /path/to/output [--port 8765] [--workers 2]
+"""
+
+import argparse
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from batch_runner import _process_file, create_worker_pool
+from extract_bass import extract_bass_from_file
+from mix_wavs import DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS, output_path, requested_mixes
+from separator_engine import get_engine
+
+# Import pitch shifting functionality
+try:
+    from pitch_shifter import PITCH_BACKENDS, validate_note
+    PITCH_SHIFT_AVAILABLE = True
+except ImportError:
+    PITCH_SHIFT_AVAILABLE = False
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Job options a client may set, with their types
+JOB_OPTIONS = {
+    'novocals': bool,
+    'nodrums': bool,
+    'noother': bool,
+    'bassonly': bool,
+    'in_memory': bool,
+    'input_pitch': str,
+    'output_pitch': str,
+    'pitch_mixes': bool,
+    'pitch_backend': str,
+    'output_format': str,
+    'bitrate': str,
+}
+
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Largest accepted JSON job request; it only holds a path and options
+MAX_JSON_BODY = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(ValueError):
+    """Invalid job request, reported to the client as 400 Bad Request."""
+
+
+def parse_job_options(values):
+    """
+    Validate the options of a job request.
+    
+    Args:
+        values (dict): Option name -> value, from a JSON body or a query string
+        
+    Returns:
+        dict: Keyword arguments for extract_bass_from_file
+    """
+    options = {}
+    for name, value in values.items():
+        if name not in JOB_OPTIONS:
+            raise JobError(f"Unknown option '{name}'")
+        if JOB_OPTIONS[name] is bool and isinstance(value, str):
+            value = value.lower() in ('1', 'true', 'yes', 'on')
+        if not isinstance(value, JOB_OPTIONS[name]):
+            raise JobError(f"Option '{name}' must be a {JOB_OPTIONS[name].__name__}")
+        options[name] = value
+    
+    input_pitch = options.get('input_pitch')
+    output_pitch = options.get('output_pitch')
+    if bool(input_pitch) != bool(output_pitch):
+        raise JobError("input_pitch and output_pitch must be used together")
+    if input_pitch:
+        if not PITCH_SHIFT_AVAILABLE:
+            raise JobError("Pitch shifting is not available")
+        for note in (input_pitch, output_pitch):
+            if not validate_note(note):
+                raise JobError(f"Invalid pitch note '{note}'")
+        if options.get('pitch_backend', 'auto') not in PITCH_BACKENDS:
+            raise JobError(f"Unknown pitch backend '{options['pitch_backend']}'")
+    if options.get('output_format', DEFAULT_OUTPUT_FORMAT) not in OUTPUT_FORMATS:
+        raise JobError(f"Unknown output format '{options['output_format']}'")
+    return options
+
+
+class JobServer:
+    """Job queue with a warm worker pool and an HTTP front end."""
+    
+    def __init__(self, output_folder, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=1, ffmpeg_path=None,
+                 options=None):
+        """
+        Args:
+            output_folder (str): Outputs of each job go to <output_folder>/<job id>/
+            host (str): Address to listen on
+            port (int): Port to listen on, 0 picks a free port
+            workers (int): Number of jobs processed in parallel, more than one uses worker processes
+            ffmpeg_path (str, optional): Path to FFmpeg executable
+            options (dict, optional): Keyword arguments for extract_bass_from_file applied to every
+                job (e.g., stem_cache), job options are added on top
+        """
+        self.output_folder = os.path.abspath(output_folder)
+        self.upload_folder = os.path.join(self.output_folder, "uploads")
+        self.workers = max(1, workers)
+        self.ffmpeg_path = ffmpeg_path
+        self.options = dict(options or {})
+        self.jobs = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._engine = None
+        self._started = time.time()
+        os.makedirs(self.upload_folder, exist_ok=True)
+        
+        if self.workers <= 1:
+            # One worker thread with this process's warm engine
+            self._engine = get_engine()
+            try:
+                self._engine.warm_up()
+            except Exception as e:
+                logger.error(f"Failed to warm up Spleeter separator: {str(e)}")
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        else:
+            self._executor = create_worker_pool(self.workers, ffmpeg_path, ignore_interrupt=True)
+        
+        self.httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.job_server = self
+    
+    @property
+    def url(self):
+        """Base URL of the service."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def serve_forever(self):
+        """Handle requests until shutdown() is called or Ctrl+C is pressed."""
+        logger.info(f"Bass extractor job server listening on {self.url} ({self.workers} worker(s))")
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Interrupted, finishing running jobs...")
+        finally:
+            self.close()
+    
+    def start(self):
+        """
+        Handle requests in a background thread, e.g. for tests.
+        
+        Returns:
+            threading.Thread: The server thread
+        """
+        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        thread.start()
+        return thread
+    
+    def shutdown(self):
+        """Stop handling requests (from another thread than serve_forever)."""
+        self.httpd.shutdown()
+    
+    def close(self):
+        """Release the socket and wait for running jobs, queued jobs are cancelled."""
+        self.httpd.server_close()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+    
+    def submit(self, input_file, options):
+        """
+        Queue a job.
+        
+        Args:
+            input_file (str): Path to input audio file, moved to the job's DONE folder when finished
+            options (dict): Validated job options, see parse_job_options
+            
+        Returns:
+            dict: The new job, see job_status
+        """
+        job_id = uuid.uuid4().hex
+        job_folder = os.path.join(self.output_folder, job_id)
+        job_options = dict(self.options, ffmpeg_path=self.ffmpeg_path, **options)
+        
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'input': input_file,
+            'output_folder': job_folder,
+            'options': options,
+            'outputs': {},
+            'error': None,
+            'created': time.time(),
+            'finished': None,
+        }
+        
+        with self._lock:
+            self.jobs[job_id] = job
+            if self._engine is not None:
+                future = self._executor.submit(extract_bass_from_file, input_file, job_folder,
+                                               engine=self._engine, **job_options)
+            else:
+                future = self._executor.submit(_process_file, input_file, job_folder, job_options)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finish_job(job_id, f))
+        logger.info(f"Queued job {job_id}: {input_file}")
+        return self.job_status(job_id)
+    
+    def _finish_job(self, job_id, future):
+        with self._lock:
+            job = self.jobs[job_id]
+            job['finished'] = time.time()
+            if future.cancelled():
+                job['status'] = 'cancelled'
+                return
+            try:
+                ok = future.result()
+            except Exception as e:
+                ok = False
+                job['error'] = str(e)
+            
+            song_name = Path(job['input']).stem
+            options = job['options']
+            for mix in requested_mixes(options.get('novocals', False), options.get('nodrums', False),
+                                       options.get('noother', False), options.get('bassonly', False)):
+                path = output_path(job['output_folder'], mix, song_name,
+                                   options.get('output_format', DEFAULT_OUTPUT_FORMAT))
+                if os.path.exists(path):
+                    job['outputs'][mix] = path
+            
+            job['status'] = 'done' if ok else 'failed'
+            if not ok and job['error'] is None:
+                job['error'] = "Processing failed, check error.log for details"
+            del self._futures[job_id]
+        logger.info(f"Job {job_id} {job['status']}")
+    
+    def job_status(self, job_id):
+        """
+        Current state of a job.
+        
+        Returns:
+            dict: id, status ('queued', 'running', 'done', 'failed' or 'cancelled'), input,
+                options, outputs (mix name -> path), error and timestamps, or None if unknown
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = json.loads(json.dumps(job))
+            # Worker processes take the next job a little ahead, it shows as running a bit early
+            future = self._futures.get(job_id)
+            if future is not None and future.running():
+                job['status'] = 'running'
+            return job
+    
+    def health(self):
+        """
+        Service state.
+        
+        Returns:
+            dict: Workers, uptime and the number of jobs per status
+        """
+        counts = {}
+        for job_id in list(self.jobs):
+            status = self.job_status(job_id)['status']
+            counts[status] = counts.get(status, 0) + 1
+        return {
+            'workers': self.workers,
+            'uptime': time.time() - self._started,
+            'queue_depth': counts.get('queued', 0),
+            'jobs': counts,
+        }
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a JobServer (self.server.job_server)."""
+    
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+    
+    def _send_json(self, status, body):
+        data = json.dumps(body, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _send_error(self, status, message):
+        self._send_json(status, {'error': message})
+    
+    def do_GET(self):
+        job_server = self.server.job_server
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        
+        if parts == ['health']:
+            self._send_json(HTTPStatus.OK, job_server.health())
+        elif parts == ['jobs']:
+            self._send_json(HTTPStatus.OK, [job_server.job_status(job_id) for job_id in list(job_server.jobs)])
+        elif len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = job_server.job_status(parts[1])
+            if job is None:
+                self._send_error(HTTPStatus.NOT_FOUND, f"Unknown job '{parts[1]}'")
+            elif len(parts) == 2:
+                self._send_json(HTTPStatus.OK, job)
+            elif parts[2] not in job['outputs']:
+                self._send_error(HTTPStatus.NOT_FOUND, f"Job '{parts[1]}' has no {parts[2]} output")
+            else:
+                self._send_file(job['outputs'][parts[2]])
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f"Unknown path '{self.path}'")
+    
+    def _send_file(self, path):
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile)
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            self._send_error(HTTPStatus.NOT_FOUND, f"Unknown path '{self.path}'")
+            return
+        
+        try:
+            if self.headers.get('Content-Type', '').split(';')[0].strip() == 'application/json':
+                input_file, options = self._read_json_job()
+            else:
+                input_file, options = self._read_upload_job(parse_qs(url.query))
+        except JobError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        
+        self._send_json(HTTPStatus.ACCEPTED, self.server.job_server.submit(input_file, options))
+    
+    def _content_length(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise JobError("Content-Length must be an integer")
+        if length < 0:
+            raise JobError("Content-Length must not be negative")
+        return length
+    
+    def _new_upload_folder(self):
+        # Each job input gets its own folder, so that identical names don't collide
+        upload_folder = os.path.join(self.server.job_server.upload_folder, uuid.uuid4().hex)
+        os.makedirs(upload_folder)
+        return upload_folder
+    
+    def _read_json_job(self):
+        length = self._content_length()
+        if length > MAX_JSON_BODY:
+            raise JobError(f"Request body is larger than {MAX_JSON_BODY} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise JobError("Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise JobError("Request body must be a JSON object")
+        
+        input_file = body.pop('file', None)
+        if not input_file:
+            raise JobError("Missing 'file'")
+        if not os.path.isfile(input_file):
+            raise JobError(f"File '{input_file}' does not exist")
+        options = parse_job_options(body)
+        
+        # The job works on a copy: finished inputs are moved to the DONE folder, and the
+        # client's file must stay where it is
+        copy = os.path.join(self._new_upload_folder(), os.path.basename(input_file))
+        try:
+            shutil.copyfile(input_file, copy)
+        except OSError as e:
+            shutil.rmtree(os.path.dirname(copy), ignore_errors=True)
+            raise JobError(f"Failed to read '{input_file}': {e.strerror}")
+        return copy, options
+    
+    def _read_upload_job(self, query):
+        values = {name: value[-1] for name, value in query.items()}
+        # Only the base name is used, clients can't write outside the upload folder
+        name = os.path.basename(values.pop('name', '') or '')
+        if not name:
+            raise JobError("Missing 'name' of the uploaded file")
+        length = self._content_length()
+        if length <= 0:
+            raise JobError("Missing uploaded audio")
+        options = parse_job_options(values)
+        
+        upload_folder = self._new_upload_folder()
+        input_file = os.path.join(upload_folder, name)
+        try:
+            with open(input_file, 'wb') as f:
+                remaining = length
+                while remaining > 0:
+                    chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise JobError("Upload ended before Content-Length bytes were received")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+        except OSError as e:
+            shutil.rmtree(upload_folder, ignore_errors=True)
+            raise JobError(f"Failed to store the upload: {e.strerror}")
+        except BaseException:
+            shutil.rmtree(upload_folder, ignore_errors=True)
+            raise
+        return input_file, options
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP job service for bass extraction")
+    parser.add_argument('--output_folder', type=str, required=True,
+                        help='Output folder, each job writes to its own subfolder')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST,
+                        help=f'Address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of jobs processed in parallel, each worker loads its own separator (default: 1)')
+    parser.add_argument('--ffmpeg', type=str, help='Path to ffmpeg executable (if not in PATH)')
+    parser.add_argument('--cache-dir', type=str, help='Folder for the stem cache, shared by all jobs')
+    parser.add_argument('--cache-size', type=float, default=5000,
+                        help='Maximum size of the stem cache in MB (default: 5000)')
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('error.log'),
+            logging.StreamHandler()
+        ]
+    )
+    
+    if args.workers < 1:
+        print("Error: --workers must be at least 1.")
+        sys.exit(1)
+    
+    if args.ffmpeg:
+        from pydub import AudioSegment
+        AudioSegment.converter = args.ffmpeg
+    
+    options = {}
+    if args.cache_dir:
+        from stem_cache import StemCache
+        options['stem_cache'] = StemCache(args.cache_dir, args.cache_size)
+    
+    JobServer(args.output_folder, args.host, args.port, args.workers, args.ffmpeg, options).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
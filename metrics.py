@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Per-file, per-stage resource measurements.
+
+For each stage of each file (decode, separate, pitch, mix, export, ...) the
+wall time, CPU time of the process and of its finished child processes
+(FFmpeg), the change of the resident memory over the stage, the peak RSS of
+the process so far and the bytes read and written through system calls are
+recorded. Records are appended to a JSON lines file with one write per
+record, so worker processes can share the file, and summarized per stage
+with percentiles at the end of a batch, as text or in the Prometheus text
+exposition format.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from progress import report_stage
+
+# Not available on Windows, CPU time then comes from time.process_time and the peak RSS is not reported
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+# Percentiles reported in the batch summary
+SUMMARY_PERCENTILES = (50, 90, 99)
+
+# Prefix of the Prometheus metric names
+PROMETHEUS_PREFIX = "bass_extractor"
+
+logger = logging.getLogger(__name__)
+
+
+def _read_io(per_thread=False):
+    """Bytes read and written through system calls by this process (or thread), None if unknown."""
+    path = '/proc/thread-self/io' if per_thread else '/proc/self/io'
+    try:
+        with open(path, 'r') as f:
+            values = dict(line.split(': ') for line in f.read().splitlines())
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _read_rss_mb():
+    """Current resident memory of this process in MB, None where /proc is not available."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def resource_snapshot(per_thread=False):
+    """
+    Current resource counters.
+    
+    Args:
+        per_thread (bool): CPU time and I/O of the calling thread only, for stages that
+            run concurrently in threads of one process
+        
+    Returns:
+        dict: wall, cpu, children_cpu (seconds), rss_mb (current), process_peak_rss_mb (peak
+            since the process started), read_bytes and write_bytes
+    """
+    snapshot = {'wall': time.perf_counter(), 'children_cpu': None, 'rss_mb': _read_rss_mb(),
+                'process_peak_rss_mb': None}
+    if per_thread:
+        snapshot['cpu'] = time.thread_time()
+    else:
+        snapshot['cpu'] = time.process_time()
+    
+    if RESOURCE_AVAILABLE:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        snapshot['children_cpu'] = children.ru_utime + children.ru_stime
+        # ru_maxrss is in KB on Linux; it is the peak over the lifetime of the process, not of a stage
+        snapshot['process_peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    
+    snapshot['read_bytes'], snapshot['write_bytes'] = _read_io(per_thread)
+    return snapshot
+
+
+def _difference(start, end):
+    """
+    Resources used between two snapshots. rss_growth_mb is the change of the resident
+    memory of the whole process (negative if memory was freed), process_peak_rss_mb
+    the peak of the process up to the end, which may have been reached in an earlier stage.
+    """
+    values = {'process_peak_rss_mb': end['process_peak_rss_mb']}
+    for name in ('wall', 'cpu', 'children_cpu', 'read_bytes', 'write_bytes'):
+        if start[name] is None or end[name] is None:
+            values[name] = None
+        else:
+            values[name] = end[name] - start[name]
+    values['rss_growth_mb'] = None
+    if start['rss_mb'] is not None and end['rss_mb'] is not None:
+        values['rss_growth_mb'] = end['rss_mb'] - start['rss_mb']
+    return values
+
+
+class MetricsRecorder:
+    """Collects stage measurements and appends them to a JSON lines file."""
+    
+    def __init__(self, path=None, append=False):
+        """
+        Args:
+            path (str, optional): JSON lines file for the records, they are only kept in memory without it
+            append (bool): Keep the records already in the file (e.g., when resuming a batch)
+        """
+        self.path = path
+        self.records = []
+        self._lock = threading.Lock()
+        
+        if path and not append and os.path.exists(path):
+            os.remove(path)
+    
+    def __getstate__(self):
+        # Locks can't be pickled, e.g. when the recorder is sent to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['records'] = []
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def record(self, input_file, stage, values):
+        """
+        Store the measurements of one stage.
+        
+        Args:
+            input_file (str): Path to input audio file, None for work not tied to a file (model init)
+            stage (str): Stage name
+            values (dict): Measurements, see resource_snapshot
+        """
+        record = {'file': input_file, 'stage': stage, 'pid': os.getpid(), 'time': time.time()}
+        record.update(values)
+        with self._lock:
+            self.records.append(record)
+            if not self.path:
+                return
+            try:
+                # One O_APPEND write per record, so concurrent writers never interleave
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, (json.dumps(record) + '\n').encode('utf-8'))
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logger.warning(f"Failed to write metrics to {self.path}: {str(e)}")
+    
+    @contextlib.contextmanager
+    def measure(self, input_file, stage, per_thread=False):
+        """Context manager that records the resources used by its body as one stage."""
+        start = resource_snapshot(per_thread)
+        try:
+            yield
+        finally:
+            self.record(input_file, stage, _difference(start, resource_snapshot(per_thread)))
+    
+    def start_file(self, input_file):
+        """
+        Start measuring the stages of one file.
+        
+        Returns:
+            FileMetrics: Stage tracker of the file
+        """
+        return FileMetrics(self, input_file)
+    
+    def load(self):
+        """
+        All records, including those written by worker processes.
+        
+        Returns:
+            list: Records in the order they were written
+        """
+        if not self.path:
+            return list(self.records)
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+    
+    def summary(self):
+        """
+        Per-stage statistics over all records.
+        
+        Returns:
+            dict: Stage name -> count, wall time sum and percentiles, CPU time sums,
+                largest RSS growth, largest process peak RSS and I/O byte sums
+        """
+        stages = {}
+        for record in self.load():
+            stages.setdefault(record['stage'], []).append(record)
+        
+        summary = {}
+        for stage, records in stages.items():
+            walls = np.array([record['wall'] for record in records])
+            stats = {
+                'count': len(records),
+                'wall_sum': float(walls.sum()),
+                'wall_max': float(walls.max()),
+            }
+            for percentile in SUMMARY_PERCENTILES:
+                stats[f'wall_p{percentile}'] = float(np.percentile(walls, percentile))
+            for name in ('cpu', 'children_cpu', 'read_bytes', 'write_bytes'):
+                values = [record[name] for record in records if record.get(name) is not None]
+                stats[f'{name}_sum'] = sum(values) if values else None
+            for name in ('rss_growth_mb', 'process_peak_rss_mb'):
+                values = [record[name] for record in records if record.get(name) is not None]
+                stats[f'{name}_max'] = max(values) if values else None
+            summary[stage] = stats
+        return summary
+    
+    def format_summary(self):
+        """Human readable per-stage summary."""
+        summary = self.summary()
+        if not summary:
+            return "No metrics recorded"
+        
+        percentiles = ' '.join(f"p{percentile}" for percentile in SUMMARY_PERCENTILES)
+        lines = [f"Stage metrics (wall time {percentiles} max, total CPU, largest RSS growth, process peak RSS, I/O):"]
+        for stage, stats in summary.items():
+            wall = ' '.join(f"{stats[f'wall_p{percentile}']:.2f}s" for percentile in SUMMARY_PERCENTILES)
+            cpu = stats['cpu_sum'] + (stats['children_cpu_sum'] or 0.0)
+            line = f"  {stage:<10} n={stats['count']:<4} wall={wall} {stats['wall_max']:.2f}s cpu={cpu:.1f}s"
+            if stats['rss_growth_mb_max'] is not None:
+                line += f" rss_growth={stats['rss_growth_mb_max']:+.0f}MB"
+            if stats['process_peak_rss_mb_max'] is not None:
+                line += f" process_peak_rss={stats['process_peak_rss_mb_max']:.0f}MB"
+            if stats['read_bytes_sum'] is not None:
+                line += (f" read={stats['read_bytes_sum'] / 1024 / 1024:.1f}MB"
+                         f" written={stats['write_bytes_sum'] / 1024 / 1024:.1f}MB")
+            lines.append(line)
+        return '\n'.join(lines)
+    
+    def write_prometheus(self, path):
+        """
+        Write the per-stage summary in the Prometheus text exposition format.
+        
+        Args:
+            path (str): Output file, e.g. in the node exporter's textfile collector folder
+        """
+        summary = self.summary()
+        lines = [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_seconds Wall time per file and stage.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds summary",
+        ]
+        for stage, stats in summary.items():
+            for percentile in SUMMARY_PERCENTILES:
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds{{stage="{stage}",quantile="{percentile / 100}"}} '
+                             f"{stats[f'wall_p{percentile}']}")
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {stats["wall_sum"]}')
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        
+        counters = (
+            ('cpu_sum', 'stage_cpu_seconds_total', "CPU time of the process per stage."),
+            ('children_cpu_sum', 'stage_children_cpu_seconds_total', "CPU time of child processes per stage."),
+            ('read_bytes_sum', 'stage_read_bytes_total', "Bytes read through system calls per stage."),
+            ('write_bytes_sum', 'stage_written_bytes_total', "Bytes written through system calls per stage."),
+        )
+        for key, name, help_text in counters:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} counter")
+            for stage, stats in summary.items():
+                if stats[key] is not None:
+                    lines.append(f'{PROMETHEUS_PREFIX}_{name}{{stage="{stage}"}} {stats[key]}')
+        
+        gauges = (
+            ('rss_growth_mb_max', 'stage_rss_growth_bytes',
+             "Largest change of the resident memory from the start to the end of the stage."),
+            ('process_peak_rss_mb_max', 'stage_process_peak_rss_bytes',
+             "Peak resident memory of the process since it started, at the end of the stage."),
+        )
+        for key, name, help_text in gauges:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            for stage, stats in summary.items():
+                if stats[key] is not None:
+                    lines.append(f'{PROMETHEUS_PREFIX}_{name}{{stage="{stage}"}} {int(stats[key] * 1024 * 1024)}')
+        
+        # Written to a temp file and renamed, so scrapers never see a partial file
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, path)
+
+
+class FileMetrics:
+    """
+    Stage tracker of one file: start() closes the current stage and opens the next one.
+    
+    A tracker without recorder measures nothing, so callers don't need to check for one.
+    Stage changes are also reported to the active ProgressTracker of the thread, if any.
+    """
+    
+    def __init__(self, recorder, input_file):
+        self.recorder = recorder
+        self.input_file = input_file
+        self.finished = False
+        self._stage = None
+        self._stage_start = None
+        self._file_start = resource_snapshot() if recorder is not None else None
+    
+    def start(self, stage):
+        """Finish the current stage, if any, and start measuring the next one."""
+        report_stage(stage)
+        if self.recorder is None:
+            return
+        self._close_stage()
+        self._stage = stage
+        self._stage_start = resource_snapshot()
+    
+    def stop(self):
+        """Finish the current stage, if any, without starting another one."""
+        if self.recorder is not None:
+            self._close_stage()
+    
+    def finish(self, ok=True):
+        """Finish the current stage and record the whole file as stage 'total'; later calls do nothing."""
+        if self.recorder is None or self.finished:
+            return
+        self.finished = True
+        self._close_stage()
+        values = _difference(self._file_start, resource_snapshot())
+        values['ok'] = ok
+        self.recorder.record(self.input_file, 'total', values)
+    
+    def _close_stage(self):
+        if self._stage is not None:
+            self.recorder.record(self.input_file, self._stage, _difference(self._stage_start, resource_snapshot()))
+            self._stage = None
+
+
+def measure_stage(recorder, input_file, stage, per_thread=False):
+    """recorder.measure(...), or a context manager that does nothing without a recorder."""
+    if recorder is None:
+        return contextlib.nullcontext()
+    return recorder.measure(input_file, stage, per_thread)
@@ -1,72 +1,485 @@
+import mmap
+import os
+import subprocess
+import wave
+import numpy as np
 from pydub import AudioSegment
+from cancellation import check_cancelled
+from progress import report_progress
 
 # (Make sure FFmpeg is installed and on your PATH,
 # or set AudioSegment.converter = "/full/path/to/ffmpeg")
 
-# Load your files
-def mix_wavs(bass_path, drums_path, vocals_path, other_path, song_name, output_folder, novocals=False, nodrums=False, noother=False, bassonly=False):
-  bass   = AudioSegment.from_wav(bass_path)
-  drums   = AudioSegment.from_wav(drums_path)
-  vocals  = AudioSegment.from_wav(vocals_path)
-  other   = AudioSegment.from_wav(other_path)
-
-  # The basic behaviour is to remove the bass from the original track
-  # Pad to same length
-  max_len_nobass = max(len(drums), len(vocals), len(other))
-  drums_nobass  = drums + AudioSegment.silent(max_len_nobass - len(drums))
-  vocals_nobass = vocals + AudioSegment.silent(max_len_nobass - len(vocals))
-  other_nobass  = other + AudioSegment.silent(max_len_nobass - len(other))
-
-  # Overlay
-  mixed_nobass = drums_nobass.overlay(vocals_nobass).overlay(other_nobass)
-
-  # Export NOBASS version (drums + vocals + other)
-  # Create subfolders
-  import os
-  nobass_folder = os.path.join(output_folder, "NOBASS")
-  os.makedirs(nobass_folder, exist_ok=True)
-
-  # Export NOBASS version (drums + vocals + other)
-  mixed_nobass.export(os.path.join(nobass_folder, f"{song_name}.mp3"), format="mp3", bitrate="192k")
-
-  if bassonly:
-    bassonly_folder = os.path.join(output_folder, "BASSONLY")
-    os.makedirs(bassonly_folder, exist_ok=True)
-    bass.export(os.path.join(bassonly_folder, f"{song_name}.mp3"), format="mp3", bitrate="192k")
+# Order of the stems in the stacked (stems, samples, channels) array
+STEM_NAMES = ('bass', 'drums', 'vocals', 'other')
 
-  if novocals:
-    max_len_novocals = max(len(drums), len(bass), len(other))
-    drums_novocals  = drums + AudioSegment.silent(max_len_novocals - len(drums))
-    bass_novocals = bass + AudioSegment.silent(max_len_novocals - len(bass))
-    other_novocals  = other + AudioSegment.silent(max_len_novocals - len(other))
+# Output folder -> stems that are summed into that mix
+MIXES = {
+  'NOBASS':   ('drums', 'vocals', 'other'),
+  'BASSONLY': ('bass',),
+  'NOVOCALS': ('bass', 'drums', 'other'),
+  'NODRUMS':  ('bass', 'vocals', 'other'),
+  'NOOTHER':  ('bass', 'vocals', 'drums'),
+}
+
+# Spleeter models the stems can come from, cheapest first, with the stems each one produces
+SEPARATION_MODELS = (
+  ('spleeter:4stems', STEM_NAMES),
+)
+
+# 16-bit PCM full scale, used for int16 <-> float32 conversion
+PCM_SCALE = 32768.0
+
+# Number of samples mixed at a time, keeps the float32 temporaries small
+MIX_BLOCK_SIZE = 8192
+
+# Outputs are written as name.partial.mp3 and renamed when complete, so an
+# interrupted run never leaves a truncated MP3 under its final name
+PARTIAL_TAG = '.partial'
+
+# Output format -> (file extension, FFmpeg muxer, encoder arguments)
+OUTPUT_FORMATS = {
+  'mp3':  ('.mp3', 'mp3', ['-c:a', 'libmp3lame']),
+  'ogg':  ('.ogg', 'ogg', ['-c:a', 'libvorbis']),
+  'opus': ('.opus', 'opus', ['-c:a', 'libopus']),
+  'm4a':  ('.m4a', 'ipod', ['-c:a', 'aac']),
+  'flac': ('.flac', 'flac', ['-c:a', 'flac']),
+  'wav':  ('.wav', 'wav', ['-c:a', 'pcm_s16le']),
+}
 
-    mixed_novocals = drums_novocals.overlay(bass_novocals).overlay(other_novocals)# Overlay
+# The bitrate doesn't apply to these
+LOSSLESS_FORMATS = ('flac', 'wav')
 
-    novocals_folder = os.path.join(output_folder, "NOVOCALS")
-    os.makedirs(novocals_folder, exist_ok=True)
-    mixed_novocals.export(os.path.join(novocals_folder, f"{song_name}.mp3"), format="mp3", bitrate="192k")
+DEFAULT_OUTPUT_FORMAT = 'mp3'
+DEFAULT_BITRATE = '192k'
 
+# Samples per mix sent to the encoder at a time
+EXPORT_BLOCK_SIZE = 65536
+
+
+# Mixes to export for the given options, in export order
+# (--bassonly replaces NOBASS with BASSONLY, the other outputs are added to either)
+def requested_mixes(novocals=False, nodrums=False, noother=False, bassonly=False):
+  mixes = ['BASSONLY'] if bassonly else ['NOBASS']
+  if novocals:
+    mixes.append('NOVOCALS')
   if nodrums:
-    max_len_nodrums = max(len(bass), len(vocals), len(other))
-    bass_nodrums = bass + AudioSegment.silent(max_len_nodrums - len(bass))
-    vocals_nodrums = vocals + AudioSegment.silent(max_len_nodrums - len(vocals))
-    other_nodrums  = other + AudioSegment.silent(max_len_nodrums - len(other))
+    mixes.append('NODRUMS')
+  if noother:
+    mixes.append('NOOTHER')
+  return mixes
+
+
+# Stems of the given stem names that are summed into a mix
+def mix_stem_names(mix, stem_names=STEM_NAMES):
+  return [name for name in stem_names if name in MIXES[mix]]
+
+
+# Stems (of the given stem names, in their order) that at least one of the mixes uses
+def used_stems(mixes, stem_names=STEM_NAMES):
+  return [name for name in stem_names if any(name in mix_stem_names(mix, stem_names) for mix in mixes)]
+
+
+# Plan the separation from the requested outputs: the cheapest model that produces the stems
+# of every mix, and the stems of that model the mixes use. Stems that no output uses don't need
+# to be read, pitch shifted or mixed.
+def plan_separation(mixes):
+  for model, stem_names in SEPARATION_MODELS:
+    if all(set(mix_stem_names(mix, stem_names)) == set(MIXES[mix]) for mix in mixes):
+      return model, used_stems(mixes, stem_names)
+  raise ValueError(f"No separation model produces the stems of {', '.join(mixes)}")
+
+
+# Load your files (memory-mapped, they are mixed and encoded block by block)
+def mix_wavs(bass_path, drums_path, vocals_path, other_path, song_name, output_folder, novocals=False, nodrums=False, noother=False, bassonly=False,
+             output_format=DEFAULT_OUTPUT_FORMAT, bitrate=DEFAULT_BITRATE):
+  mixes = requested_mixes(novocals, nodrums, noother, bassonly)
+  paths = dict(zip(STEM_NAMES, [bass_path, drums_path, vocals_path, other_path]))
+  # Stems that no requested output uses are not even opened
+  stem_names = used_stems(mixes)
+  stems, sample_rate = map_stems([paths[name] for name in stem_names])
+  export_stem_mixes(stems, mixes, sample_rate, song_name, output_folder, output_format, bitrate,
+                    stem_names=stem_names)
+
+
+# Use stems that are already in memory (e.g. from Separator.separate), no WAV files involved
+def mix_stems(stems, sample_rate, song_name, output_folder, novocals=False, nodrums=False, noother=False, bassonly=False,
+              output_format=DEFAULT_OUTPUT_FORMAT, bitrate=DEFAULT_BITRATE):
+  mixes = requested_mixes(novocals, nodrums, noother, bassonly)
+  stem_names = used_stems(mixes)
+  export_stem_mixes([stems[name] for name in stem_names], mixes, sample_rate, song_name, output_folder,
+                    output_format, bitrate, stem_names=stem_names)
+
+
+# Decode each stem WAV exactly once into one float32 array of shape (stems, samples, channels).
+# Shorter stems are padded with silence. Returns (array, per-stem lengths, sample rate).
+def load_stems(paths):
+  headers = [read_wav_header(path) for path in paths]
+  if None in headers:
+    # Not plain PCM WAV files, let pydub decode them
+    return stack_segments([AudioSegment.from_wav(path) for path in paths])
 
-    mixed_nodrums = bass_nodrums.overlay(vocals_nodrums).overlay(other_nodrums) 
+  lengths = [header[0] for header in headers]
+  channels = max(header[1] for header in headers)
+  sample_rate = headers[0][2]
 
-    nodrums_folder = os.path.join(output_folder, "NODRUMS")
-    os.makedirs(nodrums_folder, exist_ok=True)
-    mixed_nodrums.export(os.path.join(nodrums_folder, f"{song_name}.mp3"), format="mp3", bitrate="192k")
+  stems = np.zeros((len(paths), max(lengths), channels), dtype=np.float32)
+  for i, path in enumerate(paths):
+    with wave.open(path, 'rb') as wav_file:
+      sample_width = wav_file.getsampwidth()
+      samples = np.frombuffer(wav_file.readframes(lengths[i]), dtype=f'<i{sample_width}')
+    # Convert straight into the stacked array, scaling in place
+    stem = stems[i, :lengths[i]]
+    stem[:] = samples.reshape(lengths[i], -1)
+    stem *= 1.0 / (PCM_SCALE * 256 ** (sample_width - 2))
+  return stems, lengths, sample_rate
 
-  if noother: 
-    max_len_noother = max(len(bass), len(vocals), len(drums))
-    bass_noother = bass + AudioSegment.silent(max_len_noother - len(bass))
-    vocals_noother = vocals + AudioSegment.silent(max_len_noother - len(vocals))
-    drums_noother = drums + AudioSegment.silent(max_len_noother - len(drums))
 
-    mixed_noother = bass_noother.overlay(vocals_noother).overlay(drums_noother) 
+# (frames, channels, sample rate) of a 16/32-bit PCM WAV file, None if the stdlib can't read it
+def read_wav_header(path):
+  try:
+    with wave.open(path, 'rb') as wav_file:
+      if wav_file.getsampwidth() not in (2, 4):
+        return None
+      return wav_file.getnframes(), wav_file.getnchannels(), wav_file.getframerate()
+  except (wave.Error, EOFError):
+    return None
 
-    noother_folder = os.path.join(output_folder, "NOOTHER")
-    os.makedirs(noother_folder, exist_ok=True)
-    mixed_noother.export(os.path.join(noother_folder, f"{song_name}.mp3"), format="mp3", bitrate="192k")
+
+# Byte offset of the sample data in a RIFF/WAVE file, None if there is no data chunk
+def wav_data_offset(path):
+  with open(path, 'rb') as f:
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+      return None
+    while True:
+      chunk = f.read(8)
+      if len(chunk) < 8:
+        return None
+      if chunk[:4] == b'data':
+        return f.tell()
+      # Chunks are padded to an even size
+      size = int.from_bytes(chunk[4:], 'little')
+      f.seek(size + size % 2, 1)
+
+
+# Memory-map the samples of a 16/32-bit PCM WAV file without reading them: returns
+# (integer array of shape (frames, channels), sample rate), None if the stdlib can't read it.
+# Pages are only read from disk when a block of samples is used.
+def map_wav(path):
+  header = read_wav_header(path)
+  offset = wav_data_offset(path)
+  if header is None or offset is None:
+    return None
+  frames, channels, sample_rate = header
+  with wave.open(path, 'rb') as wav_file:
+    sample_width = wav_file.getsampwidth()
+  
+  # Don't trust the header of a truncated file
+  frames = min(frames, (os.path.getsize(path) - offset) // (sample_width * channels))
+  if frames <= 0:
+    return np.zeros((0, channels), dtype=f'<i{sample_width}'), sample_rate
+  with open(path, 'rb') as f:
+    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+  samples = np.frombuffer(mapped, dtype=f'<i{sample_width}', count=frames * channels, offset=offset)
+  return samples.reshape(frames, channels), sample_rate
+
+
+# Memory-map stem WAV files for export_stem_mixes. Returns (list of arrays, sample rate); files
+# that can't be mapped (not plain PCM, or different sample rates) are decoded into memory instead.
+def map_stems(paths):
+  maps = [map_wav(path) for path in paths]
+  if None in maps or len({sample_rate for _, sample_rate in maps}) > 1:
+    stems, lengths, sample_rate = load_stems(paths)
+    return [stems[i, :lengths[i]] for i in range(len(paths))], sample_rate
+  return [samples for samples, _ in maps], maps[0][1]
+
+
+# Tell the OS that the mapped pages of samples[start:end] won't be used again, so they stop
+# counting towards the resident memory (they are read again from the page cache if needed).
+# Does nothing for arrays that aren't memory-mapped or where madvise isn't available.
+def drop_mapped_pages(samples, start, end):
+  mapped = samples
+  while mapped is not None and not isinstance(mapped, mmap.mmap):
+    mapped = mapped.obj if isinstance(mapped, memoryview) else getattr(mapped, 'base', None)
+  if mapped is None or not hasattr(mapped, 'madvise') or end <= start:
+    return
   
+  # Byte range of the rows in the mapping, shrunk to whole pages
+  base_address = np.frombuffer(mapped, dtype=np.uint8, count=1).ctypes.data
+  row_bytes = samples.strides[0]
+  first = samples.ctypes.data - base_address + start * row_bytes
+  last = samples.ctypes.data - base_address + end * row_bytes
+  first = -(-first // mmap.PAGESIZE) * mmap.PAGESIZE
+  last = last // mmap.PAGESIZE * mmap.PAGESIZE
+  if last > first:
+    mapped.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+
+# Stack decoded AudioSegments into one padded float32 array
+def stack_segments(segments):
+  sample_rate = segments[0].frame_rate
+  channels = max(segment.channels for segment in segments)
+  stems, lengths = stack_stems([segment_to_array(segment.set_channels(channels)) for segment in segments])
+  return stems, lengths, sample_rate
+
+
+# Stack in-memory stems of shape (samples, channels) into one padded float32 array
+def stack_stems(arrays):
+  lengths = [len(array) for array in arrays]
+  channels = max(array.shape[1] for array in arrays)
+  stems = np.zeros((len(arrays), max(lengths), channels), dtype=np.float32)
+  for i, array in enumerate(arrays):
+    stems[i, :lengths[i]] = array
+  return stems, lengths
+
+
+# Build every requested mix as a masked sum of the stems in one vectorized pass over
+# blocks of samples, saturating to the 16-bit range like pydub's overlay did.
+# headroom_db lowers the gain of all mixes before clipping, 0 keeps the previous levels.
+# Returns {mix: int16 array of shape (samples, channels)}, each as long as the longest
+# stem it contains. stem_names are the stems in the array, in order.
+def mix_stem_array(stems, lengths, mixes, headroom_db=0.0, block_size=MIX_BLOCK_SIZE, stem_names=STEM_NAMES):
+  mask = mix_mask(mixes, headroom_db, stem_names)
+
+  n_stems, n_samples, channels = stems.shape
+  pcm = np.empty((len(mixes), n_samples, channels), dtype='<i2')
+
+  # Work on flat (stems, samples * channels) views so each block is one matrix product
+  flat_stems = stems.reshape(n_stems, -1)
+  flat_pcm = pcm.reshape(len(mixes), -1)
+  step = block_size * channels
+  for start in range(0, flat_stems.shape[1], step):
+    # (mixes, stems) x (stems, block) -> (mixes, block)
+    block = mask @ flat_stems[:, start:start + step]
+    np.rint(block, out=block)
+    np.clip(block, -PCM_SCALE, PCM_SCALE - 1, out=block)
+    flat_pcm[:, start:start + step] = block
+
+  return {mix: pcm[i, :mix_length]
+          for i, (mix, mix_length) in enumerate(zip(mixes, mix_lengths(lengths, mixes, stem_names)))}
+
+
+# (mixes, stems) gain matrix of the requested mixes, in 16-bit PCM units for float stems
+def mix_mask(mixes, headroom_db=0.0, stem_names=STEM_NAMES):
+  mask = np.array([[name in mix_stem_names(mix, stem_names) for name in stem_names] for mix in mixes],
+                  dtype=np.float32)
+  mask *= PCM_SCALE * 10 ** (-headroom_db / 20)
+  return mask
+
+
+# Length of each mix: the longest stem it contains
+def mix_lengths(lengths, mixes, stem_names=STEM_NAMES):
+  return [max(lengths[list(stem_names).index(name)] for name in mix_stem_names(mix, stem_names)) for mix in mixes]
+
+
+# Mix stems block by block without stacking them. stems is a list of (samples, channels) arrays
+# in stem_names order (only the stems the mixes use are needed), either float in [-1, 1] or integer PCM (e.g. memory-mapped WAV data from
+# map_stems), so only one block of each stem is in memory at a time; mapped pages are released
+# once they have been mixed. Yields int16 blocks of shape (mixes, block, channels) that cover the
+# longest requested mix, shorter mixes are padded with silence.
+def iter_mix_blocks(stems, mixes, headroom_db=0.0, block_size=MIX_BLOCK_SIZE, stem_names=STEM_NAMES):
+  mask = mix_mask(mixes, headroom_db, stem_names)
+  for i, stem in enumerate(stems):
+    if np.issubdtype(stem.dtype, np.integer):
+      # Integer samples are already in PCM units, scaled down from wider formats
+      mask[:, i] /= PCM_SCALE * 256 ** (stem.dtype.itemsize - 2)
+  
+  channels = max(stem.shape[1] for stem in stems)
+  total_samples = max(mix_lengths([len(stem) for stem in stems], mixes, stem_names))
+  block = np.empty((len(stems), block_size, channels), dtype=np.float32)
+  for start in range(0, total_samples, block_size):
+    check_cancelled()
+    count = min(block_size, total_samples - start)
+    for i, stem in enumerate(stems):
+      part = stem[start:start + count]
+      # Mono stems are spread to every channel
+      block[i, :len(part)] = part
+      block[i, len(part):count] = 0.0
+      drop_mapped_pages(stem, start, start + len(part))
+    
+    # (mixes, stems) x (stems, block * channels) -> (mixes, block * channels)
+    mixed = mask @ block[:, :count].reshape(len(stems), -1)
+    np.rint(mixed, out=mixed)
+    np.clip(mixed, -PCM_SCALE, PCM_SCALE - 1, out=mixed)
+    yield mixed.astype('<i2').reshape(len(mixes), count, channels)
+
+
+# Path of a mix output: <output_folder>/<MIX>/<song_name>.<ext>
+def output_path(output_folder, mix, song_name, output_format=DEFAULT_OUTPUT_FORMAT):
+  return os.path.join(output_folder, mix, f"{song_name}{OUTPUT_FORMATS[output_format][0]}")
+
+
+# FFmpeg arguments that encode one output in the given format and bitrate
+def encoder_args(output_format=DEFAULT_OUTPUT_FORMAT, bitrate=DEFAULT_BITRATE):
+  _, muxer, args = OUTPUT_FORMATS[output_format]
+  if output_format not in LOSSLESS_FORMATS:
+    args = args + ['-b:a', bitrate]
+  return args + ['-f', muxer]
+
+
+# FFmpeg command that reads len(output_files) interleaved PCM streams of the given channel
+# count from stdin and encodes each one to the partial path of its output file.
+# lengths, if given, cuts the silence padding of streams shorter than the longest one.
+def export_command(output_files, sample_rate, channels, lengths=None, output_format=DEFAULT_OUTPUT_FORMAT,
+                   bitrate=DEFAULT_BITRATE, ffmpeg_path=None):
+  layout = 'mono' if channels == 1 else 'stereo'
+  filters = []
+  outputs = []
+  for i, output_file in enumerate(output_files):
+    # Pick this output's channels out of the interleaved input
+    picked = '|'.join(f"c{c}=c{i * channels + c}" for c in range(channels))
+    trim = f",atrim=end_sample={lengths[i]}" if lengths is not None else ''
+    filters.append(f"[0:a]pan={layout}|{picked}{trim}[m{i}]")
+    outputs += ['-map', f"[m{i}]"] + encoder_args(output_format, bitrate) + [partial_path(output_file)]
+  
+  return [
+    ffmpeg_path or AudioSegment.converter, '-v', 'error', '-y',
+    '-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels * len(output_files)), '-i', '-',
+    '-filter_complex', ';'.join(filters)
+  ] + outputs
+
+
+# Interleave int16 waveforms of shape (samples, channels) into one (samples, waveforms * channels)
+# block, shorter waveforms are padded with silence
+def interleave_pcm(waveforms, channels, start=0, count=None):
+  if count is None:
+    count = max(len(waveform) for waveform in waveforms) - start
+  block = np.zeros((count, channels * len(waveforms)), dtype='<i2')
+  for i, waveform in enumerate(waveforms):
+    part = waveform[start:start + count]
+    block[:len(part), i * channels:(i + 1) * channels] = part
+  return block
+
+
+# Export each mix to <output_folder>/<MIX>/<song_name>.<ext> with a single FFmpeg process.
+# The mixes are interleaved into one multichannel PCM stream on FFmpeg's stdin and the
+# filter graph splits it back into one stream per output file, so all outputs are encoded
+# in one pass without temporary files or one encoder process per mix
+def export_mixes(mixes, sample_rate, song_name, output_folder, output_format=DEFAULT_OUTPUT_FORMAT,
+                 bitrate=DEFAULT_BITRATE, ffmpeg_path=None):
+  pcm = [to_pcm16(waveform) for waveform in mixes.values()]
+  channels = pcm[0].shape[1]
+  total_samples = max(len(waveform) for waveform in pcm)
+  output_files = [output_path(output_folder, mix, song_name, output_format) for mix in mixes]
+  for output_file in output_files:
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+  
+  cmd = export_command(output_files, sample_rate, channels, [len(waveform) for waveform in pcm],
+                       output_format, bitrate, ffmpeg_path)
+  blocks = (interleave_pcm(pcm, channels, start, min(EXPORT_BLOCK_SIZE, total_samples - start))
+            for start in range(0, total_samples, EXPORT_BLOCK_SIZE))
+  run_export(cmd, blocks, output_files, song_name)
+
+
+# Full int16 mixes built with iter_mix_blocks, for code that needs them as a whole (e.g. pitch
+# shifting of the mixes). Returns {mix: array of shape (samples, channels)} like mix_stem_array.
+def mix_stem_list(stems, mixes, headroom_db=0.0, stem_names=STEM_NAMES):
+  lengths = mix_lengths([len(stem) for stem in stems], mixes, stem_names)
+  channels = max(stem.shape[1] for stem in stems)
+  pcm = np.empty((len(mixes), max(lengths), channels), dtype='<i2')
+  start = 0
+  for block in iter_mix_blocks(stems, mixes, headroom_db, stem_names=stem_names):
+    pcm[:, start:start + block.shape[1]] = block
+    start += block.shape[1]
+  return {mix: pcm[i, :lengths[i]] for i, mix in enumerate(mixes)}
+
+
+# Mix and encode in one pass: each block of mixes goes straight from iter_mix_blocks to the
+# encoder, so neither the stacked stems nor the finished mixes are ever held in memory and
+# peak memory doesn't grow with the length of the song. stems as for iter_mix_blocks.
+def export_stem_mixes(stems, mixes, sample_rate, song_name, output_folder, output_format=DEFAULT_OUTPUT_FORMAT,
+                      bitrate=DEFAULT_BITRATE, ffmpeg_path=None, headroom_db=0.0, stem_names=STEM_NAMES):
+  channels = max(stem.shape[1] for stem in stems)
+  output_files = [output_path(output_folder, mix, song_name, output_format) for mix in mixes]
+  for output_file in output_files:
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+  
+  lengths = mix_lengths([len(stem) for stem in stems], mixes, stem_names)
+  cmd = export_command(output_files, sample_rate, channels, lengths, output_format, bitrate, ffmpeg_path)
+  total_samples = max(lengths)
+  
+  # Progress is reported as blocks are handed to the encoder
+  def blocks():
+    done = 0
+    for block in iter_mix_blocks(stems, mixes, headroom_db, EXPORT_BLOCK_SIZE, stem_names):
+      # (mixes, block, channels) -> interleaved (block, mixes * channels)
+      yield block.transpose(1, 0, 2).reshape(block.shape[1], -1)
+      done += block.shape[1]
+      report_progress(done / total_samples)
+  
+  run_export(cmd, blocks(), output_files, song_name)
+
+
+# Feed interleaved int16 blocks to an export_command process, then move the outputs to their
+# final names. On failure the partial outputs are removed and RuntimeError is raised.
+def run_export(cmd, blocks, output_files, song_name):
+  process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+  try:
+    for block in blocks:
+      process.stdin.write(np.ascontiguousarray(block).tobytes())
+    process.stdin.close()
+  except BrokenPipeError:
+    # FFmpeg exited early, its error message is reported below
+    pass
+  except BaseException:
+    process.kill()
+    process.wait()
+    remove_partials(output_files)
+    raise
+  stderr = process.stderr.read().decode(errors='replace')
+  process.stderr.close()
+  
+  if process.wait() != 0:
+    remove_partials(output_files)
+    raise RuntimeError(f"FFmpeg export of {song_name} failed: {stderr.strip()}")
+  for output_file in output_files:
+    commit_output(output_file)
+
+
+# Remove the partial outputs of a failed export
+def remove_partials(output_files):
+  for output_file in output_files:
+    if os.path.exists(partial_path(output_file)):
+      os.remove(partial_path(output_file))
+
+
+# Temporary name of an output file while it is being written (same folder, same extension)
+def partial_path(path):
+  root, ext = os.path.splitext(path)
+  return f"{root}{PARTIAL_TAG}{ext}"
+
+
+# Atomically move a completely written output from its temporary name to its final name
+def commit_output(path):
+  os.replace(partial_path(path), path)
+
+
+# Convert an AudioSegment to a float32 array of shape (samples, channels) in [-1, 1]
+def segment_to_array(segment):
+  dtype = {1: np.int8, 2: '<i2', 4: '<i4'}[segment.sample_width]
+  samples = np.frombuffer(segment.raw_data, dtype=dtype).reshape(-1, segment.channels)
+  return samples.astype(np.float32) / (PCM_SCALE * 256 ** (segment.sample_width - 2))
+
+
+# Convert a float waveform in [-1, 1] to 16-bit PCM samples, 16-bit input is returned as is
+def to_pcm16(waveform):
+  if waveform.dtype == np.int16:
+    return waveform
+  return np.clip(np.rint(waveform * PCM_SCALE), -PCM_SCALE, PCM_SCALE - 1).astype('<i2')
+
+
+# Convert a float (or already 16-bit) waveform of shape (samples, channels) to a 16-bit AudioSegment
+def array_to_segment(waveform, sample_rate):
+  pcm = to_pcm16(waveform)
+  return AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=pcm.shape[1])
+
+
+# Write a float (or 16-bit) waveform of shape (samples, channels) as a 16-bit PCM WAV file
+def write_wav(path, waveform, sample_rate):
+  pcm = to_pcm16(waveform)
+  with wave.open(path, 'wb') as wav_file:
+    wav_file.setnchannels(pcm.shape[1])
+    wav_file.setsampwidth(2)
+    wav_file.setframerate(sample_rate)
+    wav_file.writeframes(np.ascontiguousarray(pcm).tobytes())
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Staged processing pipeline for batches of songs.
+
+Each song goes through decode -> separate -> pitch -> mix -> export. Every
+stage runs in its own thread and stages are connected by bounded queues, so
+song N+1 can be decoded and separated while song N is being pitch shifted
+or encoded. Queue depths and per-stage timings are recorded for sizing.
+"""
+
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from extract_bass import move_to_done, record_stage
+from audio_buffer import stem_buffers
+from metrics import measure_stage
+from mix_wavs import (DEFAULT_BITRATE, DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS, export_mixes, mix_stem_list,
+                      plan_separation, requested_mixes)
+from separator_engine import get_engine
+
+# Import pitch shifting functionality
+try:
+    from pitch_shifter import calculate_pitch_shift, export_mixes_with_pitch_shift, shift_pitch_buffer, validate_note
+    PITCH_SHIFT_AVAILABLE = True
+except ImportError:
+    PITCH_SHIFT_AVAILABLE = False
+
+# Stage names, in processing order
+STAGES = ('decode', 'separate', 'pitch', 'mix', 'export')
+
+# Default number of songs that may wait between two stages
+DEFAULT_QUEUE_DEPTH = 2
+
+logger = logging.getLogger(__name__)
+
+
+class SongJob:
+    """State of one song travelling through the pipeline."""
+    
+    def __init__(self, input_file):
+        self.input_file = input_file
+        self.name = Path(input_file).stem
+        self.sample_rate = None
+        self.buffer = None
+        self.stems = None
+        self.mixes = None
+        self.cache_key = None
+        self.error = None
+        self.timings = {}
+
+
+class StageStats:
+    """Timing and queue statistics for one pipeline stage."""
+    
+    def __init__(self, name):
+        self.name = name
+        self.jobs = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.max_time = 0.0
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+    
+    def record(self, busy, wait, queue_depth):
+        with self._lock:
+            self.jobs += 1
+            self.busy_time += busy
+            self.wait_time += wait
+            self.max_time = max(self.max_time, busy)
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+    
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'jobs': self.jobs,
+            'busy_time': self.busy_time,
+            'avg_time': self.busy_time / self.jobs if self.jobs else 0.0,
+            'max_time': self.max_time,
+            'wait_time': self.wait_time,
+            'max_queue_depth': self.max_queue_depth,
+        }
+
+
+class Pipeline:
+    """
+    Threaded pipeline with one worker thread per stage and bounded queues in between.
+    
+    Usage:
+        pipeline = Pipeline(output_folder, options)
+        pipeline.start()
+        for file_path in files:
+            pipeline.submit(file_path)
+        successful, failed = pipeline.close()
+    """
+    
+    def __init__(self, output_folder, options=None, engine=None, queue_depth=DEFAULT_QUEUE_DEPTH):
+        """
+        Args:
+            output_folder (str): Path to output folder
+            options (dict, optional): novocals, nodrums, noother, bassonly, nocleanup,
+                input_pitch, output_pitch, pitch_mixes, pitch_backend, ffmpeg_path, stem_cache,
+                journal and metrics, as for extract_bass_from_file
+            engine (SeparatorEngine, optional): Separator engine, defaults to the process-wide one
+            queue_depth (int): Maximum number of songs waiting in front of each stage
+        """
+        self.output_folder = output_folder
+        self.options = dict(options or {})
+        # Planned from the requested outputs: the cheapest model that produces them, and
+        # only the stems they use go through the pitch and mix stages
+        self.mixes = requested_mixes(self.options.get('novocals', False), self.options.get('nodrums', False),
+                                     self.options.get('noother', False), self.options.get('bassonly', False))
+        model, self.stem_names = plan_separation(self.mixes)
+        self.engine = engine if engine is not None and engine.model == model else get_engine(model)
+        self.queue_depth = queue_depth
+        
+        # queues[i] feeds stage i, the last queue collects finished jobs
+        self.queues = [queue.Queue(maxsize=queue_depth) for _ in STAGES]
+        self.queues.append(queue.Queue())
+        self.stats = {name: StageStats(name) for name in STAGES}
+        self.successful_files = []
+        self.failed_files = []
+        self._threads = []
+        self._started = None
+        self._elapsed = 0.0
+        
+        input_pitch = self.options.get('input_pitch')
+        output_pitch = self.options.get('output_pitch')
+        self.pitch_shift = bool(input_pitch and output_pitch and PITCH_SHIFT_AVAILABLE)
+        # With pitch_mixes, the export stage shifts the finished mixes instead of the stems
+        self.shift_mixes = self.pitch_shift and bool(self.options.get('pitch_mixes'))
+        self.pitch_backend = self.options.get('pitch_backend', 'auto')
+        self.journal = self.options.get('journal')
+        self.metrics = self.options.get('metrics')
+        self.output_format = self.options.get('output_format', DEFAULT_OUTPUT_FORMAT)
+        self.bitrate = self.options.get('bitrate', DEFAULT_BITRATE)
+    
+    def start(self):
+        """Start one thread per stage and the result collector."""
+        self._started = time.perf_counter()
+        handlers = (self._decode, self._separate, self._pitch, self._mix, self._export)
+        for index, (name, handler) in enumerate(zip(STAGES, handlers)):
+            thread = threading.Thread(target=self._run_stage, args=(index, name, handler),
+                                      name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        
+        collector = threading.Thread(target=self._collect, name="pipeline-results", daemon=True)
+        collector.start()
+        self._threads.append(collector)
+        return self
+    
+    def submit(self, input_file):
+        """Queue a file for processing, blocks while the decode queue is full."""
+        self.queues[0].put(SongJob(input_file))
+    
+    def close(self):
+        """
+        Wait for all submitted songs to finish and stop the stage threads.
+        
+        Returns:
+            tuple: (successful_files, failed_files) lists of file paths
+        """
+        self.queues[0].put(None)
+        for thread in self._threads:
+            thread.join()
+        self._elapsed = time.perf_counter() - self._started
+        return self.successful_files, self.failed_files
+    
+    def run(self, files):
+        """
+        Process a list of files through the pipeline.
+        
+        Returns:
+            tuple: (successful_files, failed_files) lists of file paths
+        """
+        self.start()
+        for file_path in files:
+            self.submit(file_path)
+        return self.close()
+    
+    def queue_depths(self):
+        """Current number of songs waiting in front of each stage."""
+        return {name: self.queues[index].qsize() for index, name in enumerate(STAGES)}
+    
+    def report(self):
+        """Per-stage statistics plus total wall time."""
+        return {
+            'elapsed': self._elapsed,
+            'queue_depth': self.queue_depth,
+            'stages': [self.stats[name].as_dict() for name in STAGES],
+        }
+    
+    def format_report(self):
+        """Human readable per-stage statistics."""
+        report = self.report()
+        lines = [f"Pipeline wall time: {report['elapsed']:.2f}s (queue depth {report['queue_depth']})"]
+        for stage in report['stages']:
+            utilization = stage['busy_time'] / report['elapsed'] * 100 if report['elapsed'] else 0.0
+            lines.append(
+                f"  {stage['stage']:<9} jobs={stage['jobs']:<4} avg={stage['avg_time']:.2f}s "
+                f"max={stage['max_time']:.2f}s busy={utilization:.0f}% "
+                f"waiting={stage['wait_time']:.2f}s max_queue={stage['max_queue_depth']}"
+            )
+        return '\n'.join(lines)
+    
+    def _run_stage(self, index, name, handler):
+        """Take jobs from the stage's input queue, process them and pass them on."""
+        in_queue = self.queues[index]
+        out_queue = self.queues[index + 1]
+        stats = self.stats[name]
+        
+        while True:
+            wait_start = time.perf_counter()
+            queue_depth = in_queue.qsize()
+            job = in_queue.get()
+            if job is None:
+                out_queue.put(None)
+                break
+            
+            start = time.perf_counter()
+            if job.error is None:
+                try:
+                    # Stages run concurrently, so CPU time and I/O are measured per thread
+                    with measure_stage(self.metrics, job.input_file, name, per_thread=True):
+                        handler(job)
+                except Exception as e:
+                    job.error = f"{name} failed: {str(e)}"
+                    logger.error(f"Failed to process {job.input_file}: {job.error}")
+                    print(f"Error: {job.input_file}: {job.error}")
+            busy = time.perf_counter() - start
+            job.timings[name] = busy
+            stats.record(busy, start - wait_start, queue_depth)
+            
+            # Blocks while the next stage is busy and its queue is full
+            out_queue.put(job)
+    
+    def _collect(self):
+        """Gather finished jobs from the last queue."""
+        while True:
+            job = self.queues[-1].get()
+            if job is None:
+                break
+            if job.error is None:
+                self.successful_files.append(job.input_file)
+            else:
+                self.failed_files.append(job.input_file)
+    
+    def _decode(self, job):
+        job.sample_rate = self.engine.sample_rate
+        
+        # Cached stems skip both decoding and separation
+        stem_cache = self.options.get('stem_cache')
+        if stem_cache is not None:
+            try:
+                job.cache_key = stem_cache.key(job.input_file, self.engine.model)
+                cached = stem_cache.get(job.input_file, self.engine.model, job.cache_key)
+            except Exception as e:
+                logger.warning(f"Stem cache lookup failed for {job.input_file}: {str(e)}")
+                cached = None
+            if cached and cached[1] == job.sample_rate:
+                job.stems = stem_buffers(cached[0], job.sample_rate)
+                record_stage(self.journal, job.input_file, 'separated')
+                return
+        
+        logger.info(f"Decoding: {job.input_file}")
+        job.buffer = self.engine.load_buffer(job.input_file, self.options.get('ffmpeg_path'),
+                                             memmap_folder="bass_extractor_temp")
+    
+    def _separate(self, job):
+        if job.stems is None:
+            logger.info(f"Running Spleeter separation: {job.input_file}")
+            try:
+                job.stems = self.engine.separate_buffer(job.buffer)
+            finally:
+                # Also removes the memory-mapped file of a large input
+                job.buffer.release()
+                job.buffer = None
+            
+            stem_cache = self.options.get('stem_cache')
+            if stem_cache is not None:
+                # A failed cache write doesn't fail the song, the stems are still used
+                try:
+                    stem_cache.put(job.input_file, self.engine.model,
+                                   {name: stem.data for name, stem in job.stems.items()}, job.sample_rate, job.cache_key)
+                except Exception as e:
+                    logger.warning(f"Failed to cache stems for {job.input_file}: {str(e)}")
+            record_stage(self.journal, job.input_file, 'separated')
+        
+        # Stems that no output uses are dropped right away
+        job.stems = {name: job.stems[name] for name in self.stem_names}
+    
+    def _validate_pitch(self):
+        input_pitch = self.options['input_pitch']
+        output_pitch = self.options['output_pitch']
+        if not validate_note(input_pitch) or not validate_note(output_pitch):
+            raise ValueError(f"Invalid pitch notes: {input_pitch} or {output_pitch}")
+        return input_pitch, output_pitch
+    
+    def _pitch(self, job):
+        if not self.pitch_shift or self.shift_mixes:
+            return
+        
+        input_pitch, output_pitch = self._validate_pitch()
+        
+        # Every backend works on the decoded buffers, no temporary stem files
+        logger.info(f"Applying pitch shift from {input_pitch} to {output_pitch}: {job.input_file}")
+        pitch_ratio = calculate_pitch_shift(input_pitch, output_pitch)
+        job.stems = {name: shift_pitch_buffer(stem, pitch_ratio, self.pitch_backend, self.options.get('ffmpeg_path'))
+                     for name, stem in job.stems.items()}
+        record_stage(self.journal, job.input_file, 'pitched')
+    
+    def _mix(self, job):
+        stems = [job.stems[name].data for name in self.stem_names]
+        job.stems = None
+        # Block by block from the stem buffers, without stacking them into one more copy
+        job.mixes = mix_stem_list(stems, self.mixes, stem_names=self.stem_names)
+        record_stage(self.journal, job.input_file, 'mixed')
+    
+    def _export(self, job):
+        if self.shift_mixes:
+            input_pitch, output_pitch = self._validate_pitch()
+            logger.info(f"Applying pitch shift from {input_pitch} to {output_pitch} to the mixes: {job.input_file}")
+            temp_folder = os.path.join("bass_extractor_temp", job.name)
+            try:
+                if not export_mixes_with_pitch_shift(job.mixes, job.sample_rate, job.name, self.output_folder,
+                                                     temp_folder, input_pitch, output_pitch,
+                                                     self.options.get('ffmpeg_path'), self.pitch_backend,
+                                                     self.output_format, self.bitrate):
+                    raise RuntimeError("Failed to pitch-shift the mixes")
+            finally:
+                if not self.options.get('nocleanup'):
+                    shutil.rmtree(temp_folder, ignore_errors=True)
+        else:
+            export_mixes(job.mixes, job.sample_rate, job.name, self.output_folder, self.output_format, self.bitrate,
+                         self.options.get('ffmpeg_path'))
+        record_stage(self.journal, job.input_file, 'exported')
+        print(f"Completed: {job.input_file}")
+        for mix in job.mixes:
+            print(f"  - {job.name}{OUTPUT_FORMATS[self.output_format][0]} created in {self.output_folder}/{mix}/")
+        job.mixes = None
+        if move_to_done(job.input_file, self.output_folder):
+            record_stage(self.journal, job.input_file, 'moved')
+
+
+def run_pipeline(files, output_folder, options=None, queue_depth=DEFAULT_QUEUE_DEPTH, engine=None):
+    """
+    Process files through a staged pipeline and print per-stage statistics.
+    
+    Args:
+        files (list): Paths to input audio files
+        output_folder (str): Path to output folder
+        options (dict, optional): Processing options, see Pipeline
+        queue_depth (int): Maximum number of songs waiting in front of each stage
+        engine (SeparatorEngine, optional): Separator engine to use
+    
+    Returns:
+        tuple: (successful_files, failed_files) lists of file paths
+    """
+    pipeline = Pipeline(output_folder, options, engine, queue_depth)
+    try:
+        with measure_stage(pipeline.metrics, None, 'model_init'):
+            pipeline.engine.warm_up()
+    except Exception as e:
+        logger.error(f"Failed to warm up Spleeter separator: {str(e)}")
+    successful_files, failed_files = pipeline.run(files)
+    logger.info(pipeline.format_report())
+    return successful_files, failed_files
@@ -5,12 +5,21 @@ Supports shifting by musical notes (C, D, E, F, G, A, B).
 Preserves original tempo while changing pitch.
 """
 
+import importlib.util
 import os
 import subprocess
-import tempfile
+from fractions import Fraction
 from pathlib import Path
+
+import numpy as np
 from pydub import AudioSegment
 
+from cancellation import run_process
+
+# Polyphase resampling for the in-process pitch shifter (optional). scipy.signal takes about
+# a second to import, so it is only imported when a stem is actually resampled
+SCIPY_AVAILABLE = importlib.util.find_spec('scipy') is not None
+
 
 # Musical note frequencies (A4 = 440Hz)
 NOTE_FREQUENCIES = {
@@ -31,6 +40,16 @@ NOTE_FREQUENCIES = {
 # Note names for display
 NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
+# Pitch shifting backends: 'numpy' runs in process, 'ffmpeg' uses rubberband
+# (or asetrate/atempo), 'pydub' is the last resort. 'auto' tries them in that order.
+# 'pydub' only replaces the resampling of 'numpy' by pydub's and restores the tempo
+# with the same phase vocoder, so it is a variant of 'numpy', not an independent fallback.
+PITCH_BACKENDS = ('auto', 'numpy', 'ffmpeg', 'pydub')
+
+# STFT frame size and hop of the phase vocoder
+VOCODER_FFT_SIZE = 2048
+VOCODER_HOP = VOCODER_FFT_SIZE // 4
+
 
 def detect_key(audio_file):
     """
@@ -88,6 +107,158 @@ def calculate_pitch_shift(from_note, to_note):
     return to_freq / from_freq
 
 
+def _stft(waveform, fft_size=VOCODER_FFT_SIZE, hop=VOCODER_HOP):
+    """Short-time Fourier transform of a (samples, channels) array, returns (frames, channels, bins)."""
+    window = np.hanning(fft_size + 1)[:-1].astype(np.float32)
+    padded = np.pad(waveform, ((fft_size // 2, fft_size // 2 + hop), (0, 0)))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, fft_size, axis=0)[::hop]
+    return np.fft.rfft(frames * window, axis=-1)
+
+
+def _istft(spectrum, length, fft_size=VOCODER_FFT_SIZE, hop=VOCODER_HOP):
+    """Inverse of _stft by weighted overlap-add, returns (length, channels)."""
+    window = np.hanning(fft_size + 1)[:-1].astype(np.float32)
+    n_frames, channels = spectrum.shape[:2]
+    overlap = fft_size // hop
+    frames = (np.fft.irfft(spectrum, n=fft_size, axis=-1) * window).astype(np.float32)
+    
+    # Overlap-add: each frame covers `overlap` consecutive hops
+    segments = frames.reshape(n_frames, channels, overlap, hop)
+    output = np.zeros((n_frames + overlap - 1, channels, hop), dtype=np.float32)
+    norm = np.zeros((n_frames + overlap - 1, 1, hop), dtype=np.float32)
+    window_sq = (window ** 2).reshape(overlap, hop)
+    for i in range(overlap):
+        output[i:i + n_frames] += segments[:, :, i]
+        norm[i:i + n_frames] += window_sq[i]
+    output /= np.maximum(norm, 1e-8)
+    
+    output = output.transpose(0, 2, 1).reshape(-1, channels)
+    return output[fft_size // 2:fft_size // 2 + length]
+
+
+def time_stretch_array(waveform, rate, fft_size=VOCODER_FFT_SIZE, hop=VOCODER_HOP):
+    """
+    Change the duration of a waveform without changing its pitch (phase vocoder).
+    
+    Args:
+        waveform (numpy.ndarray): float array of shape (samples, channels)
+        rate (float): Playback rate, > 1.0 makes the audio shorter, < 1.0 longer
+        fft_size (int): STFT frame size
+        hop (int): STFT hop size, fft_size must be a multiple of it
+        
+    Returns:
+        numpy.ndarray: float32 array of shape (round(samples / rate), channels)
+    """
+    spectrum = _stft(waveform.astype(np.float32), fft_size, hop)
+    n_frames = spectrum.shape[0]
+    
+    # Fractional analysis positions for every output frame
+    steps = np.arange(0, n_frames - 1, rate)
+    index = steps.astype(np.int64)
+    frac = (steps - index)[:, None, None]
+    
+    magnitude = np.abs(spectrum)
+    phase = np.angle(spectrum)
+    out_magnitude = (1.0 - frac) * magnitude[index] + frac * magnitude[index + 1]
+    
+    # Expected phase advance per hop for each bin, plus the wrapped deviation
+    # measured between neighbouring analysis frames (instantaneous frequency)
+    omega = 2 * np.pi * hop * np.arange(spectrum.shape[-1]) / fft_size
+    deviation = phase[index + 1] - phase[index] - omega
+    deviation -= 2 * np.pi * np.round(deviation / (2 * np.pi))
+    advance = omega + deviation
+    
+    # Accumulate the synthesis phase starting from the first analysis frame
+    out_phase = np.empty_like(advance)
+    out_phase[0] = phase[0]
+    np.cumsum(advance[:-1], axis=0, out=out_phase[1:])
+    out_phase[1:] += phase[0]
+    
+    stretched = _istft(out_magnitude * np.exp(1j * out_phase), int(round(len(waveform) / rate)), fft_size, hop)
+    return stretched
+
+
+def resample_array(waveform, length):
+    """
+    Resample a waveform to a given number of samples.
+    Uses polyphase filtering when SciPy is available, linear interpolation otherwise.
+    
+    Args:
+        waveform (numpy.ndarray): float array of shape (samples, channels)
+        length (int): Number of output samples
+        
+    Returns:
+        numpy.ndarray: float32 array of shape (length, channels)
+    """
+    if len(waveform) == length:
+        return waveform.astype(np.float32)
+    
+    if SCIPY_AVAILABLE:
+        from scipy.signal import resample_poly
+        ratio = Fraction(length, len(waveform)).limit_denominator(1000)
+        resampled = resample_poly(waveform, ratio.numerator, ratio.denominator, axis=0)
+        if len(resampled) < length:
+            resampled = np.pad(resampled, ((0, length - len(resampled)), (0, 0)))
+        return resampled[:length].astype(np.float32)
+    
+    positions = np.linspace(0, len(waveform) - 1, length)
+    return np.stack([np.interp(positions, np.arange(len(waveform)), channel)
+                     for channel in waveform.T], axis=1).astype(np.float32)
+
+
+def shift_pitch_array(waveform, pitch_ratio):
+    """
+    Shift the pitch of a waveform in process while preserving its tempo.
+    
+    The audio is first stretched by pitch_ratio with a phase vocoder, then
+    resampled back to its original length. Formants move with the pitch, as
+    with FFmpeg's rubberband filter defaults.
+    
+    Args:
+        waveform (numpy.ndarray): float array of shape (samples, channels)
+        pitch_ratio (float): Pitch shift ratio (1.0 = no change)
+        
+    Returns:
+        numpy.ndarray: float32 array with the same shape as waveform
+    """
+    if pitch_ratio == 1.0 or len(waveform) == 0:
+        return waveform.astype(np.float32)
+    
+    stretched = time_stretch_array(waveform, 1.0 / pitch_ratio)
+    return resample_array(stretched, len(waveform))
+
+
+def shift_pitch_numpy(input_file, output_file, pitch_ratio):
+    """
+    Shift the pitch of an audio file in process with the NumPy phase vocoder.
+    The output format is taken from the output file extension.
+    
+    Args:
+        input_file (str): Path to input audio file
+        output_file (str): Path to output audio file
+        pitch_ratio (float): Pitch shift ratio (1.0 = no change)
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        from mix_wavs import array_to_segment, load_stems, write_wav
+        
+        stems, lengths, sample_rate = load_stems([input_file])
+        shifted = shift_pitch_array(stems[0, :lengths[0]], pitch_ratio)
+        
+        output_format = Path(output_file).suffix.lstrip('.').lower() or 'wav'
+        if output_format == 'wav':
+            write_wav(output_file, shifted, sample_rate)
+        else:
+            array_to_segment(shifted, sample_rate).export(output_file, format=output_format)
+        return True
+        
+    except Exception as e:
+        print(f"Error shifting pitch with NumPy: {e}")
+        return False
+
+
 def shift_pitch_ffmpeg(input_file, output_file, pitch_ratio, ffmpeg_path=None):
     """
     Shift the pitch of an audio file using FFmpeg while preserving tempo.
@@ -102,12 +273,6 @@ def shift_pitch_ffmpeg(input_file, output_file, pitch_ratio, ffmpeg_path=None):
         bool: True if successful, False otherwise
     """
     try:
-        # Calculate the semitone shift
-        # pitch_ratio = 2^(semitones/12)
-        # semitones = 12 * log2(pitch_ratio)
-        import math
-        semitones = 12 * math.log2(pitch_ratio)
-        
         # Build FFmpeg command using rubberband filter for high-quality pitch shifting
         # that preserves tempo
         ffmpeg_cmd = 'ffmpeg'
@@ -115,14 +280,15 @@ def shift_pitch_ffmpeg(input_file, output_file, pitch_ratio, ffmpeg_path=None):
             ffmpeg_cmd = ffmpeg_path
         
         # Try rubberband filter first (best quality, preserves tempo)
+        # Note: rubberband's pitch option is a frequency ratio, not semitones
         cmd_rubberband = [
             ffmpeg_cmd, '-i', input_file,
-            '-af', f'rubberband=pitch={semitones}',
+            '-af', f'rubberband=pitch={pitch_ratio}',
             '-y', output_file
         ]
         
         # Run FFmpeg with rubberband
-        result = subprocess.run(cmd_rubberband, capture_output=True, text=True, timeout=300)
+        result = run_process(cmd_rubberband, text=True, timeout=300)
         
         if result.returncode == 0:
             return True
@@ -138,7 +304,7 @@ def shift_pitch_ffmpeg(input_file, output_file, pitch_ratio, ffmpeg_path=None):
             '-y', output_file
         ]
         
-        result = subprocess.run(cmd_alternative, capture_output=True, text=True, timeout=300)
+        result = run_process(cmd_alternative, text=True, timeout=300)
         
         if result.returncode != 0:
             print(f"FFmpeg error: {result.stderr}")
@@ -151,6 +317,137 @@ def shift_pitch_ffmpeg(input_file, output_file, pitch_ratio, ffmpeg_path=None):
         return False
 
 
+def shift_pitch_ffmpeg_multi(input_files, output_files, pitch_ratio, ffmpeg_path=None, sample_rate=44100, output_args=None):
+    """
+    Shift the pitch of several audio files with a single FFmpeg invocation.
+    
+    All inputs go through one filtergraph with one pitch shift chain and one
+    output per input, so a single process is started for all files.
+    
+    Args:
+        input_files (list): Paths to input audio files
+        output_files (list): Paths to output audio files, one per input file
+        pitch_ratio (float): Pitch shift ratio (1.0 = no change)
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        sample_rate (int): Sample rate of the input files, used by the fallback filter
+        output_args (list, optional): Extra FFmpeg arguments for every output (e.g., ['-b:a', '192k'])
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        ffmpeg_cmd = ffmpeg_path if ffmpeg_path else 'ffmpeg'
+        output_args = list(output_args or [])
+        
+        if pitch_ratio == 1.0:
+            filters = ['anull']
+        else:
+            # Rubberband first (best quality), then the asetrate + atempo fallback
+            filters = [
+                f'rubberband=pitch={pitch_ratio}',
+                f'asetrate={sample_rate}*{pitch_ratio},atempo=1/{pitch_ratio},aresample={sample_rate}'
+            ]
+        
+        stderr = ""
+        for audio_filter in filters:
+            cmd = [ffmpeg_cmd, '-y']
+            for input_file in input_files:
+                cmd += ['-i', input_file]
+            graph = ';'.join(f'[{i}:a]{audio_filter}[out{i}]' for i in range(len(input_files)))
+            cmd += ['-filter_complex', graph]
+            for i, output_file in enumerate(output_files):
+                cmd += ['-map', f'[out{i}]'] + output_args + [output_file]
+            
+            result = run_process(cmd, text=True, timeout=300 * len(input_files))
+            if result.returncode == 0:
+                return True
+            stderr = result.stderr
+        
+        print(f"FFmpeg error: {stderr}")
+        return False
+    
+    except Exception as e:
+        print(f"Error shifting pitch: {e}")
+        return False
+
+
+def shift_pitch_ffmpeg_array(waveform, sample_rate, pitch_ratio, ffmpeg_path=None):
+    """
+    Shift the pitch of a waveform with FFmpeg, piping raw float samples in and out.
+    
+    Args:
+        waveform (numpy.ndarray): float array of shape (samples, channels)
+        sample_rate (int): Sample rate of the waveform
+        pitch_ratio (float): Pitch shift ratio (1.0 = no change)
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+    
+    Returns:
+        numpy.ndarray: float32 array with the same shape as waveform
+    """
+    channels = waveform.shape[1]
+    data = np.ascontiguousarray(waveform, dtype='<f4').tobytes()
+    raw_args = ['-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels)]
+    
+    # Rubberband first (best quality), then the asetrate + atempo fallback
+    filters = [
+        f'rubberband=pitch={pitch_ratio}',
+        f'asetrate={sample_rate}*{pitch_ratio},atempo=1/{pitch_ratio},aresample={sample_rate}'
+    ]
+    stderr = ""
+    for audio_filter in filters:
+        cmd = [ffmpeg_path or 'ffmpeg', '-v', 'error'] + raw_args + ['-i', '-', '-af', audio_filter] + raw_args + ['-']
+        result = run_process(cmd, input=data, timeout=300)
+        if result.returncode == 0:
+            shifted = np.frombuffer(result.stdout, dtype='<f4').reshape(-1, channels)
+            # Keep the length of the input, the filters may add or drop a few samples
+            output = np.zeros_like(waveform, dtype=np.float32)
+            output[:min(len(shifted), len(output))] = shifted[:len(output)]
+            return output
+        stderr = result.stderr.decode(errors='replace')
+    raise RuntimeError(f"FFmpeg error: {stderr.strip()}")
+
+
+def shift_pitch_buffer(buffer, pitch_ratio, backend='auto', ffmpeg_path=None):
+    """
+    Shift the pitch of a decoded buffer without writing or decoding any file.
+    
+    Args:
+        buffer (AudioBuffer): Audio to shift
+        pitch_ratio (float): Pitch shift ratio (1.0 = no change)
+        backend (str): One of PITCH_BACKENDS, 'auto' tries NumPy, then FFmpeg, then pydub
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+    
+    Returns:
+        AudioBuffer: The shifted audio, same length and sample rate
+    """
+    from mix_wavs import array_to_segment, segment_to_array
+    
+    if pitch_ratio == 1.0 or len(buffer) == 0:
+        return buffer
+    
+    errors = []
+    if backend in ('auto', 'numpy'):
+        try:
+            return buffer.with_data(shift_pitch_array(buffer.data, pitch_ratio))
+        except Exception as e:
+            errors.append(f"NumPy: {e}")
+    
+    if backend in ('auto', 'ffmpeg'):
+        try:
+            return buffer.with_data(shift_pitch_ffmpeg_array(buffer.data, buffer.sample_rate, pitch_ratio, ffmpeg_path))
+        except Exception as e:
+            errors.append(f"FFmpeg: {e}")
+    
+    if backend in ('auto', 'pydub'):
+        try:
+            shifted = shift_segment_pydub(array_to_segment(buffer.data, buffer.sample_rate), pitch_ratio)
+            return buffer.with_data(segment_to_array(shifted))
+        except Exception as e:
+            errors.append(f"pydub: {e}")
+    
+    raise RuntimeError(f"Pitch shifting failed ({'; '.join(errors) or f'unknown backend {backend}'})")
+
+
 def shift_pitch_pydub(input_file, output_file, pitch_ratio):
     """
     Shift the pitch of an audio file using pydub.
@@ -167,46 +464,46 @@ def shift_pitch_pydub(input_file, output_file, pitch_ratio):
     try:
         # Load audio
         audio = AudioSegment.from_file(input_file)
+        output_format = Path(output_file).suffix.lstrip('.').lower() or 'mp3'
         
-        # For pydub, we need to use a different approach to preserve tempo
-        # We'll use speedup/slowdown with pitch compensation
-        
-        # Calculate the speed factor to compensate for pitch change
-        # This is a simplified approach - for better quality,
-        # you'd want to use more sophisticated pitch shifting algorithms
-        
-        # Method 1: Try to use speedup/slowdown with pitch compensation
-        try:
-            # Speed up the audio by the inverse of pitch ratio to compensate
-            speed_factor = 1.0 / pitch_ratio
-            shifted_audio = audio.speedup(playback_speed=speed_factor)
-            
-            # Export
-            shifted_audio.export(output_file, format='mp3')
-            return True
-            
-        except AttributeError:
-            # If speedup is not available, fall back to the old method
-            # but warn about tempo change
-            print("Warning: pydub speedup not available. Pitch shift may affect tempo.")
-            
-            # Apply pitch shift by changing the sample rate
-            new_sample_rate = int(audio.frame_rate * pitch_ratio)
-            shifted_audio = audio._spawn(audio.raw_data, overrides={'frame_rate': new_sample_rate})
-            
-            # Set the frame rate back to original
-            shifted_audio = shifted_audio.set_frame_rate(audio.frame_rate)
-            
-            # Export
-            shifted_audio.export(output_file, format='mp3')
-            return True
-        
+        # Export
+        shift_segment_pydub(audio, pitch_ratio).export(output_file, format=output_format)
+        return True
+    
     except Exception as e:
         print(f"Error shifting pitch with pydub: {e}")
         return False
 
 
-def process_audio_with_pitch_shift(input_file, output_file, from_note, to_note, ffmpeg_path=None):
+def shift_segment_pydub(audio, pitch_ratio):
+    """
+    Shift the pitch of an AudioSegment with pydub while preserving its tempo.
+    
+    The samples are played back at pitch_ratio times their frame rate (higher
+    pitch, shorter) and resampled to the original rate by pydub, then the NumPy
+    phase vocoder of shift_pitch_array stretches the result back to the original
+    length. Only the resampling differs from the 'numpy' backend.
+    
+    Args:
+        audio (AudioSegment): Audio to shift
+        pitch_ratio (float): Pitch shift ratio (1.0 = no change)
+    
+    Returns:
+        AudioSegment: The shifted audio, same length and frame rate
+    """
+    from mix_wavs import array_to_segment, segment_to_array
+    
+    frames = int(audio.frame_count())
+    if pitch_ratio == 1.0 or frames == 0:
+        return audio
+    
+    played = audio._spawn(audio.raw_data, overrides={'frame_rate': int(round(audio.frame_rate * pitch_ratio))})
+    resampled = segment_to_array(played.set_frame_rate(audio.frame_rate))
+    restored = time_stretch_array(resampled, len(resampled) / frames)
+    return array_to_segment(restored, audio.frame_rate)
+
+
+def process_audio_with_pitch_shift(input_file, output_file, from_note, to_note, ffmpeg_path=None, backend='auto'):
     """
     Process an audio file with pitch shifting from one note to another.
     This function preserves the original tempo while changing the pitch.
@@ -217,6 +514,8 @@ def process_audio_with_pitch_shift(input_file, output_file, from_note, to_note,
         from_note (str): Source note (e.g., 'C', 'D', etc.)
         to_note (str): Target note (e.g., 'C', 'D', etc.)
         ffmpeg_path (str, optional): Path to FFmpeg executable
+        backend (str): One of PITCH_BACKENDS, 'auto' tries the in-process NumPy
+            shifter first, then FFmpeg, then pydub
         
     Returns:
         bool: True if successful, False otherwise
@@ -234,15 +533,122 @@ def process_audio_with_pitch_shift(input_file, output_file, from_note, to_note,
             print(f"Error copying file: {e}")
             return False
     
-    # Try FFmpeg first (better quality)
-    if shift_pitch_ffmpeg(input_file, output_file, pitch_ratio, ffmpeg_path):
-        return True
+    # In process first, no subprocess and no extra decode
+    if backend in ('auto', 'numpy'):
+        if shift_pitch_numpy(input_file, output_file, pitch_ratio):
+            return True
+        if backend == 'numpy':
+            return False
+    
+    # Then FFmpeg (rubberband)
+    if backend in ('auto', 'ffmpeg'):
+        if shift_pitch_ffmpeg(input_file, output_file, pitch_ratio, ffmpeg_path):
+            return True
+        if backend == 'ffmpeg':
+            return False
     
     # Fallback to pydub
     print("FFmpeg not available, using pydub fallback...")
     return shift_pitch_pydub(input_file, output_file, pitch_ratio)
 
 
+def process_audio_files_with_pitch_shift(input_files, output_files, from_note, to_note, ffmpeg_path=None, output_args=None, backend='auto'):
+    """
+    Pitch shift several audio files from one note to another.
+    With the 'numpy' backend the files are shifted in process, with 'ffmpeg'
+    in a single FFmpeg run; 'auto' tries both in that order and falls back
+    to shifting the files one by one.
+    
+    Args:
+        input_files (list): Paths to input audio files
+        output_files (list): Paths to output audio files, one per input file
+        from_note (str): Source note (e.g., 'C', 'D', etc.)
+        to_note (str): Target note (e.g., 'C', 'D', etc.)
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        output_args (list, optional): Extra FFmpeg arguments for every output
+        backend (str): One of PITCH_BACKENDS
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    pitch_ratio = calculate_pitch_shift(from_note, to_note)
+    
+    if backend in ('auto', 'numpy'):
+        if all(shift_pitch_numpy(input_file, output_file, pitch_ratio)
+               for input_file, output_file in zip(input_files, output_files)):
+            return True
+        if backend == 'numpy':
+            return False
+    
+    if backend in ('auto', 'ffmpeg') and shift_pitch_ffmpeg_multi(input_files, output_files, pitch_ratio, ffmpeg_path, output_args=output_args):
+        return True
+    
+    print("Single-pass pitch shift failed, shifting files one by one...")
+    return all(process_audio_with_pitch_shift(input_file, output_file, from_note, to_note, ffmpeg_path, backend)
+               for input_file, output_file in zip(input_files, output_files))
+
+
+def export_mixes_with_pitch_shift(mixes, sample_rate, song_name, output_folder, temp_folder, from_note, to_note, ffmpeg_path=None, backend='auto', output_format='mp3', bitrate='192k'):
+    """
+    Pitch shift finished mixes and encode them (as MP3 files by default).
+    
+    Mixing is linear, so shifting only the exported mixes gives practically
+    the same result as shifting all four stems before mixing, with one
+    pitch-shift chain per output instead of four and a single FFmpeg process.
+    With the in-process backend the mixes are shifted in memory and no
+    intermediate files are written.
+    
+    Args:
+        mixes (dict): Mix name (e.g., 'NOBASS') -> int16 array of shape (samples, channels)
+        sample_rate (int): Sample rate of the mixes
+        song_name (str): Output file name without extension
+        output_folder (str): Path to output folder, each mix goes to its own subfolder
+        temp_folder (str): Folder for the intermediate mix WAV files
+        from_note (str): Source note (e.g., 'C', 'D', etc.)
+        to_note (str): Target note (e.g., 'C', 'D', etc.)
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        backend (str): One of PITCH_BACKENDS
+        output_format (str): One of mix_wavs.OUTPUT_FORMATS
+        bitrate (str): Bitrate of lossy formats
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    from mix_wavs import PCM_SCALE, commit_output, encoder_args, export_mixes, output_path, partial_path, write_wav
+    
+    pitch_ratio = calculate_pitch_shift(from_note, to_note)
+    
+    if backend in ('auto', 'numpy'):
+        try:
+            shifted = {mix: shift_pitch_array(waveform.astype(np.float32) / PCM_SCALE, pitch_ratio)
+                       for mix, waveform in mixes.items()}
+            export_mixes(shifted, sample_rate, song_name, output_folder, output_format, bitrate, ffmpeg_path)
+            return True
+        except Exception as e:
+            print(f"Error shifting pitch with NumPy: {e}")
+            if backend == 'numpy':
+                return False
+    
+    os.makedirs(temp_folder, exist_ok=True)
+    input_files = []
+    output_files = []
+    for mix, waveform in mixes.items():
+        mix_path = os.path.join(temp_folder, f"{mix}.wav")
+        write_wav(mix_path, waveform, sample_rate)
+        output_file = output_path(output_folder, mix, song_name, output_format)
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        input_files.append(mix_path)
+        output_files.append(output_file)
+    
+    if not process_audio_files_with_pitch_shift(input_files, [partial_path(path) for path in output_files],
+                                                from_note, to_note, ffmpeg_path,
+                                                output_args=encoder_args(output_format, bitrate), backend='ffmpeg'):
+        return False
+    for path in output_files:
+        commit_output(path)
+    return True
+
+
 def get_note_names():
     """
     Get list of available note names for GUI.
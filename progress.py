@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Progress events of a batch, with ETAs from the measured throughput.
+
+The batch loop (run_batch with one worker, the GUI) makes a ProgressTracker
+the active tracker of the thread that processes the files (see
+activate_tracker) and tells it when each file starts and finishes. The
+processing code reports the stage it enters (through FileMetrics.start) and,
+within the long stages, how far it got: decoded seconds, streamed windows,
+pitch-shifted stems, exported blocks. The tracker turns these reports into
+progress events, dicts like the messages of the GUI:
+
+    {'type': 'stage_progress', 'file': 'song.mp3', 'index': 2, 'count': 10,
+     'stage': 'export', 'stage_fraction': 0.4, 'fraction': 0.93, 'batch_fraction': 0.19,
+     'audio_seconds': 72.0, 'duration': 180.0, 'throughput': 35.1,
+     'stage_eta': 3.2, 'eta': 3.4, 'batch_eta': 412.0}
+
+The cost of each stage (wall seconds per second of audio) is measured over
+the files finished so far. The rest of the current stage is estimated from
+the rate it runs at, or from its measured cost for stages that don't report
+their progress (whole-file separation); the ETA of the file adds the
+measured cost of the stages still ahead, and the batch ETA adds the files
+not started yet, whose lengths are estimated from their sizes. Estimates
+that have nothing to be based on yet are None: until the first file is
+finished, only the current stage has an ETA, and only if it reports its
+progress.
+"""
+
+import contextlib
+import os
+import re
+import subprocess
+import threading
+import time
+
+# Minimum seconds between two events within a stage, stage changes are always reported
+DEFAULT_INTERVAL = 0.5
+
+# Stage of the event sent when a file is finished
+FINISHED_STAGES = ('done', 'failed')
+
+# Seconds between two progress lines printed by ProgressPrinter
+PRINT_INTERVAL = 5.0
+
+# Input length as printed by FFmpeg, e.g. "Duration: 00:03:12.35"
+_DURATION_PATTERN = re.compile(rb'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+def probe_duration(input_file, ffmpeg_path=None):
+    """
+    Length of an audio file from its header, without decoding it.
+    
+    Args:
+        input_file (str): Path to input audio file
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+    
+    Returns:
+        float: Length in seconds, None if FFmpeg can't tell
+    """
+    try:
+        # Without an output FFmpeg only prints the input information (and exits with an error)
+        result = subprocess.run([ffmpeg_path or 'ffmpeg', '-hide_banner', '-i', input_file],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    match = _DURATION_PATTERN.search(result.stderr)
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def format_seconds(seconds):
+    """'1:02:03' or '2:03' for a number of seconds, '?' for None."""
+    if seconds is None:
+        return '?'
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_event(event):
+    """
+    One line describing a progress event.
+    
+    Returns:
+        str: e.g. "[2/10] song.mp3: export 40% (72s of 180s audio), ETA 0:03, batch ETA 6:52"
+    """
+    name = os.path.basename(event['file'])
+    text = f"[{event['index']}/{event['count']}] {name}: {event['stage']}"
+    if event['stage'] not in FINISHED_STAGES:
+        if event['stage_fraction'] is not None:
+            text += f" {event['stage_fraction'] * 100:.0f}%"
+        if event['audio_seconds'] is not None and event['duration']:
+            text += f" ({event['audio_seconds']:.0f}s of {event['duration']:.0f}s audio)"
+        if event['eta'] is not None:
+            text += f", ETA {format_seconds(event['eta'])}"
+        elif event['stage_eta'] is not None:
+            text += f", stage ETA {format_seconds(event['stage_eta'])}"
+    if event['batch_eta'] is not None and event['index'] < event['count']:
+        text += f", batch ETA {format_seconds(event['batch_eta'])}"
+    return text
+
+
+class ProgressPrinter:
+    """Progress callback for the command line: prints every finished file, other events at most every interval."""
+    
+    def __init__(self, interval=PRINT_INTERVAL):
+        self.interval = interval
+        self._last_print = None
+    
+    def __call__(self, event):
+        now = time.perf_counter()
+        if (event['stage'] not in FINISHED_STAGES and self._last_print is not None
+                and now - self._last_print < self.interval):
+            return
+        self._last_print = now
+        print(f"Progress: {format_event(event)}")
+
+
+class ProgressTracker:
+    """Turns the stage and progress reports of the processing thread into progress events."""
+    
+    def __init__(self, callback, files=(), file_count=None, ffmpeg_path=None, interval=DEFAULT_INTERVAL):
+        """
+        Args:
+            callback (callable): Called with each event, in the processing thread
+            files (sequence): Files of the batch known in advance; their sizes estimate the
+                length of the files that are not processed yet
+            file_count (int, optional): Number of files of the batch, len(files) by default
+                (more when files are added while the batch runs, e.g. downloads)
+            ffmpeg_path (str, optional): FFmpeg executable used to read the length of each file
+            interval (float): Minimum seconds between two events within a stage
+        """
+        self.callback = callback
+        self.file_count = len(files) if file_count is None else file_count
+        self.ffmpeg_path = ffmpeg_path
+        self.interval = interval
+        
+        self._sizes = {}
+        for path in files:
+            try:
+                self._sizes[path] = os.path.getsize(path)
+            except OSError:
+                pass
+        self._started = 0
+        self._started_files = set()
+        
+        # Measured over the successfully finished files: wall and audio seconds per stage and
+        # of whole files, and audio seconds per input byte
+        self._stage_totals = {}
+        self._file_wall = 0.0
+        self._file_audio = 0.0
+        self._finished_files = 0
+        self._sized_audio = 0.0
+        self._sized_bytes = 0
+        # Stage order of the last finished file, the stages ahead of the current one
+        self._stages = []
+        
+        self.input_file = None
+        self.duration = None
+        self._file_start = None
+        self._stage = None
+        self._stage_start = None
+        self._stage_fraction = None
+        self._stage_walls = []
+        self._last_event = 0.0
+    
+    def start_file(self, input_file):
+        """Start tracking a file of the batch, its length is read from its header."""
+        self._started += 1
+        self._started_files.add(input_file)
+        self.input_file = input_file
+        self.duration = probe_duration(input_file, self.ffmpeg_path)
+        if self.duration is None:
+            self.duration = self._estimate_duration(input_file)
+        self._file_start = time.perf_counter()
+        # Until the processing reports its first stage
+        self._stage = 'start'
+        self._stage_start = self._file_start
+        self._stage_fraction = None
+        self._stage_walls = []
+        self._emit(force=True)
+    
+    def stage(self, stage):
+        """The file entered a stage (the previous one is finished)."""
+        if self.input_file is None:
+            return
+        self._close_stage()
+        self._stage = stage
+        self._stage_start = time.perf_counter()
+        self._stage_fraction = None
+        self._emit(force=True)
+    
+    def progress(self, fraction):
+        """The current stage is done up to this fraction (0.0 to 1.0)."""
+        if self.input_file is None:
+            return
+        self._stage_fraction = min(max(fraction, 0.0), 1.0)
+        self._emit()
+    
+    def audio(self, seconds):
+        """The current stage processed this many seconds of the file's audio."""
+        if self.duration:
+            self.progress(seconds / self.duration)
+    
+    def finish_file(self, ok=True):
+        """
+        The file is finished; the stage costs of successful files are measured for the ETAs.
+        
+        Args:
+            ok (bool): Whether the file was processed successfully
+        """
+        if self.input_file is None:
+            return
+        self._close_stage()
+        now = time.perf_counter()
+        if ok and self.duration:
+            for stage, wall in self._stage_walls:
+                totals = self._stage_totals.setdefault(stage, [0.0, 0.0])
+                totals[0] += wall
+                totals[1] += self.duration
+            self._stages = [stage for stage, _ in self._stage_walls]
+            self._file_wall += now - self._file_start
+            self._file_audio += self.duration
+            self._finished_files += 1
+            if self.input_file in self._sizes:
+                self._sized_audio += self.duration
+                self._sized_bytes += self._sizes[self.input_file]
+        self._stage = 'done' if ok else 'failed'
+        self._stage_fraction = 1.0
+        self._emit(force=True)
+        self.input_file = None
+    
+    def _close_stage(self):
+        if self._stage is not None:
+            self._stage_walls.append((self._stage, time.perf_counter() - self._stage_start))
+            self._stage = None
+    
+    def _estimate_duration(self, input_file):
+        """Estimated length of a file: from its size, or the mean length of the finished files."""
+        if input_file in self._sizes and self._sized_bytes:
+            return self._sizes[input_file] * self._sized_audio / self._sized_bytes
+        if self._finished_files:
+            return self._file_audio / self._finished_files
+        return None
+    
+    def _stage_cost(self, stage):
+        """Measured wall seconds per second of audio of a stage, None before it was measured."""
+        wall, audio = self._stage_totals.get(stage, (0.0, 0.0))
+        return wall / audio if audio else None
+    
+    def _stage_eta(self, now):
+        """Seconds until the current stage is finished, None if unknown."""
+        elapsed = now - self._stage_start
+        if self._stage_fraction:
+            # The rate the stage runs at for this file
+            return elapsed * (1.0 - self._stage_fraction) / self._stage_fraction
+        cost = self._stage_cost(self._stage)
+        if cost is None or not self.duration:
+            return None
+        return max(cost * self.duration - elapsed, 0.0)
+    
+    def _file_eta(self, stage_eta):
+        """Seconds until the file is finished, None before a file was measured."""
+        if stage_eta is None or not self._stages:
+            return None
+        eta = stage_eta
+        done = {stage for stage, _ in self._stage_walls}
+        done.add(self._stage)
+        for stage in self._stages:
+            if stage not in done:
+                eta += self._stage_cost(stage) * self.duration
+                done.add(stage)
+        return eta
+    
+    def _batch_eta(self, file_eta):
+        """Seconds until the batch is finished, None before a file was measured."""
+        if file_eta is None or not self._file_audio:
+            return None
+        pending = [path for path in self._sizes if path not in self._started_files]
+        audio = sum(self._estimate_duration(path) for path in pending)
+        # Files that were not known in advance, e.g. still being downloaded
+        unknown = max(self.file_count - self._started - len(pending), 0)
+        audio += unknown * self._file_audio / self._finished_files
+        return file_eta + audio * self._file_wall / self._file_audio
+    
+    def event(self):
+        """
+        The current progress.
+        
+        Returns:
+            dict: Progress event, see the module documentation
+        """
+        now = time.perf_counter()
+        if self._stage in FINISHED_STAGES:
+            stage_eta = file_eta = 0.0
+        else:
+            stage_eta = self._stage_eta(now) if self._stage is not None else None
+            file_eta = self._file_eta(stage_eta)
+        batch_eta = self._batch_eta(file_eta)
+        
+        audio_seconds = throughput = None
+        if self._stage_fraction is not None and self.duration:
+            audio_seconds = self._stage_fraction * self.duration
+            elapsed = now - self._stage_start
+            if elapsed > 0 and self._stage not in FINISHED_STAGES:
+                throughput = audio_seconds / elapsed
+        
+        fraction = None
+        if file_eta is not None:
+            elapsed = now - self._file_start
+            fraction = elapsed / (elapsed + file_eta) if elapsed + file_eta > 0 else 1.0
+        count = max(self.file_count, self._started)
+        batch_fraction = None
+        if fraction is not None:
+            batch_fraction = (self._started - 1 + fraction) / count
+        
+        return {
+            'type': 'stage_progress',
+            'file': self.input_file,
+            'index': self._started,
+            'count': count,
+            'stage': self._stage,
+            'stage_fraction': self._stage_fraction,
+            'fraction': fraction,
+            'batch_fraction': batch_fraction,
+            'audio_seconds': audio_seconds,
+            'duration': self.duration,
+            'throughput': throughput,
+            'stage_eta': stage_eta,
+            'eta': file_eta,
+            'batch_eta': batch_eta,
+        }
+    
+    def _emit(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last_event < self.interval:
+            return
+        self._last_event = now
+        self.callback(self.event())
+
+
+_local = threading.local()
+
+
+def active_tracker():
+    """The active ProgressTracker of the calling thread, or None."""
+    return getattr(_local, 'tracker', None)
+
+
+@contextlib.contextmanager
+def activate_tracker(tracker):
+    """
+    Make a tracker the active tracker of the calling thread for the duration of the block.
+    
+    Args:
+        tracker (ProgressTracker): Tracker the reports go to, None to report nothing
+    """
+    previous = active_tracker()
+    _local.tracker = tracker
+    try:
+        yield tracker
+    finally:
+        _local.tracker = previous
+
+
+def report_stage(stage):
+    """Report to the active tracker, if any, that the current file entered a stage."""
+    tracker = active_tracker()
+    if tracker is not None:
+        tracker.stage(stage)
+
+
+def report_progress(fraction):
+    """Report to the active tracker, if any, the fraction of the current stage that is done."""
+    tracker = active_tracker()
+    if tracker is not None:
+        tracker.progress(fraction)
+
+
+def report_audio(seconds):
+    """Report to the active tracker, if any, the seconds of audio the current stage processed."""
+    tracker = active_tracker()
+    if tracker is not None:
+        tracker.audio(seconds)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Long-lived Spleeter separator engine.
+Loads the separation model once per process and reuses it for every file in a batch.
+
+Spleeter (and TensorFlow with it) takes seconds to import, so it is only
+imported when a separator is first created, or ahead of time in a background
+thread with preload_backend(). Everything that doesn't separate (--help,
+argument errors, building the GUI) starts without it.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from audio_buffer import AudioBuffer, stem_buffers
+from mix_wavs import SEPARATION_MODELS, STEM_NAMES
+
+# Model used for bass extraction (bass, drums, vocals, other)
+DEFAULT_MODEL = 'spleeter:4stems'
+
+# All pretrained Spleeter models work at this sample rate
+SAMPLE_RATE = 44100
+
+# Length of the silent clip used to build the TensorFlow graph ahead of time
+WARMUP_SECONDS = 1.0
+
+# STFT of the pretrained models (frame_length, frame_step) and the number of STFT frames
+# the network processes as one independent segment (T)
+STFT_FRAME_LENGTH = 4096
+STFT_FRAME_STEP = 1024
+SEGMENT_FRAMES = 512
+
+# Samples per segment, the unit clips are packed in by separate_buffers
+SEGMENT_SAMPLES = SEGMENT_FRAMES * STFT_FRAME_STEP
+
+# Inputs of at least this size are decoded into a memory-mapped file instead of memory
+# (decoded float32 audio is about 10 times the size of an MP3)
+MEMMAP_MIN_BYTES = 32 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Whether Spleeter is installed, checked without importing it
+SPLEETER_AVAILABLE = importlib.util.find_spec('spleeter') is not None
+
+# One engine per model and per process
+_engines = {}
+
+# spleeter.separator.Separator once imported, and the time the import took
+_separator_class = None
+backend_import_time = 0.0
+
+
+def import_backend():
+    """
+    Import Spleeter on first use.
+    
+    Returns:
+        type: spleeter.separator.Separator
+    """
+    global _separator_class, backend_import_time
+    if _separator_class is None:
+        start = time.perf_counter()
+        # Python's import lock makes concurrent callers wait for the same import
+        from spleeter.separator import Separator
+        if _separator_class is None:
+            backend_import_time = time.perf_counter() - start
+            _separator_class = Separator
+            logger.info(f"Spleeter imported in {backend_import_time:.2f}s")
+    return _separator_class
+
+
+def preload_backend(callback=None):
+    """
+    Import Spleeter in a background thread, e.g. once a window is shown, so the
+    first separation doesn't wait for it.
+    
+    Args:
+        callback (callable, optional): Called in the thread with the exception, or None
+            once the import succeeded
+    
+    Returns:
+        threading.Thread: The started daemon thread
+    """
+    def run():
+        try:
+            import_backend()
+        except Exception as e:
+            logger.warning(f"Failed to preload Spleeter: {str(e)}")
+            if callback is not None:
+                callback(e)
+            return
+        if callback is not None:
+            callback(None)
+    
+    thread = threading.Thread(target=run, name="spleeter-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+class SeparatorEngine:
+    """
+    Wrapper around a Spleeter Separator that is created once and reused.
+    
+    Creating a Separator and running the first separation loads the model
+    weights and builds the TensorFlow graph. Both are kept alive here so
+    that the following files only pay for the separation itself.
+    """
+    
+    def __init__(self, model=DEFAULT_MODEL, multiprocess=True):
+        """
+        Args:
+            model (str): Spleeter model descriptor (e.g., 'spleeter:4stems')
+            multiprocess (bool): Whether Spleeter may use a process pool for writing files
+        """
+        self.model = model
+        self.multiprocess = multiprocess
+        self.sample_rate = SAMPLE_RATE
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+        self.files_processed = 0
+        self._separator = None
+        self._warmed_up = False
+    
+    @property
+    def separator(self):
+        """The underlying Spleeter Separator, created on first access."""
+        if self._separator is None:
+            self.load()
+        return self._separator
+    
+    @property
+    def stem_names(self):
+        """Names of the stems the model produces."""
+        return dict(SEPARATION_MODELS).get(self.model, STEM_NAMES)
+    
+    @property
+    def is_loaded(self):
+        """True once the Spleeter Separator has been created."""
+        return self._separator is not None
+    
+    @property
+    def is_warm(self):
+        """True once the model graph has been built by a first separation."""
+        return self._warmed_up
+    
+    def load(self):
+        """
+        Create the Spleeter Separator if it does not exist yet.
+        
+        Returns:
+            Separator: The loaded separator
+        """
+        if self._separator is None:
+            logger.info(f"Initializing Spleeter separator ({self.model})...")
+            start = time.perf_counter()
+            self._separator = import_backend()(self.model, multiprocess=self.multiprocess)
+            self.load_time = time.perf_counter() - start
+            logger.info(f"Spleeter separator initialized in {self.load_time:.2f}s")
+        return self._separator
+    
+    def warm_up(self):
+        """
+        Run a short silent clip through the model so that the weights are
+        loaded and the graph is built before the first real file.
+        
+        Returns:
+            SeparatorEngine: self, to allow chaining
+        """
+        if self._warmed_up:
+            return self
+        start = time.perf_counter()
+        silence = np.zeros((int(self.sample_rate * WARMUP_SECONDS), 2), dtype=np.float32)
+        self.separator.separate(silence)
+        self.warmup_time = time.perf_counter() - start
+        self._warmed_up = True
+        logger.info(f"Spleeter separator warmed up in {self.warmup_time:.2f}s")
+        return self
+    
+    def load_buffer(self, input_file, ffmpeg_path=None, memmap_folder=None):
+        """
+        Decode an audio file once into a buffer at the model sample rate.
+        
+        Args:
+            input_file (str): Path to input audio file
+            ffmpeg_path (str, optional): Path to FFmpeg executable
+            memmap_folder (str, optional): Folder to decode inputs of at least MEMMAP_MIN_BYTES
+                into, as a memory-mapped raw file; call release() on the buffer to remove it
+        
+        Returns:
+            AudioBuffer: Stereo float32 samples at the model sample rate
+        """
+        memmap_path = None
+        if memmap_folder is not None and os.path.getsize(input_file) >= MEMMAP_MIN_BYTES:
+            os.makedirs(memmap_folder, exist_ok=True)
+            memmap_path = os.path.join(memmap_folder, f"{Path(input_file).stem}.f32")
+            logger.info(f"Decoding {input_file} into memory-mapped file {memmap_path}")
+        return AudioBuffer.from_file(input_file, self.sample_rate, ffmpeg_path=ffmpeg_path, memmap_path=memmap_path)
+    
+    def separate(self, waveform):
+        """
+        Separate a waveform held in memory.
+        
+        Args:
+            waveform (numpy.ndarray): Audio samples of shape (samples, channels)
+        
+        Returns:
+            dict: Stem name -> numpy.ndarray of shape (samples, channels)
+        """
+        stems = self.separator.separate(waveform)
+        self._warmed_up = True
+        return stems
+    
+    def separate_buffer(self, buffer):
+        """
+        Separate a decoded buffer.
+        
+        Args:
+            buffer (AudioBuffer): Audio at the model sample rate, see load_buffer
+        
+        Returns:
+            dict: Stem name -> AudioBuffer
+        """
+        return stem_buffers(self.separate(np.asarray(buffer.data)), self.sample_rate)
+    
+    def separate_buffers(self, buffers):
+        """
+        Separate several decoded buffers in a single separator call.
+        
+        The buffers are concatenated, each one padded with silence to a whole number
+        of network segments plus one STFT frame, so no segment and no STFT frame
+        holds audio of two buffers: each buffer is separated as if it was followed by
+        silence, and the fixed cost of a separator call is paid once for all of them.
+        
+        Args:
+            buffers (list): AudioBuffer objects at the model sample rate, see load_buffer
+        
+        Returns:
+            list: For each buffer, a dict stem name -> AudioBuffer of the buffer's length
+        """
+        channels = max(buffer.channels for buffer in buffers)
+        slots = [packed_slot_length(buffer.frames) for buffer in buffers]
+        packed = np.zeros((sum(slots), channels), dtype=np.float32)
+        start = 0
+        for buffer, slot in zip(buffers, slots):
+            # Mono buffers are spread to every channel
+            packed[start:start + buffer.frames] = buffer.data
+            start += slot
+        
+        stems = self.separate(packed)
+        packed = None
+        
+        separated = []
+        start = 0
+        for buffer, slot in zip(buffers, slots):
+            # Copies, so the stems of one buffer don't keep the whole packed output alive
+            separated.append(stem_buffers({name: stem[start:start + buffer.frames].copy()
+                                           for name, stem in stems.items()}, self.sample_rate))
+            start += slot
+        self.files_processed += len(buffers)
+        return separated
+    
+    def separate_to_file(self, input_file, destination):
+        """
+        Separate an audio file and write one WAV per stem.
+        
+        Args:
+            input_file (str): Path to input audio file
+            destination (str): Folder where '<name>/<stem>.wav' files are written
+        """
+        self.separator.separate_to_file(input_file, destination, synchronous=True)
+        self._warmed_up = True
+        self.files_processed += 1
+
+
+def packed_slot_length(frames):
+    """
+    Samples a clip takes up in a packed separator call, see SeparatorEngine.separate_buffers.
+    
+    Args:
+        frames (int): Length of the clip in samples
+    
+    Returns:
+        int: The clip and at least one STFT frame of silence, rounded up to whole segments
+    """
+    return -(-(frames + STFT_FRAME_LENGTH) // SEGMENT_SAMPLES) * SEGMENT_SAMPLES
+
+
+def get_engine(model=DEFAULT_MODEL, warm_up=False):
+    """
+    Get the process-wide engine for a model, creating it on first use.
+    
+    Args:
+        model (str): Spleeter model descriptor
+        warm_up (bool): Whether to warm the engine up before returning it
+    
+    Returns:
+        SeparatorEngine: The shared engine
+    """
+    engine = _engines.get(model)
+    if engine is None:
+        engine = SeparatorEngine(model)
+        _engines[model] = engine
+    if warm_up:
+        engine.warm_up()
+    return engine
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Persistent, content-addressed cache of separated stems.
+
+Stems are keyed by a hash of the input audio file plus the Spleeter model
+name, so re-running a track with different mix flags or pitch options skips
+the separation. Entries are stored as 16-bit PCM in uncompressed .npz files,
+the cache size is bounded and the least recently used entries are evicted.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+
+from mix_wavs import PCM_SCALE, to_pcm16
+
+# Default cache location and size limit
+DEFAULT_CACHE_DIR = "bass_extractor_cache"
+DEFAULT_MAX_SIZE_MB = 5000
+
+# Chunk size used when hashing input files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path):
+    """
+    Compute the SHA-256 hash of a file's content.
+    
+    Args:
+        path (str): Path to the file
+    
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StemCache:
+    """
+    On-disk stem cache with LRU eviction and hit/miss counters.
+    
+    The last-used time of an entry is its file modification time, which is
+    refreshed on every hit, so the cache can be shared by several processes.
+    """
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        """
+        Args:
+            cache_dir (str): Folder holding the cache entries
+            max_size_mb (float): Maximum total size of the cache in megabytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def __getstate__(self):
+        # Locks can't be pickled, e.g. when the cache is sent to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def key(self, input_file, model):
+        """
+        Cache key for an input file and a separation model.
+        
+        Args:
+            input_file (str): Path to input audio file
+            model (str): Spleeter model descriptor (e.g., 'spleeter:4stems')
+        
+        Returns:
+            str: Cache key
+        """
+        digest = hashlib.sha256(f"{hash_file(input_file)}:{model}".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+    
+    def get(self, input_file, model, key=None):
+        """
+        Look up the stems of an input file.
+        
+        Args:
+            input_file (str): Path to input audio file
+            model (str): Spleeter model descriptor
+            key (str, optional): Precomputed cache key
+        
+        Returns:
+            tuple: (stems dict of float32 arrays, sample rate), or None on a miss
+        """
+        key = key or self.key(input_file, model)
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as entry:
+                sample_rate = int(entry['sample_rate'])
+                stems = {
+                    name[len('stem_'):]: entry[name].astype(np.float32) / PCM_SCALE
+                    for name in entry.files if name.startswith('stem_')
+                }
+            # Mark as recently used
+            os.utime(path)
+        except Exception as e:
+            if os.path.exists(path):
+                logger.warning(f"Ignoring unreadable stem cache entry {path}: {str(e)}")
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        with self._lock:
+            self.hits += 1
+        logger.info(f"Stem cache hit for {input_file}")
+        return stems, sample_rate
+    
+    def put(self, input_file, model, stems, sample_rate, key=None):
+        """
+        Store the stems of an input file, then evict old entries if needed.
+        
+        Args:
+            input_file (str): Path to input audio file
+            model (str): Spleeter model descriptor
+            stems (dict): Stem name -> numpy.ndarray of shape (samples, channels)
+            sample_rate (int): Sample rate of the stems
+            key (str, optional): Precomputed cache key
+        """
+        key = key or self.key(input_file, model)
+        path = self._entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            arrays = {f"stem_{name}": to_pcm16(stem) for name, stem in stems.items()}
+            with open(temp_path, 'wb') as f:
+                np.savez(f, sample_rate=np.int64(sample_rate), **arrays)
+            # Atomic, so readers never see a partially written entry
+            os.replace(temp_path, path)
+            logger.info(f"Stored stems of {input_file} in stem cache")
+        except OSError as e:
+            logger.warning(f"Failed to store stems of {input_file} in stem cache: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        
+        self.evict()
+    
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def evict(self):
+        """Remove least recently used entries until the cache fits its size limit."""
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            with self._lock:
+                self.evictions += 1
+            logger.info(f"Evicted stem cache entry {path}")
+    
+    def stats(self):
+        """
+        Cache counters and current size.
+        
+        Returns:
+            dict: hits, misses, evictions, entries and size in bytes
+        """
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries),
+        }
+    
+    def format_stats(self):
+        """Human readable cache counters."""
+        stats = self.stats()
+        return (f"Stem cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+                f"{stats['entries']} entries ({stats['size'] / 1024 / 1024:.1f} MB of {self.max_size / 1024 / 1024:.0f} MB)")
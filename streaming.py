@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Streaming separation for very long inputs.
+
+The input is decoded through an FFmpeg pipe and separated in fixed-length,
+overlapping windows. Window boundaries are crossfaded, and each chunk is
+mixed and fed to a single encoder process for all outputs as soon as it
+is produced, so peak memory depends on the window size and not on the length
+of the track.
+"""
+
+import logging
+import os
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from audio_buffer import decode_stream
+from cancellation import check_cancelled
+from progress import report_audio
+from mix_wavs import (DEFAULT_BITRATE, DEFAULT_OUTPUT_FORMAT, commit_output, export_command, interleave_pcm,
+                      mix_stem_array, output_path, partial_path, plan_separation, requested_mixes, stack_stems)
+from separator_engine import get_engine
+
+# Default window length and overlap between consecutive windows, in seconds
+DEFAULT_WINDOW_SECONDS = 30.0
+DEFAULT_OVERLAP_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class StreamEncoder:
+    """Encoder of several outputs at once, fed with raw 16-bit PCM chunks through one FFmpeg pipe."""
+    
+    def __init__(self, output_files, sample_rate, channels=2, output_format=DEFAULT_OUTPUT_FORMAT,
+                 bitrate=DEFAULT_BITRATE, ffmpeg_path=None):
+        """
+        Args:
+            output_files (list): Paths to the output files, one per stream
+            sample_rate (int): Sample rate of the PCM chunks
+            channels (int): Number of channels of each stream
+            output_format (str): One of mix_wavs.OUTPUT_FORMATS
+            bitrate (str): Bitrate of lossy formats (e.g., '192k')
+            ffmpeg_path (str, optional): Path to FFmpeg executable
+        """
+        self.output_files = list(output_files)
+        self.channels = channels
+        cmd = export_command(self.output_files, sample_rate, channels, output_format=output_format,
+                             bitrate=bitrate, ffmpeg_path=ffmpeg_path or 'ffmpeg')
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    
+    def write(self, chunks):
+        """Write one chunk of int16 samples of shape (frames, channels) per output, in output order."""
+        self.process.stdin.write(interleave_pcm(chunks, self.channels).tobytes())
+    
+    def close(self):
+        """Finish encoding, raises RuntimeError if FFmpeg failed."""
+        self.process.stdin.close()
+        stderr = self.process.stderr.read().decode(errors='replace')
+        self.process.stderr.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"FFmpeg encoding of {', '.join(self.output_files)} failed: {stderr.strip()}")
+        for output_file in self.output_files:
+            commit_output(output_file)
+    
+    def abort(self):
+        """Stop the encoder without waiting for the outputs."""
+        try:
+            self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass
+        for output_file in self.output_files:
+            if os.path.exists(partial_path(output_file)):
+                os.remove(partial_path(output_file))
+
+
+def separate_stream(engine, input_file, window_seconds=DEFAULT_WINDOW_SECONDS,
+                    overlap_seconds=DEFAULT_OVERLAP_SECONDS, ffmpeg_path=None, stem_names=None):
+    """
+    Separate an audio file window by window.
+    
+    Consecutive windows overlap by overlap_seconds. In the overlap, the end of
+    the previous window's stems is linearly crossfaded into the start of the
+    next window's stems, which hides the boundary artifacts of the model.
+    
+    Args:
+        engine (SeparatorEngine): Separator engine
+        input_file (str): Path to input audio file
+        window_seconds (float): Length of each separated window
+        overlap_seconds (float): Overlap between consecutive windows
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        stem_names (sequence, optional): Stems to keep, all stems of the model by default
+    
+    Yields:
+        dict: Stem name -> float32 chunk of shape (frames, channels), in order
+    """
+    sample_rate = engine.sample_rate
+    overlap = int(overlap_seconds * sample_rate)
+    hop = int(window_seconds * sample_rate) - overlap
+    if hop < overlap:
+        raise ValueError("The window must be at least twice as long as the overlap")
+    
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+    carry = None
+    previous_tail = None
+    
+    blocks = decode_stream(input_file, sample_rate, hop, ffmpeg_path=ffmpeg_path)
+    block = next(blocks, None)
+    while block is not None:
+        next_block = next(blocks, None)
+        is_last = next_block is None
+        
+        waveform = block if carry is None else np.concatenate([carry, block])
+        check_cancelled()
+        stems = engine.separate(waveform)
+        if stem_names is not None:
+            stems = {name: stems[name] for name in stem_names}
+        
+        head = 0 if previous_tail is None else len(carry)
+        keep = 0 if is_last else overlap
+        chunk = {}
+        for name, stem in stems.items():
+            # Some models return slightly padded outputs
+            stem = stem[:len(waveform)]
+            if head:
+                fade = fade_in[:head]
+                crossfaded = previous_tail[name] * (1.0 - fade) + stem[:head] * fade
+                chunk[name] = np.concatenate([crossfaded, stem[head:len(stem) - keep]])
+            else:
+                chunk[name] = stem[:len(stem) - keep]
+        yield chunk
+        
+        previous_tail = {name: stem[len(stem) - keep:] for name, stem in stems.items()} if keep else None
+        carry = waveform[len(waveform) - overlap:] if keep else None
+        block = next_block
+
+
+def extract_bass_streaming(input_file, output_folder, novocals=False, nodrums=False, noother=False, bassonly=False,
+                           engine=None, window_seconds=DEFAULT_WINDOW_SECONDS,
+                           overlap_seconds=DEFAULT_OVERLAP_SECONDS, ffmpeg_path=None,
+                           output_format=DEFAULT_OUTPUT_FORMAT, bitrate=DEFAULT_BITRATE):
+    """
+    Extract bass from a long audio file with bounded memory.
+    
+    Args:
+        input_file (str): Path to input audio file
+        output_folder (str): Path to output folder
+        novocals, nodrums, noother, bassonly (bool): Additional outputs, as for mix_wavs
+        engine (SeparatorEngine, optional): Separator engine, defaults to the process-wide one
+        window_seconds (float): Length of each separated window
+        overlap_seconds (float): Overlap between consecutive windows
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        output_format (str): One of mix_wavs.OUTPUT_FORMATS
+        bitrate (str): Bitrate of lossy formats (e.g., '192k')
+    
+    Returns:
+        bool: True if all outputs were written, False otherwise
+    """
+    song_name = Path(input_file).stem
+    mixes = requested_mixes(novocals, nodrums, noother, bassonly)
+    # Only the stems the outputs use are crossfaded and mixed
+    model, stem_names = plan_separation(mixes)
+    if engine is None or engine.model != model:
+        engine = get_engine(model)
+    
+    output_files = [output_path(output_folder, mix, song_name, output_format) for mix in mixes]
+    for output_file in output_files:
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    
+    encoder = None
+    try:
+        encoder = StreamEncoder(output_files, engine.sample_rate, output_format=output_format, bitrate=bitrate,
+                                ffmpeg_path=ffmpeg_path)
+        
+        processed = 0
+        for chunk in separate_stream(engine, input_file, window_seconds, overlap_seconds, ffmpeg_path, stem_names):
+            stems, lengths = stack_stems([chunk[name] for name in stem_names])
+            pcm = mix_stem_array(stems, lengths, mixes, stem_names=stem_names)
+            encoder.write([pcm[mix] for mix in mixes])
+            processed += stems.shape[1]
+            report_audio(processed / engine.sample_rate)
+            logger.info(f"Streamed {processed / engine.sample_rate:.0f}s of {input_file}")
+        
+        encoder.close()
+        return True
+    
+    except Exception as e:
+        if encoder is not None:
+            encoder.abort()
+        error_msg = f"Failed to stream {input_file}: {str(e)}"
+        logger.error(error_msg)
+        print(f"Error: {error_msg}")
+        return False
+    except BaseException:
+        # Cancelled or interrupted: no partial outputs are left behind
+        if encoder is not None:
+            encoder.abort()
+        raise
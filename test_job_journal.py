@@ -0,0 +1,50 @@
+"""
+Tests of the job journal used by --resume.
+
+Run with: python -m pytest test_job_journal.py
+"""
+
+import os
+
+import pytest
+
+from job_journal import JOURNAL_NAME, JobJournal
+
+
+def test_journal_reached_after_replay(tmp_path):
+    journal = JobJournal(str(tmp_path))
+    journal.record('a.mp3', 'separated')
+    journal.record('b.mp3', 'separated')
+    journal.record('b.mp3', 'exported')
+    
+    replayed = JobJournal(str(tmp_path), resume=True)
+    assert replayed.reached('a.mp3', 'separated')
+    assert not replayed.reached('a.mp3', 'mixed')
+    assert replayed.reached('b.mp3', 'mixed')
+    assert not replayed.reached('b.mp3', 'moved')
+    assert replayed.stage('c.mp3') is None
+
+
+def test_journal_replay_cuts_partial_line(tmp_path):
+    JobJournal(str(tmp_path)).record('a.mp3', 'mixed')
+    with open(tmp_path / JOURNAL_NAME, 'a', encoding='utf-8') as f:
+        f.write('{"file": "b.mp3", "sta')
+    
+    replayed = JobJournal(str(tmp_path), resume=True)
+    assert replayed.reached('a.mp3', 'mixed')
+    assert replayed.stage('b.mp3') is None
+    replayed.record('b.mp3', 'separated')
+    assert JobJournal(str(tmp_path), resume=True).reached('b.mp3', 'separated')
+
+
+def test_journal_without_resume_starts_over(tmp_path):
+    JobJournal(str(tmp_path)).record('a.mp3', 'moved')
+    assert JobJournal(str(tmp_path)).stage('a.mp3') is None
+    assert not os.path.exists(tmp_path / JOURNAL_NAME)
+
+
+def test_journal_rejects_unknown_stage(tmp_path):
+    journal = JobJournal(str(tmp_path))
+    with pytest.raises(ValueError):
+        journal.record('a.mp3', 'decoded')
+    assert journal.stage('a.mp3') is None
@@ -0,0 +1,131 @@
+"""
+Tests of the HTTP job service, with a stub separator in place of Spleeter.
+
+Run with: python -m pytest test_job_server.py
+"""
+
+import http.client
+import json
+import os
+import shutil
+import socket
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pytest
+
+import extract_bass
+import job_server
+from job_server import MAX_JSON_BODY, JobServer
+from mix_wavs import write_wav
+from separator_engine import SeparatorEngine
+
+SAMPLE_RATE = 44100
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="FFmpeg is not installed")
+
+
+class StubSeparator:
+    """Stands in for Spleeter: every stem is a scaled copy of the input."""
+    
+    def separate(self, waveform):
+        return {'vocals': waveform * 0.1, 'drums': waveform * 0.2, 'bass': waveform * 0.3, 'other': waveform * 0.4}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    engine = SeparatorEngine()
+    engine._separator = StubSeparator()
+    monkeypatch.setattr(job_server, 'get_engine', lambda *args, **kwargs: engine)
+    monkeypatch.setattr(extract_bass, 'get_engine', lambda *args, **kwargs: engine)
+    
+    server = JobServer(str(tmp_path / 'out'), port=0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.close()
+
+
+def write_song(path, seconds=1.0):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    waveform = np.stack([np.sin(2 * np.pi * 110.0 * t)] * 2, axis=1) * 0.5
+    write_wav(str(path), waveform, SAMPLE_RATE)
+    return str(path)
+
+
+def request(server, method, path, body=None, headers=None):
+    url = urlparse(server.url)
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def wait_for(server, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, job = request(server, 'GET', f"/jobs/{job_id}")
+        assert status == 200
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish in {timeout}s")
+
+
+def test_json_job(server, tmp_path):
+    song = write_song(tmp_path / 'song.wav')
+    body = json.dumps({'file': song, 'in_memory': True, 'output_format': 'wav'})
+    
+    status, job = request(server, 'POST', '/jobs', body, {'Content-Type': 'application/json'})
+    assert status == 202
+    job = wait_for(server, job['id'])
+    
+    assert job['status'] == 'done', job['error']
+    assert set(job['outputs']) == {'NOBASS'}
+    assert all(os.path.isfile(path) for path in job['outputs'].values())
+    # The job worked on a copy, the client's file stays where it is
+    assert os.path.isfile(song)
+
+
+def test_upload_job(server, tmp_path):
+    with open(write_song(tmp_path / 'song.wav'), 'rb') as f:
+        audio = f.read()
+    
+    status, job = request(server, 'POST', '/jobs?name=upload.wav&nodrums=1&in_memory=1&output_format=wav', audio,
+                          {'Content-Type': 'application/octet-stream'})
+    assert status == 202
+    job = wait_for(server, job['id'])
+    
+    assert job['status'] == 'done', job['error']
+    assert set(job['outputs']) == {'NOBASS', 'NODRUMS'}
+    assert os.path.basename(job['outputs']['NODRUMS']).startswith('upload')
+    
+    status, health = request(server, 'GET', '/health')
+    assert health['jobs'] == {'done': 1}
+
+
+def test_invalid_requests(server, tmp_path):
+    json_headers = {'Content-Type': 'application/json'}
+    assert request(server, 'POST', '/jobs', '[]', json_headers)[0] == 400
+    assert request(server, 'POST', '/jobs', json.dumps({'file': str(tmp_path / 'missing.wav')}), json_headers)[0] == 400
+    assert request(server, 'POST', '/jobs', ' ' * (MAX_JSON_BODY + 1), json_headers)[0] == 400
+    assert request(server, 'POST', '/jobs', json.dumps({'file': 'x', 'speed': 2}), json_headers)[0] == 400
+    
+    status, error = request(server, 'POST', '/jobs?name=song.wav', b'', {'Content-Length': '-1'})
+    assert status == 400
+    assert 'negative' in error['error']
+    
+    # An upload that ends early is rejected
+    url = urlparse(server.url)
+    with socket.create_connection((url.hostname, url.port), timeout=10) as connection:
+        connection.sendall(b"POST /jobs?name=song.wav HTTP/1.1\r\nHost: localhost\r\nContent-Length: 1000\r\n\r\n"
+                           + b"x" * 10)
+        connection.shutdown(socket.SHUT_WR)
+        assert connection.makefile('rb').readline().split()[1] == b'400'
+    
+    # None of the rejected requests left an upload folder behind
+    assert os.listdir(server.upload_folder) == []
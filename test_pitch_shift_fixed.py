@@ -1 +1,115 @@
- 
\ No newline at end of file
+"""
+Tests of the single-run pitch shift of the exported mixes (--pitch-mixes).
+
+FFmpeg is replaced by a recorder of its command lines, so the filtergraph
+arguments are checked without running it.
+
+Run with: python -m pytest test_pitch_shift_fixed.py
+"""
+
+import os
+import subprocess
+
+import numpy as np
+
+import pitch_shifter
+from mix_wavs import encoder_args, output_path, partial_path
+from pitch_shifter import calculate_pitch_shift, export_mixes_with_pitch_shift, shift_pitch_ffmpeg_multi
+
+SAMPLE_RATE = 44100
+
+
+class FakeFFmpeg:
+    """Records the command lines; fails with rubberband if asked to, and writes every output file."""
+    
+    def __init__(self, rubberband=True):
+        self.rubberband = rubberband
+        self.commands = []
+    
+    def __call__(self, cmd, input=None, timeout=None, text=False):
+        self.commands.append(cmd)
+        graph = cmd[cmd.index('-filter_complex') + 1]
+        if 'rubberband' in graph and not self.rubberband:
+            return subprocess.CompletedProcess(cmd, 1, '', 'No such filter: rubberband')
+        for index, arg in enumerate(cmd):
+            if arg == '-map':
+                open(output_after(cmd, index), 'wb').close()
+        return subprocess.CompletedProcess(cmd, 0, '', '')
+
+
+def output_after(cmd, map_index):
+    # The output file is the first argument after the map that is not an option or its value
+    index = map_index + 2
+    while cmd[index].startswith('-'):
+        index += 2
+    return cmd[index]
+
+
+def filtergraph(cmd):
+    return cmd[cmd.index('-filter_complex') + 1]
+
+
+def inputs(cmd):
+    return [cmd[index + 1] for index, arg in enumerate(cmd) if arg == '-i']
+
+
+def test_one_run_with_one_chain_per_input(tmp_path, monkeypatch):
+    ffmpeg = FakeFFmpeg()
+    monkeypatch.setattr(pitch_shifter, 'run_process', ffmpeg)
+    input_files = ['NOBASS.wav', 'BASSONLY.wav']
+    output_files = [str(tmp_path / 'nobass.mp3'), str(tmp_path / 'bassonly.mp3')]
+    
+    assert shift_pitch_ffmpeg_multi(input_files, output_files, 1.5, output_args=['-b:a', '192k'])
+    
+    assert len(ffmpeg.commands) == 1
+    cmd = ffmpeg.commands[0]
+    assert inputs(cmd) == input_files
+    assert filtergraph(cmd) == '[0:a]rubberband=pitch=1.5[out0];[1:a]rubberband=pitch=1.5[out1]'
+    map_index = cmd.index('-map')
+    assert cmd[map_index:map_index + 5] == ['-map', '[out0]', '-b:a', '192k', output_files[0]]
+    assert cmd[-5:] == ['-map', '[out1]', '-b:a', '192k', output_files[1]]
+
+
+def test_fallback_filter_without_rubberband(tmp_path, monkeypatch):
+    ffmpeg = FakeFFmpeg(rubberband=False)
+    monkeypatch.setattr(pitch_shifter, 'run_process', ffmpeg)
+    
+    assert shift_pitch_ffmpeg_multi(['a.wav'], [str(tmp_path / 'a.mp3')], 2.0, sample_rate=48000)
+    
+    assert len(ffmpeg.commands) == 2
+    assert filtergraph(ffmpeg.commands[1]) == '[0:a]asetrate=48000*2.0,atempo=1/2.0,aresample=48000[out0]'
+
+
+def test_no_shift_passes_the_audio_through(tmp_path, monkeypatch):
+    ffmpeg = FakeFFmpeg()
+    monkeypatch.setattr(pitch_shifter, 'run_process', ffmpeg)
+    
+    assert shift_pitch_ffmpeg_multi(['a.wav', 'b.wav'], [str(tmp_path / 'a.mp3'), str(tmp_path / 'b.mp3')], 1.0)
+    assert filtergraph(ffmpeg.commands[0]) == '[0:a]anull[out0];[1:a]anull[out1]'
+
+
+def test_export_shifts_only_the_exported_mixes(tmp_path, monkeypatch):
+    ffmpeg = FakeFFmpeg()
+    monkeypatch.setattr(pitch_shifter, 'run_process', ffmpeg)
+    output_folder = str(tmp_path / 'out')
+    temp_folder = str(tmp_path / 'temp')
+    mixes = {mix: np.zeros((SAMPLE_RATE, 2), dtype=np.int16) for mix in ('NOBASS', 'BASSONLY')}
+    
+    assert export_mixes_with_pitch_shift(mixes, SAMPLE_RATE, 'song', output_folder, temp_folder, 'C', 'D',
+                                         backend='ffmpeg', output_format='mp3', bitrate='128k')
+    
+    # A single FFmpeg run, one input and one output per mix
+    assert len(ffmpeg.commands) == 1
+    cmd = ffmpeg.commands[0]
+    ratio = calculate_pitch_shift('C', 'D')
+    assert inputs(cmd) == [os.path.join(temp_folder, f"{mix}.wav") for mix in mixes]
+    assert filtergraph(cmd) == f'[0:a]rubberband=pitch={ratio}[out0];[1:a]rubberband=pitch={ratio}[out1]'
+    final_paths = [output_path(output_folder, mix, 'song', 'mp3') for mix in mixes]
+    map_index = cmd.index('-map')
+    expected = ['-map', '[out0]'] + encoder_args('mp3', '128k') + [partial_path(final_paths[0])]
+    assert cmd[map_index:map_index + len(expected)] == expected
+    
+    # The outputs are written under temporary names and renamed when complete
+    for path in final_paths:
+        assert os.path.exists(path)
+        assert not os.path.exists(partial_path(path))
@@ -0,0 +1,45 @@
+"""
+Tests of the in-process pitch shifter.
+
+Run with: python -m pytest test_pitch_shifter.py
+"""
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+from pitch_shifter import calculate_pitch_shift, shift_pitch_array, shift_pitch_buffer
+
+SAMPLE_RATE = 44100
+
+
+def sine(frequency, seconds=2.0, channels=2):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return np.repeat(np.sin(2 * np.pi * frequency * t)[:, None], channels, axis=1).astype(np.float32) * 0.5
+
+
+def peak_frequency(waveform):
+    spectrum = np.abs(np.fft.rfft(waveform[:, 0] * np.hanning(len(waveform))))
+    return np.argmax(spectrum) * SAMPLE_RATE / len(waveform)
+
+
+def test_shift_pitch_array_moves_the_peak():
+    ratio = calculate_pitch_shift('C', 'D')
+    shifted = shift_pitch_array(sine(440.0), ratio)
+    assert abs(peak_frequency(shifted) - 440.0 * ratio) < 2.0
+
+
+def test_shift_pitch_array_keeps_shape():
+    waveform = sine(440.0, seconds=1.3)
+    for ratio in (0.8, 1.0, 1.25):
+        shifted = shift_pitch_array(waveform, ratio)
+        assert shifted.shape == waveform.shape
+        assert shifted.dtype == np.float32
+
+
+def test_backends_move_the_peak():
+    ratio = calculate_pitch_shift('C', 'D')
+    buffer = AudioBuffer(sine(440.0), SAMPLE_RATE)
+    for backend in ('numpy', 'pydub'):
+        shifted = shift_pitch_buffer(buffer, ratio, backend)
+        assert shifted.frames == buffer.frames
+        assert abs(peak_frequency(shifted.data) - 440.0 * ratio) < 2.0
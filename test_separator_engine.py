@@ -0,0 +1,70 @@
+"""
+Tests of packed separation in separator_engine.py, with a stub separator.
+
+Run with: python -m pytest test_separator_engine.py
+"""
+
+import numpy as np
+
+from audio_buffer import AudioBuffer
+from separator_engine import SEGMENT_SAMPLES, STFT_FRAME_LENGTH, SeparatorEngine, packed_slot_length
+
+SAMPLE_RATE = 44100
+
+
+def sine(frequency, seconds, channels=2):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return np.repeat(np.sin(2 * np.pi * frequency * t)[:, None], channels, axis=1).astype(np.float32) * 0.5
+
+
+class StubSeparator:
+    """Stands in for Spleeter: every stem is a scaled copy of the input, sample by sample."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def separate(self, waveform):
+        self.calls.append(len(waveform))
+        return {'vocals': waveform * 0.1, 'drums': waveform * 0.2, 'bass': waveform * 0.3, 'other': waveform * 0.4}
+
+
+def stub_engine():
+    engine = SeparatorEngine()
+    engine._separator = StubSeparator()
+    return engine
+
+
+def test_packed_slot_length():
+    assert packed_slot_length(1) == SEGMENT_SAMPLES
+    assert packed_slot_length(SEGMENT_SAMPLES - STFT_FRAME_LENGTH) == SEGMENT_SAMPLES
+    assert packed_slot_length(SEGMENT_SAMPLES - STFT_FRAME_LENGTH + 1) == 2 * SEGMENT_SAMPLES
+    for frames in (1000, 300000, 1234567):
+        slot = packed_slot_length(frames)
+        assert slot % SEGMENT_SAMPLES == 0
+        assert slot >= frames + STFT_FRAME_LENGTH
+
+
+def test_separate_buffers_round_trip():
+    engine = stub_engine()
+    buffers = [AudioBuffer(sine(frequency, seconds), SAMPLE_RATE)
+               for frequency, seconds in ((220.0, 0.5), (330.0, 3.0), (440.0, 1.0))]
+    separated = engine.separate_buffers(buffers)
+    
+    # One separator call for all buffers, each in its own slot
+    assert engine.separator.calls == [sum(packed_slot_length(buffer.frames) for buffer in buffers)]
+    assert len(separated) == len(buffers)
+    for buffer, stems in zip(buffers, separated):
+        assert set(stems) == {'vocals', 'drums', 'bass', 'other'}
+        assert stems['bass'].frames == buffer.frames
+        np.testing.assert_array_equal(stems['bass'].data, buffer.data * 0.3)
+    assert engine.files_processed == len(buffers)
+
+
+def test_separate_buffers_spreads_mono():
+    engine = stub_engine()
+    mono = AudioBuffer(sine(220.0, 0.5, channels=1), SAMPLE_RATE)
+    stereo = AudioBuffer(sine(330.0, 0.5), SAMPLE_RATE)
+    separated = engine.separate_buffers([mono, stereo])
+    
+    assert separated[0]['bass'].channels == 2
+    np.testing.assert_array_equal(separated[0]['bass'].data[:, 1], mono.data[:, 0] * 0.3)
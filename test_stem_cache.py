@@ -0,0 +1,80 @@
+"""
+Tests of the on-disk stem cache.
+
+Run with: python -m pytest test_stem_cache.py
+"""
+
+import os
+
+import numpy as np
+
+from stem_cache import StemCache
+
+SAMPLE_RATE = 44100
+
+
+def sine(frequency, seconds, channels=2):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return np.repeat(np.sin(2 * np.pi * frequency * t)[:, None], channels, axis=1).astype(np.float32) * 0.5
+
+
+def write_input(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_stem_cache_get_put(tmp_path):
+    cache = StemCache(str(tmp_path / 'cache'))
+    input_file = write_input(tmp_path, 'song.mp3', b'song')
+    stems = {'bass': sine(110.0, 0.5), 'other': sine(880.0, 0.5)}
+    
+    assert cache.get(input_file, 'spleeter:4stems') is None
+    cache.put(input_file, 'spleeter:4stems', stems, SAMPLE_RATE)
+    cached, sample_rate = cache.get(input_file, 'spleeter:4stems')
+    
+    assert sample_rate == SAMPLE_RATE
+    assert set(cached) == set(stems)
+    for name, stem in stems.items():
+        # Stored as 16-bit PCM
+        np.testing.assert_allclose(cached[name], stem, atol=1.0 / 32767)
+    
+    # Another model or another file content is a different entry
+    assert cache.get(input_file, 'spleeter:2stems') is None
+    assert cache.key(write_input(tmp_path, 'other.mp3', b'other'), 'spleeter:4stems') != cache.key(
+        input_file, 'spleeter:4stems')
+    
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 1)
+
+
+def test_stem_cache_evicts_least_recently_used(tmp_path):
+    cache = StemCache(str(tmp_path / 'cache'))
+    stems = {'bass': sine(110.0, 0.5)}
+    files = [write_input(tmp_path, f"{index}.mp3", bytes([index])) for index in range(3)]
+    for index, input_file in enumerate(files):
+        cache.put(input_file, 'spleeter:4stems', stems, SAMPLE_RATE)
+        entry = cache._entry_path(cache.key(input_file, 'spleeter:4stems'))
+        os.utime(entry, (1000 + index, 1000 + index))
+    
+    # Reading the oldest entry makes it the most recently used one
+    assert cache.get(files[0], 'spleeter:4stems') is not None
+    
+    entry_size = cache.stats()['size'] // 3
+    cache.max_size = 2 * entry_size
+    cache.evict()
+    
+    assert cache.evictions == 1
+    assert cache.get(files[1], 'spleeter:4stems') is None
+    assert cache.get(files[0], 'spleeter:4stems') is not None
+    assert cache.get(files[2], 'spleeter:4stems') is not None
+
+
+def test_stem_cache_ignores_unreadable_entry(tmp_path):
+    cache = StemCache(str(tmp_path / 'cache'))
+    input_file = write_input(tmp_path, 'song.mp3', b'song')
+    with open(cache._entry_path(cache.key(input_file, 'spleeter:4stems')), 'wb') as f:
+        f.write(b'not an npz file')
+    
+    assert cache.get(input_file, 'spleeter:4stems') is None
+    assert cache.misses == 1
@@ -0,0 +1,83 @@
+"""
+Tests of the windowed separation of streaming.py, with a stub separator.
+
+Run with: python -m pytest test_streaming.py
+"""
+
+import shutil
+
+import numpy as np
+import pytest
+
+from audio_buffer import AudioBuffer
+from mix_wavs import write_wav
+from streaming import separate_stream
+
+SAMPLE_RATE = 44100
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="FFmpeg is not installed")
+
+
+class StubEngine:
+    """
+    Stands in for SeparatorEngine: the bass stem is half the input, plus an offset
+    that changes with every window, so a missing crossfade shows up as a step.
+    """
+    
+    sample_rate = SAMPLE_RATE
+    
+    def __init__(self, window_offset=0.0):
+        self.window_offset = window_offset
+        self.calls = []
+    
+    def separate(self, waveform):
+        offset = self.window_offset * len(self.calls)
+        self.calls.append(len(waveform))
+        return {'bass': waveform * 0.5 + offset, 'other': waveform * 0.5}
+
+
+def write_input(tmp_path, seconds):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    waveform = np.stack([np.sin(2 * np.pi * 220.0 * t), np.sin(2 * np.pi * 330.0 * t)], axis=1) * 0.5
+    path = str(tmp_path / 'input.wav')
+    write_wav(path, waveform, SAMPLE_RATE)
+    # The samples as the stream decodes them, after 16-bit quantization
+    return path, AudioBuffer.from_file(path, SAMPLE_RATE).data
+
+
+def separate(engine, path, window_seconds=3.0, overlap_seconds=0.5):
+    chunks = list(separate_stream(engine, path, window_seconds, overlap_seconds))
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+def test_output_length_equals_input_length(tmp_path):
+    for seconds in (2.0, 10.0, 10.37):
+        path, decoded = write_input(tmp_path, seconds)
+        engine = StubEngine()
+        stems = separate(engine, path)
+        
+        assert len(engine.calls) > 1 or seconds < 3.0
+        for stem in stems.values():
+            assert stem.shape == decoded.shape
+
+
+def test_windows_join_without_seams(tmp_path):
+    path, decoded = write_input(tmp_path, 10.0)
+    stems = separate(StubEngine(), path)
+    
+    # Both sides of every overlap hold the same samples, so the crossfade gives them back unchanged
+    np.testing.assert_allclose(stems['other'], decoded * 0.5, atol=1e-6)
+    np.testing.assert_allclose(stems['bass'], decoded * 0.5, atol=1e-6)
+
+
+def test_crossfade_is_continuous(tmp_path):
+    path, decoded = write_input(tmp_path, 10.0)
+    engine = StubEngine(window_offset=0.1)
+    stems = separate(engine, path, overlap_seconds=0.5)
+    
+    # The offset of each window fades in linearly over the overlap instead of jumping at the boundary
+    offset = stems['bass'] - decoded * 0.5
+    overlap = int(0.5 * SAMPLE_RATE)
+    assert np.max(np.abs(np.diff(offset, axis=0))) <= 0.1 / (overlap - 1) + 1e-6
+    assert len(engine.calls) >= 3
+    assert offset[-1, 0] == pytest.approx(0.1 * (len(engine.calls) - 1), abs=1e-5)
@@ -0,0 +1,250 @@
+"""
+Tests of the concurrent YouTube downloader, with a local stand-in for pytubefix.YouTube.
+
+Run with: python -m pytest test_youtube_downloader.py
+"""
+
+import os
+import tempfile
+import threading
+
+import pytest
+
+import youtube_downloader
+from cancellation import CancelToken
+from youtube_downloader import (_reserve_output_path, download_with_retry, download_youtube_audio,
+                                iter_youtube_downloads)
+
+
+class FakeSite:
+    """
+    The videos the fake YouTube knows: video ID -> title. Downloads write a small
+    file, can fail a number of times first and can wait for an event to finish.
+    """
+    
+    def __init__(self):
+        self.titles = {}
+        self.failures = {}
+        self.gates = {}
+        self.attempts = {}
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+    
+    def add(self, video_id, title, failures=0, gate=None):
+        self.titles[video_id] = title
+        self.failures[video_id] = failures
+        if gate is not None:
+            self.gates[video_id] = gate
+    
+    def download(self, video_id, output_path):
+        with self._lock:
+            self.attempts[video_id] = self.attempts.get(video_id, 0) + 1
+            attempt = self.attempts[video_id]
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            gate = self.gates.get(video_id)
+            if gate is not None:
+                assert gate.wait(timeout=10), "The test never released the download"
+            if attempt <= self.failures[video_id]:
+                raise ConnectionError(f"Connection reset ({video_id}, attempt {attempt})")
+            path = os.path.join(output_path, f"{self.titles[video_id]}.webm")
+            with open(path, 'wb') as f:
+                f.write(video_id.encode('utf-8'))
+            return path
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class FakeStream:
+    def __init__(self, site, video_id):
+        self.site = site
+        self.video_id = video_id
+    
+    def download(self, output_path):
+        return self.site.download(self.video_id, output_path)
+
+
+class FakeStreams:
+    """Supports the query chain download_youtube_audio uses: filter().order_by().desc().first()."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+    
+    def filter(self, only_audio=False):
+        return self
+    
+    def order_by(self, attribute):
+        return self
+    
+    def desc(self):
+        return self
+    
+    def first(self):
+        return self.stream
+
+
+@pytest.fixture
+def site(monkeypatch, tmp_path):
+    site = FakeSite()
+    site.temp_folders = []
+    
+    def fake_youtube(url):
+        video_id = youtube_downloader.extract_video_id(url)
+        video = type('FakeYouTube', (), {})()
+        video.title = site.titles[video_id]
+        video.length = 60
+        video.streams = FakeStreams(FakeStream(site, video_id))
+        return video
+    
+    mkdtemp = tempfile.mkdtemp
+    
+    def fake_mkdtemp(prefix=None):
+        folder = mkdtemp(prefix=prefix, dir=str(tmp_path))
+        site.temp_folders.append(folder)
+        return folder
+    
+    monkeypatch.setattr(youtube_downloader, 'YouTube', fake_youtube, raising=False)
+    monkeypatch.setattr(youtube_downloader, 'PYTUBE_AVAILABLE', True)
+    monkeypatch.setattr(youtube_downloader.tempfile, 'mkdtemp', fake_mkdtemp)
+    return site
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(youtube_downloader.time, 'sleep', delays.append)
+    return delays
+
+
+def url(video_id):
+    return f"https://youtu.be/{video_id}"
+
+
+def test_download_keeps_the_native_file(site, tmp_path):
+    site.add('abc', 'Song')
+    output_folder = str(tmp_path / 'out')
+    
+    path = download_youtube_audio(url('abc'), output_folder)
+    
+    assert path == os.path.join(output_folder, 'Song.webm')
+    with open(path, 'rb') as f:
+        assert f.read() == b'abc'
+    assert not any(os.path.exists(folder) for folder in site.temp_folders)
+
+
+def test_failed_download_removes_its_temp_folder(site, tmp_path):
+    site.add('abc', 'Song', failures=1)
+    
+    with pytest.raises(ConnectionError):
+        download_youtube_audio(url('abc'), str(tmp_path / 'out'))
+    
+    assert len(site.temp_folders) == 1
+    assert not os.path.exists(site.temp_folders[0])
+    assert os.listdir(tmp_path / 'out') == []
+
+
+def test_retry_with_exponential_backoff(site, sleeps, tmp_path):
+    site.add('abc', 'Song', failures=2)
+    
+    path = download_with_retry(url('abc'), str(tmp_path / 'out'), retries=3, backoff=0.5)
+    
+    assert os.path.basename(path) == 'Song.webm'
+    assert site.attempts['abc'] == 3
+    assert sleeps == [0.5, 1.0]
+    # Every attempt had its own temp folder, none is left behind
+    assert len(site.temp_folders) == 3
+    assert not any(os.path.exists(folder) for folder in site.temp_folders)
+
+
+def test_retry_gives_up(site, sleeps, tmp_path):
+    site.add('abc', 'Song', failures=5)
+    
+    with pytest.raises(ConnectionError):
+        download_with_retry(url('abc'), str(tmp_path / 'out'), retries=2, backoff=1.0)
+    
+    assert site.attempts['abc'] == 3
+    assert sleeps == [1.0, 2.0]
+
+
+def test_concurrency_limit(site, tmp_path):
+    gate = threading.Event()
+    for index in range(6):
+        site.add(f"video{index}", f"Song {index}", gate=gate)
+    
+    results = iter_youtube_downloads([url(f"video{index}") for index in range(6)], str(tmp_path / 'out'),
+                                     max_workers=2)
+    # Let the pool start as many downloads as it may, then let them all finish
+    threading.Timer(0.3, gate.set).start()
+    finished = list(results)
+    
+    assert len(finished) == 6
+    assert all(error is None for _, _, error in finished)
+    assert site.max_active == 2
+
+
+def test_results_arrive_in_order_of_completion(site, tmp_path):
+    slow = threading.Event()
+    site.add('slow', 'Slow song', gate=slow)
+    site.add('fast', 'Fast song')
+    
+    results = iter_youtube_downloads([url('slow'), url('fast'), url('slow')], str(tmp_path / 'out'), max_workers=2)
+    
+    # The second URL is yielded while the first one is still downloading
+    first_url, first_path, _ = next(results)
+    assert first_url == url('fast')
+    assert os.path.basename(first_path) == 'Fast song.webm'
+    slow.set()
+    remaining = list(results)
+    
+    # The duplicate URL of the same video is only downloaded once
+    assert [result[0] for result in remaining] == [url('slow')]
+    assert site.attempts == {'slow': 1, 'fast': 1}
+
+
+def test_cancel_stops_submitting_urls(site, tmp_path):
+    for index in range(6):
+        site.add(f"video{index}", f"Song {index}")
+    cancel_token = CancelToken()
+    
+    finished = []
+    for result in iter_youtube_downloads([url(f"video{index}") for index in range(6)], str(tmp_path / 'out'),
+                                         max_workers=2, cancel_token=cancel_token):
+        finished.append(result)
+        cancel_token.cancel()
+    
+    # Only the downloads submitted before the cancellation ran: one per worker, and the one
+    # that replaced the first finished download before it was handed over
+    assert 1 <= len(finished) <= 3
+    assert sum(site.attempts.values()) == len(finished)
+
+
+def test_failed_url_is_reported_without_stopping_the_others(site, sleeps, tmp_path):
+    site.add('good', 'Good song')
+    site.add('bad', 'Bad song', failures=10)
+    
+    results = {result[0]: result for result in iter_youtube_downloads([url('bad'), url('good')],
+                                                                      str(tmp_path / 'out'), retries=1)}
+    
+    assert results[url('good')][1] is not None
+    assert results[url('bad')][1] is None
+    assert 'Connection reset' in results[url('bad')][2]
+
+
+def test_same_title_without_video_id_is_never_overwritten(tmp_path):
+    paths = [_reserve_output_path(str(tmp_path), 'Song', '.webm') for _ in range(120)]
+    
+    assert len(set(paths)) == 120
+    assert all(os.path.exists(path) for path in paths)
+
+
+def test_same_video_is_overwritten(tmp_path):
+    first = _reserve_output_path(str(tmp_path), 'Song', '.webm', 'abc')
+    second = _reserve_output_path(str(tmp_path), 'Song', '.webm', 'abc')
+    third = _reserve_output_path(str(tmp_path), 'Song', '.webm', 'abc')
+    
+    assert os.path.basename(first) == 'Song.webm'
+    assert os.path.basename(second) == 'Song [abc].webm'
+    assert third == second
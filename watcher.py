@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Watch-folder mode: process MP3 files as they are dropped into a folder.
+
+The separator stays loaded for the lifetime of the process, so each new file
+only pays for its own separation. New files are detected with inotify when
+the optional inotify_simple package is installed (Linux), otherwise the
+folder is polled. A file is only processed once its size and modification
+time have stopped changing for a few seconds, so files that are still being
+copied are never picked up half-written.
+"""
+
+import collections
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from batch_runner import _process_file, create_worker_pool
+from extract_bass import extract_bass_from_file
+from separator_engine import get_engine
+
+# inotify is optional, the folder is polled without it
+try:
+    from inotify_simple import INotify, flags
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+# Seconds between two scans of the folder when polling
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Seconds a file's size and modification time must stay unchanged before it is processed
+DEFAULT_SETTLE_SECONDS = 3.0
+
+# Seconds between two health reports
+DEFAULT_HEALTH_INTERVAL = 30.0
+
+# Health report file name, inside the output folder
+HEALTH_NAME = "bass_extractor_health.json"
+
+logger = logging.getLogger(__name__)
+
+
+class FolderWatcher:
+    """Long-running watcher that feeds new files of a folder to a warm worker pool."""
+    
+    def __init__(self, folder, output_folder, options=None, workers=1, ffmpeg_path=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 health_interval=DEFAULT_HEALTH_INTERVAL):
+        """
+        Args:
+            folder (str): Folder to watch for MP3 files (not recursive)
+            output_folder (str): Path to output folder
+            options (dict, optional): Keyword arguments for extract_bass_from_file
+            workers (int): Number of files processed in parallel, more than one uses worker processes
+            ffmpeg_path (str, optional): Path to FFmpeg executable
+            poll_interval (float): Seconds between two scans when inotify is not available
+            settle_seconds (float): Seconds a file must stay unchanged before it is processed
+            health_interval (float): Seconds between two health reports
+        """
+        self.folder = os.path.abspath(folder)
+        self.output_folder = output_folder
+        self.options = dict(options or {})
+        self.workers = max(1, workers)
+        self.ffmpeg_path = ffmpeg_path
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.health_interval = health_interval
+        self.health_path = os.path.join(output_folder, HEALTH_NAME)
+        
+        # Files still being copied: path -> (size, mtime, time of the last change)
+        self.candidates = {}
+        # Settled files waiting for a free worker
+        self.ready = collections.deque()
+        # Files being processed: future -> path
+        self.in_flight = {}
+        # Processed files still in the folder (failed, or not moved to DONE), only
+        # processed again once they change: path -> (size, mtime)
+        self.finished = {}
+        self.successful_files = []
+        self.failed_files = []
+        
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._engine = None
+        self._inotify = None
+        self._started = None
+        self._last_health = 0.0
+        self._last_processed = None
+    
+    @property
+    def mode(self):
+        """How new files are detected, 'inotify' or 'polling'."""
+        return 'inotify' if self._inotify is not None else 'polling'
+    
+    def stop(self):
+        """Ask the watcher to stop, files being processed are finished first."""
+        self._stop.set()
+    
+    def run(self):
+        """
+        Watch the folder until stop() is called or SIGINT/SIGTERM is received.
+        
+        Returns:
+            tuple: (successful_files, failed_files) lists of file paths
+        """
+        os.makedirs(self.output_folder, exist_ok=True)
+        self._install_signal_handlers()
+        self._start_executor()
+        self._start_inotify()
+        self._started = time.time()
+        logger.info(f"Watching {self.folder} for MP3 files ({self.mode}, {self.workers} worker(s)), "
+                    f"press Ctrl+C to stop")
+        
+        # Files dropped before the watcher started
+        self._scan()
+        try:
+            while not self._stop.is_set():
+                self._wait_for_changes()
+                self._settle()
+                self._dispatch()
+                if time.time() - self._last_health >= self.health_interval:
+                    self._report_health()
+        finally:
+            self._shutdown()
+        
+        return self.successful_files, self.failed_files
+    
+    def health(self):
+        """
+        Current state of the watcher.
+        
+        Returns:
+            dict: Counters, queue depths and timestamps, as written to the health file
+        """
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'folder': self.folder,
+                'mode': self.mode,
+                'workers': self.workers,
+                'running': not self._stop.is_set(),
+                'started': self._started,
+                'updated': time.time(),
+                'uptime': time.time() - self._started if self._started else 0.0,
+                'settling': len(self.candidates),
+                'queued': len(self.ready),
+                'in_progress': len(self.in_flight),
+                'processed': len(self.successful_files),
+                'failed': len(self.failed_files),
+                'last_processed': self._last_processed,
+            }
+    
+    def _install_signal_handlers(self):
+        # Signal handlers can only be installed from the main thread
+        if threading.current_thread() is not threading.main_thread():
+            return
+        
+        def handle_signal(signum, frame):
+            logger.info(f"Received signal {signum}, finishing files in progress...")
+            self.stop()
+        
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+    
+    def _start_executor(self):
+        if self.workers <= 1:
+            # One worker thread with this process's warm engine
+            self._engine = get_engine()
+            try:
+                self._engine.warm_up()
+            except Exception as e:
+                logger.error(f"Failed to warm up Spleeter separator: {str(e)}")
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        else:
+            # Workers finish their file on Ctrl+C, the watcher shuts down gracefully
+            self._executor = create_worker_pool(self.workers, self.ffmpeg_path, ignore_interrupt=True)
+    
+    def _start_inotify(self):
+        if not INOTIFY_AVAILABLE:
+            return
+        try:
+            self._inotify = INotify()
+            self._inotify.add_watch(self.folder, flags.CREATE | flags.CLOSE_WRITE | flags.MOVED_TO)
+        except OSError as e:
+            logger.warning(f"inotify is not available, polling instead: {str(e)}")
+            self._inotify = None
+    
+    def _wait_for_changes(self):
+        # Tick faster while files are settling, so they are picked up soon after they stop changing
+        timeout = min(self.poll_interval, 1.0) if self.candidates else self.poll_interval
+        
+        if self._inotify is None:
+            if not self._stop.wait(timeout):
+                self._scan()
+            return
+        
+        # Wake up at least every second to notice stop requests
+        try:
+            events = self._inotify.read(timeout=int(min(timeout, 1.0) * 1000))
+        except InterruptedError:
+            return
+        for event in events:
+            if event.mask & flags.Q_OVERFLOW:
+                # Events were lost, fall back to a full scan
+                self._scan()
+            elif event.name.lower().endswith('.mp3'):
+                self._see(os.path.join(self.folder, event.name))
+    
+    def _scan(self):
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith('.mp3') and entry.is_file():
+                        self._see(entry.path)
+        except OSError as e:
+            logger.error(f"Failed to scan {self.folder}: {str(e)}")
+    
+    def _see(self, path):
+        # Files already queued or being processed are not watched anymore
+        with self._lock:
+            if path in self.ready or path in self.in_flight.values():
+                return
+        
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.candidates.pop(path, None)
+            return
+        
+        signature = (stat.st_size, stat.st_mtime)
+        if self.finished.get(path) == signature:
+            return
+        
+        previous = self.candidates.get(path)
+        if previous is None or previous[:2] != signature:
+            self.candidates[path] = (*signature, time.time())
+    
+    def _settle(self):
+        now = time.time()
+        for path in list(self.candidates):
+            self._see(path)
+            entry = self.candidates.get(path)
+            if entry and entry[0] > 0 and now - entry[2] >= self.settle_seconds:
+                del self.candidates[path]
+                with self._lock:
+                    self.ready.append(path)
+    
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if not self.ready or len(self.in_flight) >= self.workers:
+                    return
+                path = self.ready.popleft()
+            if not os.path.exists(path):
+                continue
+            
+            logger.info(f"New file: {path}")
+            try:
+                future = self._submit(path)
+            except BrokenProcessPool:
+                # A worker process died, e.g. out of memory, start a new pool
+                logger.error("Worker pool is broken, restarting it")
+                self._executor.shutdown(wait=False)
+                self._start_executor()
+                future = self._submit(path)
+            
+            with self._lock:
+                self.in_flight[future] = path
+            future.add_done_callback(self._finished)
+    
+    def _submit(self, path):
+        if self.workers <= 1:
+            return self._executor.submit(extract_bass_from_file, path, self.output_folder,
+                                         engine=self._engine, **self.options)
+        return self._executor.submit(_process_file, path, self.output_folder, self.options)
+    
+    def _finished(self, future):
+        # The future is registered in in_flight before this callback is attached
+        with self._lock:
+            path = self.in_flight[future]
+        
+        try:
+            ok = future.result()
+        except CancelledError:
+            ok = None
+        except Exception as e:
+            logger.error(f"Failed to process {path}: {str(e)}")
+            ok = False
+        
+        with self._lock:
+            del self.in_flight[future]
+            if ok is None:
+                return
+            (self.successful_files if ok else self.failed_files).append(path)
+            self._last_processed = {'file': path, 'ok': ok, 'time': time.time()}
+            try:
+                stat = os.stat(path)
+                self.finished[path] = (stat.st_size, stat.st_mtime)
+                if ok:
+                    logger.warning(f"{path} was processed but is still in the watched folder, "
+                                   f"it is skipped until it changes")
+            except OSError:
+                # Moved to the DONE folder
+                self.finished.pop(path, None)
+        print(f"{'OK' if ok else 'FAILED'}: {path}")
+    
+    def _report_health(self):
+        self._last_health = time.time()
+        health = self.health()
+        logger.info(f"Watcher health: {health['settling']} settling, {health['queued']} queued, "
+                    f"{health['in_progress']} in progress, {health['processed']} processed, "
+                    f"{health['failed']} failed")
+        
+        # Written to a temp file and renamed, so readers never see a partial report
+        temp_path = f"{self.health_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(health, f, indent=2)
+            os.replace(temp_path, self.health_path)
+        except OSError as e:
+            logger.warning(f"Failed to write health report {self.health_path}: {str(e)}")
+    
+    def _shutdown(self):
+        with self._lock:
+            in_progress = len(self.in_flight)
+        logger.info(f"Stopping watcher, waiting for {in_progress} file(s) in progress...")
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._inotify is not None:
+            self._inotify.close()
+        self._report_health()
+        logger.info(f"Watcher stopped. Successful: {len(self.successful_files)}, Failed: {len(self.failed_files)}")
+
+
+def watch_folder(folder, output_folder, options=None, workers=1, ffmpeg_path=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 health_interval=DEFAULT_HEALTH_INTERVAL):
+    """
+    Process MP3 files dropped into a folder until interrupted.
+    
+    Args:
+        folder (str): Folder to watch for MP3 files
+        output_folder (str): Path to output folder
+        options (dict, optional): Keyword arguments for extract_bass_from_file
+        workers (int): Number of files processed in parallel
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        poll_interval (float): Seconds between two scans when inotify is not available
+        settle_seconds (float): Seconds a file must stay unchanged before it is processed
+        health_interval (float): Seconds between two health reports
+        
+    Returns:
+        tuple: (successful_files, failed_files) lists of file paths
+    """
+    watcher = FolderWatcher(folder, output_folder, options, workers, ffmpeg_path,
+                            poll_interval, settle_seconds, health_interval)
+    return watcher.run()
@@ -4,10 +4,15 @@ YouTube downloader module for Bass Extractor GUI.
 Downloads YouTube videos as MP3 files using pytubefix.
 """
 
+import itertools
 import os
 import re
+import shutil
 import subprocess
 import tempfile
+import time
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 import logging
@@ -18,6 +23,16 @@ try:
 except ImportError:
     PYTUBE_AVAILABLE = False
 
+# Ingest formats: 'native' keeps the downloaded container (Opus/AAC) as is,
+# 'wav' decodes it once to float PCM, 'mp3' re-encodes it (previous behaviour)
+AUDIO_FORMATS = ('native', 'wav', 'mp3')
+DEFAULT_AUDIO_FORMAT = 'native'
+
+# Concurrent downloads and retries with exponential backoff (2s, 4s, ...)
+DEFAULT_DOWNLOAD_WORKERS = 3
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2.0
+
 logger = logging.getLogger(__name__)
 
 
@@ -105,6 +120,43 @@ def sanitize_filename(filename):
     return filename
 
 
+def _create_new_file(path):
+    """Create an empty file, unless the path is taken; exclusive, so concurrent downloads never share a name."""
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _reserve_output_path(output_folder, title, extension, video_id=None):
+    """
+    Pick an output file name that is not taken yet and create it empty.
+    The title is used as file name, the video ID is added when another video
+    with the same title already uses it. Without a video ID, a timestamp (and
+    a counter if needed) is added instead, as for files moved to the DONE folder.
+    """
+    names = [f"{title}{extension}"]
+    if video_id:
+        names.append(f"{title} [{video_id}]{extension}")
+    for name in names:
+        path = os.path.join(output_folder, name)
+        if _create_new_file(path):
+            return path
+    
+    if video_id:
+        # Same video downloaded again, overwrite the previous file
+        return path
+    
+    # Nothing tells the videos apart, so an existing file is never overwritten
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for number in itertools.count(1):
+        suffix = timestamp if number == 1 else f"{timestamp}_{number}"
+        path = os.path.join(output_folder, f"{title}_{suffix}{extension}")
+        if _create_new_file(path):
+            return path
+
+
 def download_youtube_as_mp3(url, output_folder, ffmpeg_path=None):
     """
     Download YouTube video as MP3 file.
@@ -117,13 +169,51 @@ def download_youtube_as_mp3(url, output_folder, ffmpeg_path=None):
     Returns:
         str: Path to downloaded MP3 file or None if failed
     """
+    return download_youtube_audio(url, output_folder, ffmpeg_path, audio_format='mp3')
+
+
+def download_youtube_audio(url, output_folder, ffmpeg_path=None, audio_format=DEFAULT_AUDIO_FORMAT, cache=None):
+    """
+    Download the best audio stream of a YouTube video.
+    
+    The separator decodes any container FFmpeg can read, so by default the
+    downloaded Opus/AAC file is kept as is: no MP3 encode, no extra decode
+    and no generation loss before separation.
+    
+    Args:
+        url (str): YouTube URL
+        output_folder (str): Output folder path
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        audio_format (str): 'native' keeps the downloaded file, 'wav' decodes it once to
+            32-bit float WAV at 44.1 kHz, 'mp3' converts it to 192k MP3
+        cache (DownloadCache, optional): Download cache, consulted before the network
+        
+    Returns:
+        str: Path to downloaded audio file or None if failed
+    """
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unknown audio format '{audio_format}', expected one of {', '.join(AUDIO_FORMATS)}")
+    
+    video_id = extract_video_id(url)
+    
+    # Create output folder if it doesn't exist
+    os.makedirs(output_folder, exist_ok=True)
+    
+    # Previously downloaded videos are copied from the cache
+    if cache is not None and video_id:
+        entry = cache.get(video_id, audio_format)
+        if entry:
+            output_file = _reserve_output_path(output_folder, entry['title'], Path(entry['path']).suffix, video_id)
+            shutil.copyfile(entry['path'], output_file)
+            logger.info(f"Copied cached download of {url}: {output_file}")
+            return output_file
+    
     if not PYTUBE_AVAILABLE:
         raise ImportError("pytube is not installed. Please install it with: pip install pytube")
     
+    output_file = None
+    temp_folder = None
     try:
-        # Create output folder if it doesn't exist
-        os.makedirs(output_folder, exist_ok=True)
-        
         # Download video
         logger.info(f"Downloading YouTube video: {url}")
         yt = YouTube(url)
@@ -138,73 +228,203 @@ def download_youtube_as_mp3(url, output_folder, ffmpeg_path=None):
         if not audio_stream:
             raise Exception("No audio stream found")
         
-        # Download to temporary file
-        temp_file = audio_stream.download(output_path=tempfile.gettempdir())
+        # Download to a private temporary folder, concurrent downloads of
+        # videos with the same title must not share a file
+        temp_folder = tempfile.mkdtemp(prefix="bass_extractor_yt_")
+        temp_file = audio_stream.download(output_path=temp_folder)
         logger.info(f"Downloaded to temporary file: {temp_file}")
         
-        # Convert to MP3 using FFmpeg
-        output_file = os.path.join(output_folder, f"{video_title}.mp3")
+        if audio_format == 'native':
+            # Keep the original container, just move it into place
+            output_file = _reserve_output_path(output_folder, video_title, Path(temp_file).suffix, video_id)
+            shutil.move(temp_file, output_file)
+            logger.info(f"Successfully downloaded: {output_file}")
+            if cache is not None and video_id:
+                cache.put(video_id, audio_format, output_file, video_title, getattr(yt, 'length', None))
+            return output_file
         
         # Use provided FFmpeg path or system FFmpeg
         ffmpeg_cmd = ffmpeg_path if ffmpeg_path else "ffmpeg"
         
-        # Convert to MP3
-        cmd = [
-            ffmpeg_cmd,
-            '-i', temp_file,
-            '-vn',  # No video
-            '-acodec', 'mp3',
-            '-ab', '192k',  # Bitrate
-            '-ar', '44100',  # Sample rate
-            '-y',  # Overwrite output file
-            output_file
-        ]
-        
-        logger.info(f"Converting to MP3: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        if audio_format == 'wav':
+            # Decode once to float PCM at the separator's sample rate
+            output_file = _reserve_output_path(output_folder, video_title, ".wav", video_id)
+            cmd = [
+                ffmpeg_cmd,
+                '-i', temp_file,
+                '-vn',  # No video
+                '-acodec', 'pcm_f32le',
+                '-ar', '44100',  # Sample rate
+                '-y',  # Overwrite output file
+                output_file
+            ]
+        else:
+            # Convert to MP3
+            output_file = _reserve_output_path(output_folder, video_title, ".mp3", video_id)
+            cmd = [
+                ffmpeg_cmd,
+                '-i', temp_file,
+                '-vn',  # No video
+                '-acodec', 'mp3',
+                '-ab', '192k',  # Bitrate
+                '-ar', '44100',  # Sample rate
+                '-y',  # Overwrite output file
+                output_file
+            ]
         
-        # Clean up temporary file
-        try:
-            os.remove(temp_file)
-        except:
-            pass
+        logger.info(f"Converting to {audio_format.upper()}: {' '.join(cmd)}")
+        result = subprocess.run(cmd, capture_output=True, text=True)
         
         if result.returncode != 0:
             raise Exception(f"FFmpeg conversion failed: {result.stderr}")
         
         logger.info(f"Successfully downloaded and converted: {output_file}")
+        if cache is not None and video_id:
+            cache.put(video_id, audio_format, output_file, video_title, getattr(yt, 'length', None))
         return output_file
         
     except Exception as e:
+        # Don't leave an empty or partial file behind
+        if output_file and os.path.exists(output_file):
+            os.remove(output_file)
         logger.error(f"Error downloading YouTube video {url}: {str(e)}")
         raise
+    
+    finally:
+        # Also after a failed attempt, download_with_retry starts the next one in a new folder
+        if temp_folder is not None:
+            shutil.rmtree(temp_folder, ignore_errors=True)
 
 
-def download_multiple_youtube_urls(urls, output_folder, ffmpeg_path=None):
+def download_with_retry(url, output_folder, ffmpeg_path=None, retries=DEFAULT_RETRIES, backoff=RETRY_BACKOFF_SECONDS,
+                        audio_format=DEFAULT_AUDIO_FORMAT, cache=None):
     """
-    Download multiple YouTube URLs as MP3 files.
+    Download the audio of a YouTube URL, retrying failed attempts with exponential backoff.
     
     Args:
-        urls (list): List of YouTube URLs
+        url (str): YouTube URL
         output_folder (str): Output folder path
         ffmpeg_path (str, optional): Path to FFmpeg executable
-        
+        retries (int): Number of retries after the first failed attempt
+        backoff (float): Delay before the first retry in seconds, doubled after each retry
+        audio_format (str): Ingest format, see download_youtube_audio
+        cache (DownloadCache, optional): Download cache, consulted before the network
+    
     Returns:
-        list: List of paths to downloaded MP3 files
+        str: Path to downloaded audio file
     """
-    downloaded_files = []
-    
-    for i, url in enumerate(urls, 1):
+    for attempt in range(retries + 1):
         try:
-            logger.info(f"Processing YouTube URL {i}/{len(urls)}: {url}")
-            mp3_file = download_youtube_as_mp3(url.strip(), output_folder, ffmpeg_path)
-            if mp3_file:
-                downloaded_files.append(mp3_file)
+            return download_youtube_audio(url, output_folder, ffmpeg_path, audio_format, cache)
+        except (ImportError, ValueError):
+            raise
         except Exception as e:
-            logger.error(f"Failed to download {url}: {str(e)}")
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            logger.warning(f"Download attempt {attempt + 1} failed for {url}: {str(e)}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def iter_youtube_downloads(urls, output_folder, ffmpeg_path=None, max_workers=DEFAULT_DOWNLOAD_WORKERS,
+                           retries=DEFAULT_RETRIES, backoff=RETRY_BACKOFF_SECONDS, audio_format=DEFAULT_AUDIO_FORMAT,
+                           cache=None, cancel_token=None):
+    """
+    Download YouTube URLs concurrently and yield each result as soon as it is ready.
+    
+    Consumers can start processing the first finished file while the other
+    downloads are still running. URLs pointing to the same video are only
+    downloaded once. A URL is only submitted when a worker is free, so once
+    the cancel token is cancelled (or the generator is closed) no further
+    download starts; the running ones finish first.
+    
+    Args:
+        urls (list): List of YouTube URLs
+        output_folder (str): Output folder path
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        max_workers (int): Maximum number of concurrent downloads
+        retries (int): Number of retries per URL
+        backoff (float): Delay before the first retry in seconds
+        audio_format (str): Ingest format, see download_youtube_audio
+        cache (DownloadCache, optional): Download cache, consulted before the network
+        cancel_token (CancelToken, optional): Stops submitting further URLs once cancelled
+    
+    Yields:
+        tuple: (url, path to downloaded audio file or None, error message or None), in completion order
+    """
+    unique_urls = []
+    video_ids = set()
+    for url in urls:
+        url = url.strip()
+        video_id = extract_video_id(url) or url
+        if video_id in video_ids:
+            logger.info(f"Skipping duplicate YouTube URL: {url}")
             continue
+        video_ids.add(video_id)
+        unique_urls.append(url)
+    urls = unique_urls
+    if not urls:
+        return
+    
+    workers = max(1, min(max_workers, len(urls)))
+    remaining = iter(urls)
+    
+    def submit_next():
+        if cancel_token is not None and cancel_token.cancelled:
+            return
+        url = next(remaining, None)
+        if url is not None:
+            futures[pool.submit(download_with_retry, url, output_folder, ffmpeg_path, retries, backoff,
+                                audio_format, cache)] = url
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="youtube-download") as pool:
+        futures = {}
+        for _ in range(workers):
+            submit_next()
+        done = 0
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                url = futures.pop(future)
+                done += 1
+                # Keep the workers busy while the consumer handles this result
+                submit_next()
+                try:
+                    audio_file = future.result()
+                    logger.info(f"Downloaded YouTube URL {done}/{len(urls)}: {url}")
+                    yield url, audio_file, None
+                except Exception as e:
+                    logger.error(f"Failed to download {url}: {str(e)}")
+                    yield url, None, str(e)
+        if cancel_token is not None and cancel_token.cancelled and done < len(urls):
+            logger.info(f"Download cancelled, {len(urls) - done} YouTube URL(s) not started")
+
+
+def download_multiple_youtube_urls(urls, output_folder, ffmpeg_path=None, max_workers=DEFAULT_DOWNLOAD_WORKERS,
+                                   retries=DEFAULT_RETRIES, audio_format=DEFAULT_AUDIO_FORMAT, cache=None):
+    """
+    Download the audio of multiple YouTube URLs.
+    
+    Args:
+        urls (list): List of YouTube URLs
+        output_folder (str): Output folder path
+        ffmpeg_path (str, optional): Path to FFmpeg executable
+        max_workers (int): Maximum number of concurrent downloads
+        retries (int): Number of retries per URL
+        audio_format (str): Ingest format, see download_youtube_audio
+        cache (DownloadCache, optional): Download cache, consulted before the network
+    
+    Returns:
+        list: List of paths to downloaded audio files, in the order of the URLs
+    """
+    results = {}
+    for url, audio_file, _ in iter_youtube_downloads(urls, output_folder, ffmpeg_path, max_workers, retries,
+                                                     audio_format=audio_format, cache=cache):
+        if audio_file:
+            results[url] = audio_file
     
-    return downloaded_files
+    # Duplicate URLs of the same video share one file
+    return list(dict.fromkeys(results[url.strip()] for url in urls if url.strip() in results))
 
 
 def validate_youtube_urls(urls):